@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from dates3 import parse_dates
+from forecast3 import prepare_prophet_input, engine_forecast, FORECAST_ENGINES
+from figures3 import hash_json
+
+BACKTEST_CACHE_DIR = "backtest_cache"
+
+def rolling_origin_cutoffs(n_points, initial=3, step=1):
+    # Training sizes for each origin; the last origin still leaves at least one held-out point
+    return list(range(initial, n_points, step))
+
+def _series_frames(prophet_input):
+    if isinstance(prophet_input, dict):
+        series = prophet_input.items()
+    elif isinstance(prophet_input, list) and prophet_input:
+        series = [("Revenue", prophet_input)]
+    else:
+        series = []
+    frames = {}
+    for sku, records in series:
+        df = pd.DataFrame(records)[["ds", "y"]].dropna(subset=["y"])
+        df["ds"] = parse_dates(df["ds"])
+        frames[sku] = df.sort_values("ds").reset_index(drop=True)
+    return frames
+
+def _cache_key(engine, train_df, test_dates):
+    payload = json.dumps({
+        "engine": engine,
+        "ds": train_df["ds"].dt.strftime("%Y-%m-%d").tolist(),
+        "y": train_df["y"].round(6).tolist(),
+        "test": [d.strftime("%Y-%m-%d") for d in test_dates]
+    })
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _load_cached(key, cache_dir):
+    path = os.path.join(cache_dir, f"{key}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _save_cached(key, result, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{key}.json"), "w") as f:
+        json.dump(result, f)
+
+def _run_cutoff(task):
+    # Runs in a worker process: fit on the training slice, forecast the held-out dates
+    engine, train_df, test_dates = task
+    forecast = engine_forecast(engine, train_df, pd.DatetimeIndex(test_dates))
+    return {col: forecast[col].astype(float).tolist() for col in ("yhat", "yhat_lower", "yhat_upper")}
+
+def score_forecasts(actual, yhat, lower, upper):
+    actual, yhat = np.asarray(actual, dtype=float), np.asarray(yhat, dtype=float)
+    err = np.abs(actual - yhat)
+    nonzero = actual != 0
+    mape = float(np.mean(err[nonzero] / np.abs(actual[nonzero])) * 100) if nonzero.any() else np.nan
+    denom = np.abs(actual) + np.abs(yhat)
+    valid = denom != 0
+    smape = float(np.mean(2 * err[valid] / denom[valid]) * 100) if valid.any() else 0.0
+    coverage = float(np.mean((actual >= np.asarray(lower)) & (actual <= np.asarray(upper))))
+    return {"mape": mape, "smape": smape, "coverage": coverage, "n_forecasts": int(len(actual))}
+
+def backtest(prophet_input, engines=FORECAST_ENGINES, initial=3, horizon=3, step=1,
+             max_workers=None, cache_dir=BACKTEST_CACHE_DIR):
+    frames = _series_frames(prophet_input)
+    tasks, keys, slots = [], [], []
+    results = {}
+
+    for sku, df in frames.items():
+        for cutoff in rolling_origin_cutoffs(len(df), initial, step):
+            train_df = df.iloc[:cutoff]
+            test_df = df.iloc[cutoff:cutoff + horizon]
+            for engine in engines:
+                slot = (sku, engine, cutoff)
+                key = _cache_key(engine, train_df, test_df["ds"])
+                cached = _load_cached(key, cache_dir) if cache_dir else None
+                if cached is not None:
+                    results[slot] = cached
+                else:
+                    tasks.append((engine, train_df, list(test_df["ds"])))
+                    keys.append(key)
+                    slots.append(slot)
+
+    print(f"🧪 Backtesting {len(frames)} series: {len(results)} cached, {len(tasks)} cutoff fit(s) to run...")
+    if tasks:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for slot, key, result in zip(slots, keys, pool.map(_run_cutoff, tasks)):
+                results[slot] = result
+                if cache_dir:
+                    _save_cached(key, result, cache_dir)
+
+    # Pool every held-out point per (sku, engine) before scoring
+    pooled = {}
+    for (sku, engine, cutoff), result in results.items():
+        actual = frames[sku]["y"].iloc[cutoff:cutoff + horizon].to_numpy()
+        bucket = pooled.setdefault((sku, engine), {"actual": [], "yhat": [], "yhat_lower": [], "yhat_upper": []})
+        bucket["actual"].extend(actual)
+        for col in ("yhat", "yhat_lower", "yhat_upper"):
+            bucket[col].extend(result[col])
+
+    rows = []
+    for (sku, engine), b in pooled.items():
+        rows.append({"sku": sku, "engine": engine,
+                     **score_forecasts(b["actual"], b["yhat"], b["yhat_lower"], b["yhat_upper"])})
+    return build_leaderboard(rows)
+
+def build_leaderboard(rows):
+    leaderboard = pd.DataFrame(rows, columns=["sku", "engine", "mape", "smape", "coverage", "n_forecasts"])
+    if leaderboard.empty:
+        return leaderboard.assign(rank=pd.Series(dtype=int))
+    leaderboard = leaderboard.sort_values(["sku", "smape", "engine"]).reset_index(drop=True)
+    leaderboard["rank"] = leaderboard.groupby("sku").cumcount() + 1
+    return leaderboard
+
+def overall_leaderboard(leaderboard):
+    # Engine ranking across all SKUs, weighting each SKU by its number of held-out points
+    weighted = leaderboard.assign(
+        w_smape=leaderboard["smape"] * leaderboard["n_forecasts"],
+        w_coverage=leaderboard["coverage"] * leaderboard["n_forecasts"]
+    ).groupby("engine")[["w_smape", "w_coverage", "n_forecasts"]].sum()
+    summary = pd.DataFrame({
+        "smape": weighted["w_smape"] / weighted["n_forecasts"],
+        "coverage": weighted["w_coverage"] / weighted["n_forecasts"],
+        "wins": leaderboard[leaderboard["rank"] == 1]["engine"].value_counts()
+    }).fillna({"wins": 0}).sort_values("smape")
+    return summary.reset_index(names="engine")
+
+def best_engines(leaderboard):
+    if leaderboard.empty:
+        return {}
+    best = leaderboard[leaderboard["rank"] == 1]
+    return dict(zip(best["sku"], best["engine"]))
+
+def leaderboard_file(data_digest, cache_dir=BACKTEST_CACHE_DIR):
+    # One leaderboard per dataset, named after the digest of the financial JSON it was backtested on
+    return os.path.join(cache_dir, f"leaderboard-{data_digest}.csv")
+
+def save_leaderboard(leaderboard, data_digest, cache_dir=BACKTEST_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    filepath = leaderboard_file(data_digest, cache_dir)
+    leaderboard.to_csv(filepath, index=False)
+    return filepath
+
+def load_leaderboard(data_digest, cache_dir=BACKTEST_CACHE_DIR):
+    # Empty unless this exact data was backtested, so another workbook's engine picks are never applied
+    filepath = leaderboard_file(data_digest, cache_dir)
+    if not os.path.exists(filepath):
+        return pd.DataFrame()
+    return pd.read_csv(filepath)
+
+def engine_accuracy(leaderboard, sku, engine="prophet"):
+    if leaderboard.empty:
+        return None
+    row = leaderboard[(leaderboard["sku"] == sku) & (leaderboard["engine"] == engine)]
+    return row.iloc[0].to_dict() if not row.empty else None
+
+def main(filepath="financial_output.json", horizon=3):
+    with open(filepath, "r") as f:
+        financial_data = json.load(f)
+    leaderboard = backtest(prepare_prophet_input(financial_data), horizon=horizon)
+    if leaderboard.empty:
+        print("⚠️ No series long enough to backtest.")
+        return
+    saved = save_leaderboard(leaderboard, hash_json(financial_data))
+    print(leaderboard.to_string(index=False))
+    print("\n🏆 Overall engine ranking:")
+    print(overall_leaderboard(leaderboard).to_string(index=False))
+    print(f"✅ Leaderboard saved to {saved}")
+
+if __name__ == "__main__":
+    import sys
+    args = sys.argv[1:]
+    main(args[0] if args else "financial_output.json", int(args[1]) if len(args) > 1 else 3)
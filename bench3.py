@@ -0,0 +1,295 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def bench_figure_payload(n_skus=200, n_points=2000):
+    from forecast3 import _revenue_figure
+    from figures3 import compact_figure, payload_size
+
+    ds = pd.date_range("2020-01-01", periods=n_points, freq="D")
+    rng = np.random.default_rng(0)
+    full_raw = full_gz = compact_raw = compact_gz = 0
+    compact_time = 0.0
+    for i in range(n_skus):
+        revenue = 100 + np.cumsum(rng.normal(0, 5, n_points))
+        forecast = pd.DataFrame({"ds": ds, "revenue": revenue, "profit": revenue * 0.3, "margin_pct": 30.0})
+        fig = _revenue_figure(forecast, f"SKU {i}")
+        raw, gz = payload_size(fig)
+        compact, seconds = _timed(compact_figure, fig)
+        c_raw, c_gz = payload_size(compact)
+        full_raw += raw
+        full_gz += gz
+        compact_raw += c_raw
+        compact_gz += c_gz
+        compact_time += seconds
+
+    print(f"📦 Figure payload, {n_skus} SKUs x {n_points} points:")
+    print(f"   full:    {full_raw / 1e6:8.2f} MB ({full_gz / 1e6:.2f} MB gzipped)")
+    print(f"   compact: {compact_raw / 1e6:8.2f} MB ({compact_gz / 1e6:.2f} MB gzipped), "
+          f"{compact_time * 1000 / n_skus:.1f} ms/figure to compact")
+
+def _distribution(seconds):
+    if not seconds:
+        return "no valid results"
+    q = np.percentile(seconds, [50, 90])
+    return f"p50 {q[0]:.1f}s, p90 {q[1]:.1f}s, max {max(seconds):.1f}s, mean {np.mean(seconds):.1f}s"
+
+def bench_llm_sampling(path="samples/Bakery sales.csv", runs=5):
+    # Needs a backend with concurrency > 1, e.g. Ollama started with OLLAMA_NUM_PARALLEL > 1
+    # (and the same value exported here)
+    from extract3 import read_data, format_for_prompt, _parse_timeseries
+    from llm3 import get_backend, generate_with_retries, TIME_TO_VALID
+    from prompts import get_timeseries_prompt, get_timeseries_retry
+
+    backend = get_backend()
+    if not backend.available():
+        print(f"⚠️ Skipping LLM sampling benchmark, the {backend.name} backend is not available.")
+        return
+    if backend.concurrency < 2:
+        print(f"⚠️ Skipping LLM sampling benchmark: the {backend.name} backend runs one request at a time.")
+        return
+    prompt_data = format_for_prompt(read_data(path))
+    for samples in (1, backend.concurrency):
+        for _ in range(runs):
+            generate_with_retries(lambda error: get_timeseries_prompt(prompt_data, error_message=error),
+                                  get_timeseries_retry, _parse_timeseries, label="Benchmark", samples=samples)
+
+    print(f"🎲 Time to a valid answer, {runs} runs on {path} ({backend.name}):")
+    for mode, samples in (("sequential", 1), ("speculative", backend.concurrency)):
+        stats = TIME_TO_VALID[mode]
+        print(f"   {mode:<11} ({samples} sample(s)/attempt): {_distribution(stats['valid'])}, {stats['failed']} failed")
+
+def bench_llm_backends(recordings="llm_recordings.jsonl", backends=("ollama", "llama_cpp", "replay")):
+    # Replays the prompts captured with SMB_LLM_RECORD against every available backend
+    import json
+    from llm3 import make_backend, load_llm_config
+
+    if not os.path.exists(recordings):
+        print(f"⚠️ No recorded prompts at {recordings}; run an extraction with SMB_LLM_RECORD={recordings} first.")
+        return
+    with open(recordings, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    # Retries that continued from a context can't be re-run on their own
+    prompts = list({e["key"]: e for e in entries if not e.get("continued")}.values())
+    print(f"🤖 {len(prompts)} recorded prompt(s) from {recordings}:")
+    config = load_llm_config()
+    config["record"] = None
+    config["backends"]["replay"]["path"] = recordings
+    for name in backends:
+        backend = make_backend(name, config)
+        if not backend.available():
+            print(f"   {name:<10} not available")
+            continue
+        seconds, valid, errors = [], 0, 0
+        for entry in prompts:
+            try:
+                result, elapsed = _timed(backend.generate, entry["prompt"], options=entry["options"] or None)
+            except Exception:
+                errors += 1
+                continue
+            seconds.append(elapsed)
+            response = result.get("response", "")
+            valid += "{" in response or "[" in response
+        print(f"   {name:<10} {_distribution(seconds)}, {valid}/{len(prompts)} with JSON, {errors} error(s)")
+
+def synthetic_workbook(path, target_mb=50, sheets=3):
+    # Transaction-style sheets with random values (so they don't compress away) until the file is ~target_mb
+    from openpyxl import Workbook
+    rng = np.random.default_rng(0)
+    # ~9 bytes per cell once zipped, 8 cells per row
+    rows = int(target_mb * 1e6 / 9 / 8 / sheets)
+    wb = Workbook(write_only=True)
+    products = [f"Product {i}" for i in range(500)]
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Sales {s + 1}")
+        ws.append(["date", "time", "ticket", "product", "quantity", "unit_price", "cost", "store"])
+        dates = pd.date_range("2020-01-01", periods=rows, freq="min")
+        for i in range(rows):
+            ws.append([dates[i].to_pydatetime(), f"{i % 24:02d}:{i % 60:02d}", int(rng.integers(1e6)),
+                       products[i % 500], int(rng.integers(1, 20)), float(rng.random() * 10),
+                       float(rng.random() * 5), f"Store {i % 7}"])
+    wb.save(path)
+    return path
+
+def bench_workbook_cache(paths=("samples/meta10k.xlsx", "bench_data/synthetic_50mb.xlsx"), target_mb=50):
+    import shutil
+    import tempfile
+    from workbook3 import parse_workbook, read_workbook, source_digest, file_digest
+
+    for path in paths:
+        if path.startswith("bench_data/") and not os.path.exists(path):
+            os.makedirs("bench_data", exist_ok=True)
+            print(f"🏗️ Writing a ~{target_mb} MB synthetic workbook to {path}...")
+            synthetic_workbook(path, target_mb)
+        cache_dir = tempfile.mkdtemp(prefix="workbook_cache_")
+        try:
+            print(f"📗 {path} ({os.path.getsize(path) / 1e6:.1f} MB):")
+            engines = ["openpyxl"]
+            try:
+                import python_calamine  # noqa: F401
+                engines.append("calamine")
+            except ImportError:
+                pass
+            for engine in engines:
+                sheets, seconds = _timed(parse_workbook, path, engine)
+                print(f"   cold parse ({engine:<9}): {seconds:8.3f}s, {sum(len(df) for df in sheets.values()):,} rows")
+            _, seconds = _timed(read_workbook, path, cache_dir=cache_dir)
+            print(f"   cold parse + cache write: {seconds:8.3f}s")
+            _, seconds = _timed(read_workbook, path, cache_dir=cache_dir)
+            print(f"   warm read (cached):       {seconds:8.3f}s")
+            _, seconds = _timed(source_digest, path, cache_dir)
+            _, hash_seconds = _timed(file_digest, path)
+            print(f"   size+mtime check:         {seconds:8.3f}s (content hash would take {hash_seconds:.3f}s)")
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+def bench_date_parsing(n_rows=1_000_000, n_days=2000):
+    from dates3 import parse_dates, combine_date_time
+
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2020-01-01", periods=n_days).strftime("%d/%m/%Y")
+    dates = pd.Series(days[rng.integers(0, n_days, n_rows)])
+    times = pd.Series([f"{h:02d}:{m:02d}" for h, m in rng.integers(0, [24, 60], (n_rows, 2))])
+    print(f"📅 Date parsing, {n_rows:,} rows of d/m/Y strings ({n_days:,} distinct):")
+    expected, seconds = _timed(pd.to_datetime, dates, dayfirst=True)
+    print(f"   pd.to_datetime(dayfirst):  {seconds:8.3f}s")
+    parsed, seconds = _timed(parse_dates, dates)
+    print(f"   parse_dates (inferred):    {seconds:8.3f}s, identical: {bool((parsed.values == expected.values).all())}")
+    _, seconds = _timed(parse_dates, dates)
+    print(f"   parse_dates (cached):      {seconds:8.3f}s")
+    _, seconds = _timed(combine_date_time, dates, times)
+    print(f"   combine_date_time:         {seconds:8.3f}s")
+
+def bench_cleanse(sizes=(250_000, 1_000_000, 4_000_000)):
+    from cleanse3 import cleanse_transactions
+
+    rng = np.random.default_rng(0)
+    print("🧹 Transaction cleansing (should scale linearly):")
+    for n in sizes:
+        days = pd.date_range("2022-01-01", periods=365).strftime("%Y-%m-%d")
+        df = pd.DataFrame({
+            "id": np.arange(n),
+            "date": pd.Categorical(days[rng.integers(0, 365, n)]),
+            "ticket": rng.integers(0, n // 3, n),
+            "article": pd.Categorical.from_codes(rng.integers(0, 150, n), [f"ARTICLE {i}" for i in range(150)]),
+            "quantity": rng.integers(-1, 6, n),
+            "unit_price": rng.choice([0.0, 0.15, 1.2, 2.5], n)
+        })
+        (_, summary), seconds = _timed(cleanse_transactions, df, line_ids=["id"])
+        print(f"   {n:>10,} rows: {seconds:6.2f}s ({seconds / n * 1e9:5.0f} ns/row), kept {summary['kept']:,}")
+
+def bench_rollup(n_skus=2000, n_months=36, n_categories=12, queries=200):
+    from cube3 import cube_from_sku_forecast
+    from forecast3 import prepare_prophet_input
+
+    rng = np.random.default_rng(0)
+    months = pd.period_range("2021-01", periods=n_months, freq="M").strftime("%Y-%m")
+    financial_data = {
+        "sku_forecast": {f"SKU {i}": {m: {"units": float(u), "price": 2.5, "cost": 1.5}
+                                      for m, u in zip(months, rng.integers(0, 50, n_months))}
+                         for i in range(n_skus)},
+        "sku_categories": {f"SKU {i}": f"Category {i % n_categories}" for i in range(n_skus)}
+    }
+    categories = [f"Category {i}" for i in range(n_categories)]
+
+    def walk(category):
+        # What a chart costs without the cube: rebuild the records, filter, then group
+        records = prepare_prophet_input(financial_data)
+        totals = {}
+        for sku, rows in records.items():
+            if financial_data["sku_categories"][sku] == category:
+                for r in rows:
+                    totals[r["ds"][:4]] = totals.get(r["ds"][:4], 0) + r["y"] * r["price"]
+        return totals
+
+    cube, build_seconds = _timed(cube_from_sku_forecast, financial_data)
+    _, walk_seconds = _timed(lambda: [walk(categories[i % n_categories]) for i in range(queries // 20)])
+    _, cube_seconds = _timed(lambda: [cube.series("revenue", "year", category=categories[i % n_categories])
+                                      for i in range(queries)])
+    print(f"🧊 Rollup cube, {n_skus:,} SKUs x {n_months} months:")
+    print(f"   build:              {build_seconds * 1000:8.1f} ms")
+    print(f"   dict walk / query:  {walk_seconds / (queries // 20) * 1000:8.2f} ms")
+    print(f"   cube slice / query: {cube_seconds / queries * 1000:8.4f} ms")
+
+def bench_forecast_profiles(n_skus=20, n_months=36, periods=12):
+    import logging
+    from forecast3 import FORECAST_PROFILES, _fit_prophet, _future_frame, _predict
+
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    rng = np.random.default_rng(0)
+    ds = pd.date_range("2021-01-31", periods=n_months, freq="ME")
+    season = np.sin(2 * np.pi * np.arange(n_months) / 12)
+    series = [pd.DataFrame({"ds": ds, "y": 50 + 5 * i + 10 * season + rng.normal(0, 3, n_months)})
+              for i in range(n_skus)]
+    print(f"🔮 Prophet per-SKU fit + predict, {n_skus} SKUs x {n_months} months, {periods} ahead:")
+    _fit_prophet(series[0], "warm-up")  # first fit pays for loading the Stan model
+    forecasts = {}
+    for profile in FORECAST_PROFILES:
+        futures = {} if profile == "fast" else None
+        fit_seconds, predict_seconds, forecasts[profile] = 0.0, 0.0, []
+        for i, df in enumerate(series):
+            model, seconds = _timed(_fit_prophet, df, f"SKU {i}", profile=profile)
+            fit_seconds += seconds
+            forecast, seconds = _timed(lambda: _predict(model, _future_frame(model, periods, "ME", futures)))
+            predict_seconds += seconds
+            forecasts[profile].append(forecast["yhat"].to_numpy()[-periods:])
+        print(f"   {profile:<9} fit {fit_seconds / n_skus * 1000:7.1f} ms + predict "
+              f"{predict_seconds / n_skus * 1000:7.1f} ms per SKU")
+    fast, accurate = np.array(forecasts["fast"]), np.array(forecasts["accurate"])
+    print(f"   mean |yhat difference|: {np.mean(np.abs(fast - accurate) / np.abs(accurate)) * 100:.2f}%")
+
+def bench_forecast_table(n_skus=2000, n_points=48, periods=12, top=10):
+    from forecast3 import build_forecast_table
+
+    rng = np.random.default_rng(0)
+    ds = pd.date_range("2021-01-31", periods=n_points, freq="ME")
+    results = {}
+    for i in range(n_skus):
+        yhat = 20 + rng.normal(0, 5, n_points)
+        forecast = pd.DataFrame({"ds": ds, "yhat": yhat, "yhat_lower": yhat - 3, "yhat_upper": yhat + 3,
+                                 "is_forecast": np.arange(n_points) >= n_points - periods})
+        results[f"SKU {i}"] = (forecast, 2.5 + i % 7, 1.5)
+
+    def per_sku():
+        # The old way: each SKU's frame gets its own revenue/profit/margin columns, then a Python-level sort
+        totals = {}
+        for sku, (forecast, price, cost) in results.items():
+            forecast = forecast.copy()
+            forecast["revenue"] = forecast["yhat"] * price
+            forecast["profit"] = forecast["yhat"] * (price - cost)
+            forecast["margin_pct"] = (forecast["profit"] / forecast["revenue"].replace(0, 1)) * 100
+            totals[sku] = forecast.tail(periods)["revenue"].sum()
+        return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+    expected, per_sku_seconds = _timed(per_sku)
+    table, build_seconds = _timed(build_forecast_table, results, "multi")
+    leaders, top_seconds = _timed(table.top, top)
+    print(f"🗃️ Forecast table, {n_skus:,} SKUs x {n_points} points:")
+    print(f"   per-SKU frames + sort:  {per_sku_seconds * 1000:8.1f} ms")
+    print(f"   one table, built once:  {build_seconds * 1000:8.1f} ms")
+    print(f"   top {top} from the table:   {top_seconds * 1000:8.1f} ms, "
+          f"same SKUs: {list(leaders.index) == [sku for sku, _ in expected]}")
+
+BENCHMARKS = {
+    "payload": bench_figure_payload,
+    "llm_sampling": bench_llm_sampling,
+    "llm_backends": bench_llm_backends,
+    "workbook_cache": bench_workbook_cache,
+    "dates": bench_date_parsing,
+    "cleanse": bench_cleanse,
+    "rollup": bench_rollup,
+    "forecast_profiles": bench_forecast_profiles,
+    "forecast_table": bench_forecast_table
+}
+
+if __name__ == "__main__":
+    import sys
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,156 @@
+import re
+import numpy as np
+import pandas as pd
+from schema3 import find_schema, load_schema_registry, resolve_roles
+from transactions3 import header_signature, parse_amounts
+
+# Text values that mark a refund line (checked once per distinct value)
+REFUND_PATTERN = re.compile(r"\b(?:refund|refunded|return|returned|void|voided|reversal|chargeback|remboursement|retour)\b",
+                            re.IGNORECASE)
+# Header words that identify the quantity and price columns when no schema says which they are. They are
+# matched against whole header words, so "discount" is not a count and "order_amount" is not a price.
+QUANTITY_HINTS = ("qty", "quantity", "units", "quantite", "quantité")
+PRICE_HINTS = ("price", "prix")
+CURRENCY_PATTERN = r"[€$£]"
+# Header words of order / ticket keys: never usable as a line id, since equal lines on two orders are two sales
+ORDER_KEY_WORDS = ("order", "ticket", "invoice", "receipt", "transaction", "commande")
+
+def row_hashes(df, columns=None):
+    # One uint64 per row over the given columns; equal rows hash equal, computed column-wise in C
+    frame = df if columns is None else df[columns]
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+def header_words(name):
+    return re.findall(r"[^\W_]+", str(name).casefold())
+
+def _hinted(df, hints):
+    # A header equal to a hint wins over one that merely contains it as a word ("unit price")
+    words = {name: header_words(name) for name in df.columns}
+    for exact in (True, False):
+        for name in df.columns:
+            if any(words[name] == [hint] if exact else hint in words[name] for hint in hints):
+                return name
+    return None
+
+def _currency_column(df):
+    # Header-less exports: the text column whose values carry a currency symbol ("0,15 €")
+    for name in df.columns:
+        col = df[name]
+        if col.dtype == object or isinstance(col.dtype, pd.CategoricalDtype):
+            uniques = pd.Series(col.dropna().unique()).astype(str)
+            if len(uniques) and uniques.str.contains(CURRENCY_PATTERN).mean() > 0.9:
+                return name
+    return None
+
+def schema_roles(df, registry=None):
+    # Column roles of a registered layout (see schema3), or {} when the sheet's header is unknown
+    registry = load_schema_registry() if registry is None else registry
+    _, entry, _ = find_schema(header_signature(df), registry, df=df)
+    return resolve_roles(df, entry) if entry else {}
+
+def _guess_roles(df, roles):
+    roles = dict(roles or {})
+    if roles.get("quantity") is None:
+        roles["quantity"] = _hinted(df, QUANTITY_HINTS)
+    if roles.get("price") is None:
+        roles["price"] = _hinted(df, PRICE_HINTS) or _currency_column(df)
+    return roles
+
+def _line_ids(df, roles, line_ids):
+    # Only explicitly configured line-id columns are ignored when comparing lines, and never one that holds
+    # a role (quantity, price, ...) or an order / ticket key
+    configured = [roles["line_id"]] if roles.get("line_id") is not None else []
+    columns = [c for c in configured + list(line_ids or ()) if c in df.columns]
+    role_columns = {column for role, column in roles.items() if role != "line_id" and column is not None}
+    usable = []
+    for column in dict.fromkeys(columns):
+        if column in role_columns or any(word in ORDER_KEY_WORDS for word in header_words(column)):
+            print(f"⚠️ Not using '{column}' as a line id: it identifies orders or holds a value")
+        else:
+            usable.append(column)
+    return usable
+
+def _refund_text(df, skip):
+    # Any text column mentioning a refund; each distinct value is matched once
+    flags = np.zeros(len(df), dtype=bool)
+    for name in df.columns:
+        col = df[name]
+        if name in skip or not (col.dtype == object or isinstance(col.dtype, pd.CategoricalDtype)):
+            continue
+        codes, uniques = pd.factorize(col)
+        if not len(uniques):
+            continue
+        hits = pd.Series(uniques).astype(str).str.contains(REFUND_PATTERN).to_numpy()
+        flags |= np.where(codes >= 0, hits[np.maximum(codes, 0)], False)
+    return flags
+
+def cleanse_transactions(df, roles=None, line_ids=None, drop_repeated=True, drop_refunds=False):
+    # -> (cleaned sheet, summary). Linear time: each check is one vectorized pass or one hash-table pass.
+    #   exact duplicates: every column equal (an export written twice)
+    #   repeated lines: equal apart from a configured line-id column (roles["line_id"] or `line_ids`), i.e.
+    #   the same order, article, time, quantity and price scanned twice; off when no line id is configured
+    #   zero price: a price or quantity of exactly 0 (voided scans, free add-ons)
+    #   refunds: negative quantity/price or a refund marker in a text column; flagged, and kept unless
+    #   drop_refunds, since they net against the original sale
+    # roles: {role: column} from the schema registry; quantity/price fall back to header words
+    roles = _guess_roles(df, roles)
+    n = len(df)
+    exact = pd.Series(row_hashes(df)).duplicated().to_numpy()
+    ids = _line_ids(df, roles, line_ids)
+    keys = [c for c in df.columns if c not in ids]
+    repeated = np.zeros(n, dtype=bool)
+    if ids and keys:
+        repeated = ~exact & pd.Series(row_hashes(df, keys)).duplicated().to_numpy()
+    quantity = parse_amounts(df[roles["quantity"]]).to_numpy() if roles.get("quantity") is not None else None
+    price = parse_amounts(df[roles["price"]]).to_numpy() if roles.get("price") is not None else None
+    zero = np.zeros(n, dtype=bool)
+    negative = np.zeros(n, dtype=bool)
+    for values in (quantity, price):
+        if values is not None:
+            zero |= values == 0
+            negative |= values < 0
+    refunds = negative | _refund_text(df, {roles.get("product")})
+    drop = exact | (repeated if drop_repeated else False) | (zero & ~refunds)
+    if drop_refunds:
+        drop |= refunds
+    summary = {
+        "rows": n,
+        "exact_duplicates": int(exact.sum()),
+        "repeated_lines": int(repeated.sum()),
+        "zero_price": int((zero & ~refunds & ~exact & ~repeated).sum()),
+        "refunds": int(refunds.sum()),
+        "refunds_dropped": bool(drop_refunds),
+        "repeated_dropped": bool(drop_repeated),
+        "kept": int(n - drop.sum()),
+        "line_ids": [str(c) for c in ids],
+        "quantity": None if roles.get("quantity") is None else str(roles["quantity"]),
+        "price": None if roles.get("price") is None else str(roles["price"])
+    }
+    return df[~drop], summary
+
+def cleanse_sheets(data, roles=None, report=True, registry=None, **options):
+    # Each sheet uses the roles of its registered schema when there is one; `roles` overrides them
+    registry = load_schema_registry() if registry is None else registry
+    cleaned, summaries = {}, {}
+    for sheet, df in data.items():
+        sheet_roles = dict(schema_roles(df, registry), **(roles or {}))
+        cleaned[sheet], summaries[sheet] = cleanse_transactions(df, sheet_roles, **options)
+        if report:
+            print_cleanse_report(sheet, summaries[sheet])
+    return cleaned, summaries
+
+def print_cleanse_report(sheet, s):
+    removed = s["rows"] - s["kept"]
+    if not removed and not s["refunds"]:
+        return
+    parts = [f"{s['exact_duplicates']:,} exact duplicate(s)"]
+    if s["repeated_dropped"]:
+        parts.append(f"{s['repeated_lines']:,} repeated line(s)")
+    parts.append(f"{s['zero_price']:,} zero-price row(s)")
+    if s["refunds_dropped"]:
+        parts.append(f"{s['refunds']:,} refund(s)")
+    print(f"🧹 Sheet {sheet}: {s['rows']:,} -> {s['kept']:,} rows ({', '.join(parts)} removed)")
+    if s["refunds"] and not s["refunds_dropped"]:
+        print(f"   ↩️ {s['refunds']:,} refund / negative-quantity row(s) flagged and kept")
+    if s["repeated_lines"] and not s["repeated_dropped"]:
+        print(f"   🔁 {s['repeated_lines']:,} repeated line(s) flagged and kept")
@@ -0,0 +1,156 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from dates3 import period_labels
+
+CUBE_FILE = "financial_cube.npz"
+MEASURES = ("units", "revenue", "cost", "profit")
+LEVELS = ("day", "week", "month", "quarter", "year")
+# Same default as prepare_prophet_input when a row has no cost
+DEFAULT_COST_RATIO = 0.7
+UNCATEGORIZED = "Uncategorized"
+
+class RollupCube:
+    # Per level, a (sku x period x measure) array plus the same rolled up to categories, with dict index
+    # maps for SKUs, categories and period labels. A cell is one lookup; a chart series is one slice.
+    def __init__(self, skus, sku_categories, levels, sku_data, digest=None):
+        self.skus = list(skus)
+        self.sku_index = {sku: i for i, sku in enumerate(self.skus)}
+        self.sku_categories = list(sku_categories)
+        self.categories = sorted(set(self.sku_categories))
+        self.category_index = {category: i for i, category in enumerate(self.categories)}
+        self.category_codes = np.array([self.category_index[c] for c in self.sku_categories], dtype=np.intp)
+        self.levels = {level: list(periods) for level, periods in levels.items()}
+        self.period_index = {level: {p: j for j, p in enumerate(periods)} for level, periods in self.levels.items()}
+        self.sku_data = sku_data
+        self.category_data = {}
+        for level, data in sku_data.items():
+            rolled = np.zeros((len(self.categories),) + data.shape[1:])
+            np.add.at(rolled, self.category_codes, data)
+            self.category_data[level] = rolled
+        self.digest = digest
+
+    def _measure(self, measure):
+        return MEASURES.index(measure)
+
+    def value(self, sku, period, measure="revenue", level="month"):
+        return float(self.sku_data[level][self.sku_index[sku], self.period_index[level][period],
+                                          self._measure(measure)])
+
+    def series(self, measure="revenue", level="month", sku=None, category=None):
+        # -> (period labels, values) for one SKU, one category or the whole business
+        m = self._measure(measure)
+        if sku is not None:
+            values = self.sku_data[level][self.sku_index[sku], :, m]
+        elif category is not None:
+            values = self.category_data[level][self.category_index[category], :, m]
+        else:
+            values = self.category_data[level][:, :, m].sum(axis=0)
+        return self.levels[level], values
+
+    def breakdown(self, measure="revenue", level="month", by="category", period=None):
+        # -> {sku or category: value} for one period, or summed over all periods
+        data = self.category_data[level] if by == "category" else self.sku_data[level]
+        names = self.categories if by == "category" else self.skus
+        m = self._measure(measure)
+        values = data[:, self.period_index[level][period], m] if period is not None else data[:, :, m].sum(axis=1)
+        return dict(zip(names, values.tolist()))
+
+    def top(self, n=10, measure="revenue", level="month", period=None, category=None):
+        # -> [(sku, value)] largest first, optionally within one category
+        m = self._measure(measure)
+        data = self.sku_data[level]
+        values = data[:, self.period_index[level][period], m] if period is not None else data[:, :, m].sum(axis=1)
+        candidates = np.arange(len(self.skus))
+        if category is not None:
+            candidates = candidates[self.category_codes == self.category_index[category]]
+        n = min(n, len(candidates))
+        if not n:
+            return []
+        picked = candidates[np.argpartition(-values[candidates], n - 1)[:n]]
+        picked = picked[np.argsort(-values[picked], kind="stable")]
+        return [(self.skus[i], float(values[i])) for i in picked]
+
+    def matrix(self, measure="revenue", level="month"):
+        # (period x sku) frame, e.g. for the hierarchy's aligned revenue/profit matrices
+        return pd.DataFrame(self.sku_data[level][:, :, self._measure(measure)].T,
+                            index=self.levels[level], columns=self.skus)
+
+def build_cube(frame, levels=LEVELS, categories=None, digest=None):
+    # frame: one row per transaction (or per SKU-month) with date, sku, units, price and optionally cost and
+    # category. Each level is one factorize of the period labels and one bincount per measure.
+    frame = frame.dropna(subset=["date", "sku"])
+    units = frame["units"].fillna(1.0).to_numpy(dtype=float)
+    price = frame["price"].fillna(0.0).to_numpy(dtype=float)
+    cost = frame["cost"].to_numpy(dtype=float) if "cost" in frame else np.full(len(frame), np.nan)
+    cost = np.where(np.isnan(cost), price * DEFAULT_COST_RATIO, cost)
+    revenue, total_cost = units * price, units * cost
+    measures = np.stack([units, revenue, total_cost, revenue - total_cost], axis=1)
+    sku_codes, skus = pd.factorize(frame["sku"].astype(str), sort=True)
+    categories = dict(categories or {})
+    if "category" in frame:
+        firsts = frame.dropna(subset=["category"]).groupby(frame["sku"].astype(str))["category"].first()
+        for sku, category in firsts.items():
+            categories.setdefault(sku, str(category))
+    sku_categories = [categories.get(sku, UNCATEGORIZED) for sku in skus]
+    level_periods, sku_data = {}, {}
+    for level in levels:
+        period_codes, periods = pd.factorize(period_labels(frame["date"], level), sort=True)
+        flat = sku_codes * len(periods) + period_codes
+        cells = len(skus) * len(periods)
+        data = np.stack([np.bincount(flat, weights=measures[:, k], minlength=cells) for k in range(len(MEASURES))],
+                        axis=1)
+        level_periods[level] = list(periods)
+        sku_data[level] = data.reshape(len(skus), len(periods), len(MEASURES))
+    return RollupCube(skus, sku_categories, level_periods, sku_data, digest)
+
+def sku_forecast_frame(financial_data):
+    # The monthly "sku_forecast" structure as rows (one per SKU-month), dated on the first of the month
+    rows = []
+    for sku, months in financial_data.get("sku_forecast", {}).items():
+        for month, val in months.items():
+            if isinstance(val, dict):
+                rows.append((sku, month, val.get("units", 1), val.get("price", 0), val.get("cost")))
+            else:
+                rows.append((sku, month, 1.0, val, None))
+    frame = pd.DataFrame(rows, columns=["sku", "month", "units", "price", "cost"])
+    frame["date"] = pd.to_datetime(frame["month"], format="%Y-%m", errors="coerce")
+    for col in ("units", "price", "cost"):
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+    return frame
+
+def cube_from_sku_forecast(financial_data, digest=None):
+    # Monthly data can't be split into days or weeks, so those levels are left out
+    return build_cube(sku_forecast_frame(financial_data), levels=("month", "quarter", "year"),
+                      categories=financial_data.get("sku_categories"), digest=digest)
+
+def save_cube(cube, filepath=CUBE_FILE):
+    meta = {"skus": cube.skus, "sku_categories": cube.sku_categories, "levels": cube.levels,
+            "measures": list(MEASURES), "digest": cube.digest}
+    arrays = {f"level_{level}": data for level, data in cube.sku_data.items()}
+    tmp_path = f"{filepath}.tmp.npz"
+    np.savez(tmp_path, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, filepath)
+
+def load_cube(filepath=CUBE_FILE, digest=None):
+    # None when missing, unreadable, or built for other data than `digest`
+    if not os.path.exists(filepath):
+        return None
+    try:
+        with np.load(filepath) as npz:
+            meta = json.loads(str(npz["meta"]))
+            if digest is not None and meta.get("digest") != digest or meta.get("measures") != list(MEASURES):
+                return None
+            sku_data = {level: npz[f"level_{level}"] for level in meta["levels"]}
+    except Exception as e:
+        print(f"⚠️ Could not read rollup cube: {e}")
+        return None
+    return RollupCube(meta["skus"], meta["sku_categories"], meta["levels"], sku_data, meta.get("digest"))
+
+def cube_for(financial_data, digest, filepath=CUBE_FILE):
+    # The cube saved with the extraction, or one built from sku_forecast if it is missing or stale
+    cube = load_cube(filepath, digest)
+    if cube is None and financial_data.get("sku_forecast"):
+        cube = cube_from_sku_forecast(financial_data, digest)
+    return cube
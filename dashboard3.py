@@ -1,93 +1,345 @@
+import itertools
 import json
+import os
+import re
 import subprocess
+import threading
+import time
 import plotly.graph_objs as go
-from dash import Dash, html, dcc
+from dash import Dash, html, dcc, Input, Output, State, MATCH, no_update
 import json5 as json
-from prompts import get_dashboard_prompt
-from forecast3 import prepare_prophet_input, forecast_timeseries, generate_forecast_insight
+from prompts import (dashboard_prompt_parts, batched_dashboard_prompt_parts, get_insight_prompt,
+                     get_batched_dashboard_prompt, count_tokens, format_prompt_stats, get_dashboard_retry,
+                     REPORT_DELIMITER, BATCHED_DASHBOARD_PREFIX, NUM_CTX, RESPONSE_RESERVE_TOKENS)
+from forecast3 import prepare_prophet_input, forecast_timeseries, generate_forecast_insight, FORECAST_PROFILE
 from util3 import get_nested_value
+from figures3 import (compact_figure, payload_size, enable_gzip, hash_json, figure_cache_get, figure_cache_put,
+                      COMPACT_TEMPLATE, TEMPLATE_NAME)
+from extract3 import load_extract_state
+from llm3 import run_llm_prompt, generate_with_retries
+from spec3 import generate_dashboard_spec, build_path_index, validate_dashboards, print_validation_report
+from backtest3 import load_leaderboard, engine_accuracy, best_engines
+from cube3 import cube_for
+
+# Wall-clock budget for all SKU forecasts; SKUs past it fall back to cheaper models
+FORECAST_BUDGET_SECONDS = 60
+# Last accepted LLaMA dashboard list, so WSGI workers never have to call the LLM
+DASHBOARD_SPEC_FILE = "dashboard_spec.json"
+# How long the page keeps polling for background LLaMA insights
+LLM_REFRESH_TIMEOUT_SECONDS = 300
+LLM_POLL_INTERVAL_MS = 2000
+# Rough size of one report's dashboard list in the answer, reserved when packing reports into a batch
+DASHBOARD_ANSWER_TOKENS = 400
+# plotly.js has no template registry: the page carries each template once and this swaps a compact figure's
+# template name for it in the browser
+RESOLVE_TEMPLATE_JS = """
+function(figure, templates) {
+    var layout = (figure && figure.layout) || {};
+    if (typeof layout.template !== "string") { return figure; }
+    return Object.assign({}, figure, {layout: Object.assign({}, layout, {template: templates[layout.template]})});
+}
+"""
+DEFAULT_HOST = os.environ.get("SMB_DASH_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.environ.get("SMB_DASH_PORT", "8050"))
 
 def load_json_data(filepath="financial_output.json"):
     with open(filepath, "r") as f:
         return json.load(f)
 
-def ask_llama_for_dashboard_suggestions(json_str):
-    prompt = get_dashboard_prompt(json_str)
-    result = subprocess.run(
-        ['ollama', 'run', 'llama3'],
-        input=prompt.encode('utf-8'),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        timeout=60
-    )
-    return result.stdout.decode('utf-8')
-
-def extract_dashboard_list_with_retry(json_str, max_attempts=5):
-    last_error = ""
-    for attempt in range(max_attempts):
-        print(f"🔁 Parsing LLaMA dashboard suggestion attempt {attempt + 1}...")
-        prompt = get_dashboard_prompt(json_str, error_message=last_error if attempt > 0 else None)
-        response = ask_llama_for_dashboard_suggestions(prompt)
+def _read_spec_file(filepath):
+    if not os.path.exists(filepath):
+        return {"latest": None, "specs": {}}
+    with open(filepath, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    if "specs" not in saved:
+        # Single-spec layout written before batching
+        digest = saved.get("data_digest")
+        return {"latest": digest, "specs": {digest: saved.get("dashboards", [])}}
+    return saved
+
+def save_dashboard_spec(dashboards, data_digest=None, filepath=DASHBOARD_SPEC_FILE):
+    # One file holds the spec of every report, keyed by the digest of its financial data
+    saved = _read_spec_file(filepath)
+    saved["specs"][data_digest] = dashboards
+    saved["latest"] = data_digest
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(saved, f, indent=2)
+
+def load_dashboard_spec(filepath=DASHBOARD_SPEC_FILE, data_digest=None):
+    # With data_digest given, only a spec saved for that financial data is returned
+    saved = _read_spec_file(filepath)
+    return saved["specs"].get(data_digest or saved["latest"], [])
+
+def summarize_charts(dashboards, financial_data):
+    lines = []
+    for i, dash in enumerate(dashboards, 1):
+        values = ", ".join(f"{label}={get_nested_value(financial_data, path)}"
+                           for label, path in dash["data_points"].items())
+        lines.append(f"{i}. {dash['title']} ({dash['chart_type']}): {values}")
+    return "\n".join(lines)
+
+def _parse_insights(response, count):
+    start = response.find('[')
+    end = response.rfind(']') + 1
+    insights = json.loads(response[start:end])
+    if not isinstance(insights, list) or len(insights) != count:
+        raise ValueError(f"Expected a list of {count} insights")
+    return insights
+
+def extract_insights_with_retry(dashboards, financial_data, max_attempts=3):
+    # Only the insight text comes from LLaMA; the chart specs are generated locally by spec3
+    charts_summary = summarize_charts(dashboards, financial_data)
+    insights, _ = generate_with_retries(
+        lambda error: get_insight_prompt(charts_summary, error_message=error),
+        get_dashboard_retry, lambda response: _parse_insights(response, len(dashboards)),
+        max_attempts, label="LLaMA chart insights")
+    if not insights:
+        return []
+    return [dict(dash, insight=str(insight)) for dash, insight in zip(dashboards, insights)]
+
+def start_llm_refresh(financial_data, dashboards):
+    # Runs the slow LLaMA round-trip off the request path; the page polls the returned state
+    state = {"status": "pending", "dashboards": None, "started": time.monotonic()}
+    data_digest = hash_json(financial_data)
+
+    def worker():
+        try:
+            dashboards_with_insights = extract_insights_with_retry(dashboards, financial_data)
+        except Exception as e:
+            print(f"❌ Background LLaMA refresh failed: {e}")
+            dashboards_with_insights = []
+        if dashboards_with_insights:
+            save_dashboard_spec(dashboards_with_insights, data_digest)
+            state["dashboards"] = dashboards_with_insights
+            state["status"] = "ready"
+        else:
+            state["status"] = "failed"
+
+    threading.Thread(target=worker, daemon=True).start()
+    return state
+
+def minify_json(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, quote_keys=True, trailing_commas=False)
+
+def split_batched_response(response, names):
+    # "### REPORT: name" headers -> {name: parsed dashboard list}; unparseable or missing reports are left out
+    pattern = re.compile(rf"^\s*{re.escape(REPORT_DELIMITER)}\s*(.+?)\s*$", re.MULTILINE)
+    headers = list(pattern.finditer(response))
+    parsed, errors = {}, {}
+    for i, match in enumerate(headers):
+        name = match.group(1).strip("*`\"' ")
+        if name not in names:
+            continue
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(response)
+        block = response[match.end():end]
         try:
-            start = response.find('[')
-            end = response.rfind(']') + 1
-            json_block = response[start:end].strip()
-            if not json_block:
-                raise ValueError("Received empty JSON string from LLaMA")
-            dashboard_json = json.loads(json_block)
-            if isinstance(dashboard_json, dict):
-                dashboard_json = [dashboard_json]
-            if not isinstance(dashboard_json, list):
+            start, stop = block.find('['), block.rfind(']') + 1
+            if start < 0 or stop <= start:
+                raise ValueError("No JSON list found")
+            dashboards = json.loads(block[start:stop])
+            if isinstance(dashboards, dict):
+                dashboards = [dashboards]
+            if not isinstance(dashboards, list):
                 raise ValueError("Expected a list of dashboards")
-            return dashboard_json
+            parsed[name] = dashboards
         except Exception as e:
-            last_error = str(e)
-            print(f"❌ Failed to parse JSON (attempt {attempt + 1}): {last_error}")
-            with open(f"llama_dashboard_attempt_{attempt + 1}.txt", "w", encoding="utf-8") as f:
-                f.write(response)
-    print("⚠️ All attempts failed. See llama_dashboard_attempt_*.txt for details.")
-    return []
+            errors[name] = str(e)
+    for name in names:
+        if name not in parsed and name not in errors:
+            errors[name] = "Report missing from the response"
+    return parsed, errors
+
+def report_token_savings(reports, num_ctx=NUM_CTX):
+    # Tokens needed to send every report alone (one indented prompt each) vs. in the pack_reports batches,
+    # both counted before trimming, so data assemble_prompt would drop never shows up as a saving
+    minified = {name: minify_json(data) for name, data in reports.items()}
+    single = sum(count_tokens("".join(dashboard_prompt_parts(json.dumps(data, indent=2, quote_keys=True))))
+                 for data in reports.values())
+    batches = pack_reports(minified, num_ctx)
+    batched = [count_tokens("".join(batched_dashboard_prompt_parts(batch))) for batch in batches]
+    print(f"🧮 Dashboard prompts for {len(reports)} report(s): ~{single:,} tokens in {len(reports)} call(s) alone "
+          f"-> ~{sum(batched):,} in {len(batches)} batched call(s) (saves ~{single - sum(batched):,})")
+    for n, (batch, tokens) in enumerate(zip(batches, batched), 1):
+        # A report too big for the window on its own gets a batch to itself and is still trimmed
+        over = f" ⚠️ over num_ctx={num_ctx:,}, data will be trimmed" if tokens + RESPONSE_RESERVE_TOKENS > num_ctx else ""
+        print(f"   batch {n}: {len(batch)} report(s), ~{tokens:,} tokens{over}")
+    return {"single": single, "batched": sum(batched), "calls": len(batches)}
+
+def pack_reports(minified, num_ctx=NUM_CTX):
+    # Greedily groups reports into as few calls as fit the context window, prompt and answers included
+    budget = num_ctx - count_tokens(BATCHED_DASHBOARD_PREFIX)
+    batches, current, used = [], {}, 0
+    for name, text in minified.items():
+        cost = count_tokens(f"{REPORT_DELIMITER} {name}\n{text}\n") + DASHBOARD_ANSWER_TOKENS
+        if current and used + cost > budget:
+            batches.append(current)
+            current, used = {}, 0
+        current[name] = text
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def extract_dashboard_lists_batched(reports, max_attempts=3):
+    # reports: {name: financial data}. One LLaMA call per context-window's worth of reports;
+    # retries only re-send the reports that failed
+    minified = {name: minify_json(data) for name, data in reports.items()}
+    results, pending, last_error = {}, list(reports), None
+    for attempt in range(max_attempts):
+        if not pending:
+            break
+        errors = {}
+        for batch in pack_reports({name: minified[name] for name in pending}):
+            print(f"🔁 Requesting dashboards for {len(batch)} report(s) in one LLaMA call, attempt {attempt + 1}...")
+            response = run_llm_prompt(get_batched_dashboard_prompt(batch, error_message=last_error))
+            print(format_prompt_stats("batched dashboard"))
+            parsed, batch_errors = split_batched_response(response, list(batch))
+            results.update(parsed)
+            errors.update(batch_errors)
+            if batch_errors:
+                with open(f"llama_batch_attempt_{attempt + 1}.txt", "a", encoding="utf-8") as f:
+                    f.write(response)
+        pending = [name for name in pending if name not in results]
+        if errors:
+            last_error = "; ".join(f"{name}: {error}" for name, error in errors.items())
+            print(f"❌ Failed to parse {len(errors)} report(s) (attempt {attempt + 1}): {last_error}")
+    if pending:
+        print(f"⚠️ No dashboards for: {', '.join(pending)}. See llama_batch_attempt_*.txt for details.")
+    return results
+
+def batch_dashboard_specs(paths):
+    # Ask for every report's dashboards at once and save each validated spec under its data digest
+    reports = {os.path.basename(path): load_json_data(path) for path in paths}
+    report_token_savings(reports)
+    suggested = extract_dashboard_lists_batched(reports)
+    for name, financial_data in reports.items():
+        dashboards, report = validate_dashboards(suggested.get(name, []), build_path_index(financial_data))
+        print(f"📄 {name}:")
+        print_validation_report(report)
+        if not dashboards:
+            dashboards = generate_dashboard_spec(financial_data)
+            print("   ⚠️ Nothing usable from LLaMA; saved the generated spec instead.")
+        save_dashboard_spec(dashboards, hash_json(financial_data))
+    print(f"✅ Saved {len(reports)} dashboard spec(s) to {DASHBOARD_SPEC_FILE}")
 
 def safe_value(val):
     return val if isinstance(val, (int, float)) else 0
 
-def build_dash_app(dashboards, financial_data):
+def build_dash_app(dashboards, financial_data, warm_start=False, hierarchy=None,
+                   auto_select=True, budget_seconds=FORECAST_BUDGET_SECONDS, compact_figures=True,
+                   use_cache=True, llm_state=None, profile=FORECAST_PROFILE, source=None):
     app = Dash(__name__)
-    plots = []
+    payload = {"before": 0, "after": 0}
+    stats = {"hits": 0, "misses": 0}
+    data_digest = hash_json(financial_data)
+    index = build_path_index(financial_data)
 
-    for dash in dashboards:
-        if not isinstance(dash, dict):
-            print(f"⚠️ Skipping invalid dashboard entry: {dash}")
-            continue
-        fig = generate_figure(dash, financial_data)
-        plots.append(html.Div([
-            html.H3(dash["title"], style={"color": "#f5c147"}),
-            html.P(dash["description"], style={"color": "#cccccc"}),
-            dcc.Graph(figure=fig),
-            html.Div(f"💡 Suggestion: {dash.get('insight', 'No insight provided.')}",
-                     style={"color": "#aaaaaa", "fontStyle": "italic", "marginTop": "10px"})
-        ], style={"marginBottom": "40px"}))
-
-    # Add Prophet forecast with insights
-    prophet_input = prepare_prophet_input(financial_data)
-    forecast_results, mode = forecast_timeseries(prophet_input, field_name="Revenue")
+    def figure_dict(fig):
+        if not compact_figures:
+            return fig.to_plotly_json()
+        compact = compact_figure(fig)
+        payload["before"] += payload_size(fig)[0]
+        payload["after"] += payload_size(compact)[0]
+        return compact
 
-    if mode == "multi":
-        for sku, fig, forecast_df, units_fig in forecast_results:
-            insight = generate_forecast_insight(forecast_df, sku)
+    graph_ids = itertools.count()
+
+    def graph(figure):
+        # Figures that name their template go out as Store data, resolved into the Graph by RESOLVE_TEMPLATE_JS
+        if not figure or not isinstance(figure.get("layout", {}).get("template"), str):
+            return dcc.Graph(figure=figure)
+        index = next(graph_ids)
+        return html.Div([dcc.Store(id={"type": "figure-data", "index": index}, data=figure),
+                         dcc.Graph(id={"type": "figure", "index": index})])
+
+    def cached(key_parts, build):
+        # Sections are stored as serialized JSON, so a hit never touches go.Figure
+        if not use_cache:
+            return build()
+        key = hash_json([data_digest, compact_figures and TEMPLATE_NAME] + key_parts)
+        section = figure_cache_get(key)
+        if section is None:
+            section = build()
+            figure_cache_put(key, section)
+            stats["misses"] += 1
+        else:
+            stats["hits"] += 1
+        return section
+
+    def chart_sections(dashboards):
+        dashboards, report = validate_dashboards(dashboards, index)
+        print_validation_report(report)
+        sections = []
+        for dash in dashboards:
+            figure = cached(["chart", dash], lambda: figure_dict(generate_figure(dash, financial_data, index)))
+            sections.append(html.Div([
+                html.H3(dash["title"], style={"color": "#f5c147"}),
+                html.P(dash["description"], style={"color": "#cccccc"}),
+                graph(figure),
+                html.Div(f"💡 Suggestion: {dash.get('insight', 'No insight provided.')}",
+                         style={"color": "#aaaaaa", "fontStyle": "italic", "marginTop": "10px"})
+            ], style={"marginBottom": "40px"}))
+        return sections
+
+    plots = [dcc.Store(id="figure-templates", data={TEMPLATE_NAME: COMPACT_TEMPLATE}),
+             html.Div(chart_sections(dashboards), id="llm-dashboards")]
+    app.clientside_callback(RESOLVE_TEMPLATE_JS, Output({"type": "figure", "index": MATCH}, "figure"),
+                            Input({"type": "figure-data", "index": MATCH}, "data"),
+                            State("figure-templates", "data"))
+    if llm_state is not None:
+        # Charts come from the locally generated spec; swap in LLaMA's insight text once the worker is done
+        plots.insert(0, html.Div(id="llm-status", style={"color": "#888888", "marginBottom": "20px"}))
+        plots.append(dcc.Interval(id="llm-poll", interval=LLM_POLL_INTERVAL_MS))
+
+        @app.callback(Output("llm-dashboards", "children"), Output("llm-status", "children"),
+                      Output("llm-poll", "disabled"), Input("llm-poll", "n_intervals"))
+        def poll_llm_dashboards(_):
+            if llm_state["status"] == "ready":
+                return chart_sections(llm_state["dashboards"]), "✅ LLaMA 3 insights loaded.", True
+            if llm_state["status"] == "pending":
+                if time.monotonic() - llm_state["started"] < LLM_REFRESH_TIMEOUT_SECONDS:
+                    return no_update, "⏳ Waiting for LLaMA 3 insights...", False
+                llm_state["status"] = "timeout"
+            return no_update, "⚠️ LLaMA 3 did not answer in time; showing the generated insights.", True
+
+    cube = cube_for(financial_data, data_digest)
+    if cube is not None and cube.skus:
+        for figure in cached(["rollup", ROLLUP_TOP_SKUS], lambda: build_rollup_section(cube, figure_dict)):
+            plots.append(html.Div([graph(figure)], style={"marginBottom": "40px"}))
+
+    # Accuracy notes and per-SKU engine picks come from a `python backtest3.py` run on this same data, if any
+    leaderboard = load_leaderboard(data_digest)
+    engine_overrides = best_engines(leaderboard)
+    forecast_options = ["forecast", warm_start, hierarchy, auto_select, budget_seconds, engine_overrides,
+                        leaderboard.to_dict("records"), profile, source]
+    forecast = cached(forecast_options, lambda: build_forecast_section(
+        financial_data, figure_dict, leaderboard, warm_start=warm_start, hierarchy=hierarchy,
+        auto_select=auto_select, budget_seconds=budget_seconds, engine_overrides=engine_overrides,
+        profile=profile, source=source))
+
+    if forecast["mode"] == "multi":
+        for item in forecast["items"]:
             plots.append(html.Div([
-                html.H3(f"📦 Forecast for SKU: {sku}", style={"color": "#f5c147"}),
-                dcc.Graph(figure=fig),
+                html.H3(f"📦 Forecast for SKU: {item['label']}", style={"color": "#f5c147"}),
+                graph(item["figure"]),
                 html.H4("📊 Units Forecast", style={"color": "#f5c147"}),
-                dcc.Graph(figure=units_fig),
-                html.P(insight, style={"color": "#cccccc"})
+                graph(item["units_figure"]),
+                html.P(item["insight"], style={"color": "#cccccc"})
             ]))     
 
-    elif mode == "single":
-        for sku, fig, forecast_df, units_fig in forecast_results:
+    elif forecast["mode"] == "hierarchy":
+        for item in forecast["items"]:
+            plots.append(html.Div([
+                html.H3(f"🌲 Reconciled Forecast: {item['label']}", style={"color": "#f5c147"}),
+                graph(item["figure"]),
+                html.P(item["insight"], style={"color": "#cccccc"})
+            ]))
+
+    elif forecast["mode"] == "single":
+        for item in forecast["items"]:
             plots.append(html.Div([
                 html.H3("📈 Forecasted Revenue Trend", style={"color": "#f5c147"}),
-                dcc.Graph(figure=fig),
+                graph(item["figure"]),
                 html.P("📊 This forecast projects overall revenue growth. Focus on scaling top-performing channels and reviewing cost centers.", style={"color": "#cccccc"})
             ]))
 
@@ -97,9 +349,63 @@ def build_dash_app(dashboards, financial_data):
         "fontFamily": "Segoe UI"
     })
 
+    if use_cache:
+        print(f"🗄️ Figure cache: {stats['hits']} hit(s), {stats['misses']} miss(es)")
+    enable_gzip(app.server)
+    if compact_figures:
+        raw, zipped = payload_size(app.layout)
+        if stats["misses"] or not use_cache:
+            print(f"📦 Figure payload: {payload['before'] / 1024:.0f} KB -> {payload['after'] / 1024:.0f} KB")
+        print(f"📦 Layout payload: {raw / 1024:.0f} KB ({zipped / 1024:.0f} KB gzipped)")
+
     return app
 
-def generate_figure(dash_config, financial_data):
+def build_forecast_section(financial_data, figure_dict, leaderboard, **forecast_kwargs):
+    # Everything the forecast part of the layout needs, as plain JSON-serializable data
+    prophet_input = prepare_prophet_input(financial_data)
+    table, mode = forecast_timeseries(prophet_input, field_name="Revenue",
+                                      categories=financial_data.get("sku_categories"), **forecast_kwargs)
+    items = []
+    for label in table:
+        if mode == "multi":
+            insight = generate_forecast_insight(table.forecast(label), label,
+                                                accuracy=engine_accuracy(leaderboard, label),
+                                                intervals=forecast_kwargs.get("profile", FORECAST_PROFILE) != "fast")
+        elif mode == "hierarchy":
+            insight = generate_forecast_insight(table.forecast(label), label)
+        else:
+            insight = None
+        units_fig = table.units_figure(label)
+        items.append({
+            "label": label,
+            "figure": figure_dict(table.figure(label)),
+            "units_figure": figure_dict(units_fig) if units_fig is not None else None,
+            "insight": insight
+        })
+    return {"mode": mode, "items": items}
+
+# SKUs shown in the rollup's top-sellers chart
+ROLLUP_TOP_SKUS = 10
+
+def build_rollup_section(cube, figure_dict):
+    # Sales overview straight from the rollup cube: each trace is one slice, no walk over sku_forecast
+    level = "quarter" if len(cube.levels["quarter"]) > 1 else "month"
+    by_category = go.Figure()
+    for category in cube.categories:
+        periods, values = cube.series("revenue", level, category=category)
+        by_category.add_trace(go.Bar(x=periods, y=values, name=category))
+    periods, profit = cube.series("profit", level)
+    by_category.add_trace(go.Scatter(x=periods, y=profit, name="Profit", mode="lines+markers",
+                                     line={"color": "#f5c147"}))
+    by_category.update_layout(title=f"Revenue by category per {level}", barmode="stack",
+                              template="plotly_dark", height=400)
+    top = cube.top(ROLLUP_TOP_SKUS, "revenue", level)
+    top_skus = go.Figure(go.Bar(x=[value for _, value in top][::-1], y=[sku for sku, _ in top][::-1],
+                                orientation="h", marker_color="#f5c147"))
+    top_skus.update_layout(title=f"Top {len(top)} SKUs by revenue", template="plotly_dark", height=400)
+    return [figure_dict(by_category), figure_dict(top_skus)]
+
+def generate_figure(dash_config, financial_data, index=None):
     import numpy as np
     import pandas as pd
 
@@ -108,7 +414,11 @@ def generate_figure(dash_config, financial_data):
     data_points = dash_config.get("data_points", {})
 
     labels = list(data_points.keys())
-    values = [get_nested_value(financial_data, path) or 0 for path in data_points.values()]
+    if index is not None:
+        # Paths were already checked by validate_dashboards, so these are plain dict hits
+        values = [index["values"].get(path) or 0 for path in data_points.values()]
+    else:
+        values = [get_nested_value(financial_data, path) or 0 for path in data_points.values()]
     fig = go.Figure()
 
     if chart_type in ["line", "time series"]:
@@ -127,16 +437,75 @@ def generate_figure(dash_config, financial_data):
     fig.update_layout(title=title, template="plotly_dark", height=400)
     return fig
 
-def main():
+def create_app(data_path="financial_output.json", spec_path=DASHBOARD_SPEC_FILE, hierarchy=None):
+    # Builds the app from precomputed state only (saved spec + figure cache); used by wsgi3 workers
+    financial_data = load_json_data(data_path)
+    dashboards = load_dashboard_spec(spec_path, data_digest=hash_json(financial_data))
+    if not dashboards:
+        print(f"⚠️ No saved dashboard spec for this data at {spec_path}; using generated insights.")
+        dashboards = generate_dashboard_spec(financial_data)
+    state = load_extract_state()
+    return build_dash_app(dashboards, financial_data, warm_start=state.get("warm_start", False),
+                          hierarchy=hierarchy, source=state.get("source"))
+
+def serve(app, host=DEFAULT_HOST, port=DEFAULT_PORT, server="dev", workers=4, debug=False, hierarchy=None):
+    print(f"Running dashboard at http://{host}:{port}/ ({server})")
+    if server == "dev":
+        # The reloader would re-run the LLM call and every forecast, so it stays off unless asked for
+        app.run(host=host, port=port, debug=debug, use_reloader=False)
+    elif server == "waitress":
+        from waitress import serve as waitress_serve
+        waitress_serve(app.server, host=host, port=port, threads=workers)
+    elif server == "gunicorn":
+        # Workers import wsgi3, which rebuilds the app from the spec and figure cache just written
+        env = dict(os.environ)
+        if hierarchy:
+            env["SMB_DASH_HIERARCHY"] = hierarchy
+        subprocess.run(["gunicorn", "-w", str(workers), "-b", f"{host}:{port}", "wsgi3:server"], env=env)
+    else:
+        raise ValueError(f"Unknown server: {server}. Use dev, waitress or gunicorn")
+
+def main(hierarchy=None, host=DEFAULT_HOST, port=DEFAULT_PORT, server="dev", workers=4, debug=False,
+         use_llm=True):
     financial_data = load_json_data()
-    json_str = json.dumps(financial_data, indent=2)
-    dashboards = extract_dashboard_list_with_retry(json_str)
-    if dashboards:
-        app = build_dash_app(dashboards, financial_data)
-        print("Running dashboard at http://127.0.0.1:8050/")
-        app.run(debug=True)
+    data_digest = hash_json(financial_data)
+    # Incremental extractions only appended rows, so Prophet can start from the parameters the last run
+    # saved for the same source file
+    state = load_extract_state()
+    warm_start = state.get("warm_start", False)
+    # Chart specs are generated locally so every data path exists; LLaMA only writes insight text
+    saved = load_dashboard_spec(data_digest=data_digest)
+    dashboards = saved or generate_dashboard_spec(financial_data)
+    refresh = use_llm and not saved
+
+    if server == "gunicorn":
+        # Workers are separate processes that only read the saved spec, so ask LLaMA up front
+        if refresh:
+            dashboards = extract_insights_with_retry(dashboards, financial_data) or dashboards
+        save_dashboard_spec(dashboards, data_digest)
+        app = create_app(hierarchy=hierarchy)
     else:
-        print("No valid dashboards returned by LLaMA 3.")
+        llm_state = start_llm_refresh(financial_data, dashboards) if refresh else None
+        app = build_dash_app(dashboards, financial_data, warm_start=warm_start, hierarchy=hierarchy,
+                             llm_state=llm_state, source=state.get("source"))
+    serve(app, host=host, port=port, server=server, workers=workers, debug=debug, hierarchy=hierarchy)
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Build and serve the financial dashboard.")
+    parser.add_argument("hierarchy", nargs="?", default=None,
+                        help="optional reconciliation method: auto | bottom_up | top_down | middle_out | mint")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--server", choices=["dev", "waitress", "gunicorn"], default="dev")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers / waitress threads")
+    parser.add_argument("--debug", action="store_true", help="Dash debug mode (dev server only)")
+    parser.add_argument("--no-llm", action="store_true", help="keep the generated insights, never call LLaMA")
+    parser.add_argument("--batch", nargs="+", metavar="JSON",
+                        help="request dashboards for several extracted reports in one LLaMA call, save them and exit")
+    args = parser.parse_args()
+    if args.batch:
+        batch_dashboard_specs(args.batch)
+        raise SystemExit
+    main(args.hierarchy, host=args.host, port=args.port, server=args.server,
+         workers=args.workers, debug=args.debug, use_llm=not args.no_llm)
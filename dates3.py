@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+# Tried in order when inferring a column's format; on a tie (all days <= 12) the earlier format wins
+DATE_FORMATS = (
+    "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M",
+    "%m/%d/%Y", "%d/%m/%Y", "%m/%d/%y", "%d/%m/%y", "%m/%d/%Y %H:%M", "%d/%m/%Y %H:%M",
+    "%m-%d-%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d", "%Y%m%d",
+    "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y",
+    "%Y-%m", "%Y/%m", "%m/%Y", "%b %Y", "%B %Y", "%b-%y", "%Y"
+)
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%H:%M:%S.%f", "%I:%M %p", "%I:%M:%S %p")
+
+INFER_SAMPLE_SIZE = 100
+
+# format -> Series of Timestamps indexed by raw value, shared across calls: month keys and transaction
+# dates repeat a lot. Looked up with one reindex, so a hit costs less than parsing again.
+DATE_CACHE_MAX_ITEMS = 100_000
+_parsed = {}
+
+BUCKETS = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+
+def infer_format(values, formats=DATE_FORMATS, sample_size=INFER_SAMPLE_SIZE):
+    # Best format for a sample of distinct strings: the one that parses the most of them (None if none do)
+    sample = pd.Index(pd.Series(values).dropna().astype(str).str.strip().unique()[:sample_size])
+    if sample.empty:
+        return None
+    best, best_count = None, 0
+    for fmt in formats:
+        count = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if count > best_count:
+            best, best_count = fmt, count
+            if count == len(sample):
+                break
+    return best
+
+def _parse_one(value, formats):
+    # Per-value fallback for mixed-format columns
+    for fmt in formats:
+        parsed = pd.to_datetime(value, format=fmt, errors="coerce")
+        if pd.notna(parsed):
+            return parsed
+    try:
+        return pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return pd.NaT
+
+def _remember(fmt, parsed):
+    if sum(map(len, _parsed.values())) + len(parsed) > DATE_CACHE_MAX_ITEMS:
+        _parsed.clear()
+    _parsed[fmt] = pd.concat([_parsed[fmt], parsed]) if fmt in _parsed else parsed
+
+def _parse_uniques(uniques, fmt, formats):
+    # Cached values first, then one vectorized explicit-format parse, then per-value fallback for what's left
+    index = pd.Index(uniques)
+    cache = _parsed.get(fmt)
+    if cache is None:
+        result, misses = pd.Series(pd.NaT, index=index, dtype="datetime64[ns]"), np.ones(len(index), dtype=bool)
+    else:
+        # Unparseable values are cached as NaT too, so misses come from the index rather than the values
+        result, misses = cache.reindex(index), ~index.isin(cache.index)
+    if misses.any():
+        values = index[misses]
+        parsed = pd.Series(pd.to_datetime(values.str.strip(), format=fmt, errors="coerce"), index=values)
+        for j in np.flatnonzero(parsed.isna()):
+            parsed.iat[j] = _parse_one(values[j].strip(), formats)
+        result[misses] = parsed.to_numpy()
+        _remember(fmt, parsed)
+    return result.reset_index(drop=True)
+
+def parse_dates(values, fmt=None, formats=DATE_FORMATS):
+    # Vectorized parse of a column of date strings: format inferred once, each distinct value parsed once
+    series = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    codes, uniques = pd.factorize(series)
+    if len(uniques) and not all(isinstance(v, str) for v in uniques):
+        # Excel cells already hold datetimes (or numbers); nothing to infer
+        parsed_uniques = pd.Series(pd.to_datetime(pd.Index(uniques).astype(str), errors="coerce", format="mixed"))
+    else:
+        fmt = fmt or infer_format(uniques, formats) or formats[0]
+        parsed_uniques = _parse_uniques(list(uniques), fmt, formats)
+    parsed = parsed_uniques.to_numpy()[codes]
+    parsed[codes < 0] = np.datetime64("NaT")
+    return pd.Series(parsed, index=series.index, name=series.name)
+
+def parse_times(values, fmt=None):
+    # Time-of-day column ("12:23", datetime.time cells) -> timedelta since midnight
+    series = pd.Series(values)
+    if pd.api.types.is_timedelta64_dtype(series):
+        return series
+    strings = series.where(series.isna(), series.astype(str))
+    parsed = parse_dates(strings, fmt, formats=TIME_FORMATS)
+    return parsed - parsed.dt.normalize()
+
+def combine_date_time(dates, times=None, date_fmt=None, time_fmt=None):
+    combined = parse_dates(dates, date_fmt)
+    if times is None:
+        return combined
+    return combined.dt.normalize() + parse_times(times, time_fmt).fillna(pd.Timedelta(0))
+
+def bucket_dates(dates, bucket="month"):
+    # Start of each date's day/week/month/quarter/year, as Timestamps
+    return pd.Series(dates).dt.to_period(BUCKETS[bucket]).dt.start_time
+
+def period_labels(dates, bucket="month"):
+    # "2023-07-29", "2023-07-24/2023-07-30", "2023-07", "2023Q3", "2023"
+    return pd.Series(dates).dt.to_period(BUCKETS[bucket]).astype(str)
+
+def detect_datetime_columns(df, sample_size=INFER_SAMPLE_SIZE):
+    # -> (date column, time column); either may be None. Datetime-typed columns count as dates.
+    date_col = time_col = None
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            date_col = date_col or name
+            continue
+        if col.dtype != object and not isinstance(col.dtype, pd.CategoricalDtype):
+            continue
+        sample = col.dropna().astype(str).unique()[:sample_size]
+        if not len(sample):
+            continue
+        if time_col is None and _full_match(sample, TIME_FORMATS):
+            time_col = name
+        elif date_col is None and _full_match(sample, DATE_FORMATS[:-1]):
+            date_col = name
+    return date_col, time_col
+
+def _full_match(sample, formats):
+    # Every value parses with one of the formats (mixed-format columns count)
+    remaining = pd.Index(sample)
+    for fmt in formats:
+        remaining = remaining[pd.isna(pd.to_datetime(remaining, format=fmt, errors="coerce"))]
+        if remaining.empty:
+            return True
+    return False
@@ -1,8 +1,17 @@
 import pandas as pd
+import hashlib
 import json
 import os
-import subprocess
-from prompts import get_extraction_prompt, get_timeseries_prompt
+from prompts import (get_extraction_prompt, get_timeseries_prompt, get_line_item_prompt, format_prompt_stats,
+                     get_extraction_retry, get_timeseries_retry, get_line_item_retry)
+from workbook3 import read_workbook, read_csv_sheet, optimize_sheets, render_frame
+from statements3 import match_line_items, missing_items, build_summary, print_match_report
+from schema3 import extract_with_schema, learn_schema
+from skus3 import cluster_sku_forecast
+from cleanse3 import cleanse_sheets
+from cube3 import CUBE_FILE, build_cube, cube_from_sku_forecast, save_cube
+from figures3 import hash_json
+from llm3 import generate_with_retries, format_prompt_eval_stats, PROMPT_EVAL_STATS
 
 def read_data(file_path_or_url):
     data = {}
@@ -12,18 +21,16 @@ def read_data(file_path_or_url):
                 print("Reading from Google Sheets...")
                 sheet_id = file_path_or_url.split("/d/")[1].split("/")[0]
                 export_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-                df = pd.read_csv(export_url)
-                data["Google Sheet"] = df.fillna('')
+                df = read_csv_sheet(export_url)
+                data = optimize_sheets({"Google Sheet": df})
             else:
                 raise ValueError("Only Google Sheets URLs are supported for now.")
         elif file_path_or_url.endswith(".csv"):
             print("Reading CSV file...")
-            df = pd.read_csv(file_path_or_url)
-            data["CSV File"] = df.fillna('')
+            data = read_workbook(file_path_or_url)
         elif file_path_or_url.endswith((".xlsx", ".xls")):
             print("Reading Excel file...")
-            xls = pd.ExcelFile(file_path_or_url, engine='openpyxl')
-            data = {sheet: xls.parse(sheet).fillna('') for sheet in xls.sheet_names}
+            data = read_workbook(file_path_or_url)
         else:
             raise ValueError("Unsupported file type or URL format.")
     except Exception as e:
@@ -34,22 +41,9 @@ def format_for_prompt(data_dict):
     formatted = ""
     for sheet, df in data_dict.items():
         formatted += f"\n### Sheet: {sheet}\n"
-        formatted += df.to_csv(index=False)
+        formatted += df.to_csv(index=False, na_rep='')
     return formatted
 
-def run_ollama_prompt(prompt, model='llama3'):
-    try:
-        result = subprocess.run(
-            ['ollama', 'run', model],
-            input=prompt.encode('utf-8'),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=90
-        )
-        return result.stdout.decode('utf-8')
-    except Exception as e:
-        return f"Error running ollama: {e}"
-
 def extract_json_from_response(response):
     try:
         start = response.find('{')
@@ -59,35 +53,213 @@ def extract_json_from_response(response):
         print(f"Failed to parse JSON: {e}")
         return {"raw_response": response}
 
+EXTRACT_STATE_FILE = "extract_state.json"
+OUTPUT_FILE = "financial_output.json"
+
+def fingerprint_rows(df):
+    # One uint64 per row, computed on the string form so dtype drift between runs doesn't change old rows
+    return pd.util.hash_pandas_object(render_frame(df).astype(str), index=False).values
+
+def _prefix_digest(row_hashes):
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+def build_extract_state(path_or_url, data, mode, warm_start=False):
+    sheets = {}
+    for sheet, df in data.items():
+        row_hashes = fingerprint_rows(df)
+        sheets[sheet] = {
+            "columns": [str(c) for c in df.columns],
+            "rows": len(row_hashes),
+            "digest": _prefix_digest(row_hashes)
+        }
+    return {"source": path_or_url, "mode": mode, "warm_start": warm_start, "sheets": sheets}
+
+def load_extract_state(filepath=EXTRACT_STATE_FILE):
+    if not os.path.exists(filepath):
+        return {}
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read extraction state: {e}")
+        return {}
+
+def save_extract_state(state, filepath=EXTRACT_STATE_FILE):
+    with open(filepath, "w") as f:
+        json.dump(state, f, indent=2)
+
+def detect_appended_rows(data, state):
+    # Returns {sheet: new_rows_df} when every sheet only grew at the end, otherwise None
+    old_sheets = state.get("sheets", {})
+    if set(old_sheets) != set(data):
+        return None
+    appended = {}
+    for sheet, df in data.items():
+        old = old_sheets[sheet]
+        if old.get("columns") != [str(c) for c in df.columns] or len(df) < old.get("rows", 0):
+            return None
+        row_hashes = fingerprint_rows(df)
+        if _prefix_digest(row_hashes[:old["rows"]]) != old.get("digest"):
+            return None
+        if len(df) > old["rows"]:
+            appended[sheet] = df.iloc[old["rows"]:]
+    return appended
+
+def _merge_month(old_val, new_val):
+    if isinstance(old_val, dict) and isinstance(new_val, dict):
+        merged = dict(old_val)
+        merged["units"] = float(old_val.get("units", 1)) + float(new_val.get("units", 1))
+        for key in ("price", "cost"):
+            if key in new_val:
+                merged[key] = new_val[key]
+        return merged
+    if isinstance(old_val, (int, float)) and isinstance(new_val, (int, float)):
+        return round(old_val + new_val, 2)
+    return new_val
+
+def merge_sku_forecast(old_data, new_data):
+    merged = {sku: dict(months) for sku, months in old_data.get("sku_forecast", {}).items()}
+    for sku, months in new_data.get("sku_forecast", {}).items():
+        target = merged.setdefault(sku, {})
+        for month, val in months.items():
+            target[month] = _merge_month(target[month], val) if month in target else val
+    result = dict(old_data)
+    result["sku_forecast"] = {sku: dict(sorted(months.items())) for sku, months in merged.items()}
+    return result
+
+def extract_incremental(path_or_url, data):
+    # Only append-only growth of a previous forecast extraction of the same source qualifies
+    state = load_extract_state()
+    if state.get("source") != path_or_url or state.get("mode") != "forecast" or not os.path.exists(OUTPUT_FILE):
+        return None
+    with open(OUTPUT_FILE, "r") as f:
+        previous = json.load(f)
+    if "sku_forecast" not in previous:
+        return None
+    appended = detect_appended_rows(data, state)
+    if appended is None:
+        print("🔄 Sheet contents changed beyond appended rows, running full extraction...")
+        return None
+    if not appended:
+        print("✅ No new rows since last run, keeping existing extraction.")
+        return previous
+    new_rows = sum(len(df) for df in appended.values())
+    print(f"➕ Extracting {new_rows} appended row(s) only...")
+    new_data = extract_timeseries_with_retries(format_for_prompt(appended))
+    if "sku_forecast" not in new_data:
+        print("⚠️ Could not extract appended rows, running full extraction...")
+        return None
+    return merge_sku_forecast(previous, new_data)
+
+def _parse_timeseries(response):
+    json_data = extract_json_from_response(response)
+    if "sku_forecast" not in json_data:
+        raise ValueError("Expected a JSON object with a \"sku_forecast\" key")
+    return json_data
+
+def _parse_summary(response):
+    json_data = extract_json_from_response(response)
+    if "revenue_analysis" not in json_data:
+        raise ValueError("Expected a JSON object with a \"revenue_analysis\" key")
+    return json_data
+
+def _line_item_parser(labels, missing):
+    by_key = {label.lower(): label for label in labels}
+
+    def parse(response):
+        json_data = extract_json_from_response(response)
+        if "raw_response" in json_data:
+            raise ValueError("Expected a JSON object mapping each missing line item to a label or null")
+        mapping = {}
+        for item, label in json_data.items():
+            if item not in missing or label is None:
+                continue
+            if str(label).strip().lower() not in by_key:
+                raise ValueError(f"{label!r} is not one of the listed labels")
+            mapping[item] = by_key[str(label).strip().lower()]
+        return mapping
+    return parse
+
+def resolve_line_items(matched, unmatched, missing):
+    # Only the leftover labels (no values) and the still-missing items are sent to the LLM
+    values = {}
+    for label, by_year in unmatched:
+        values.setdefault(label, by_year)
+    labels = list(values)
+    print(f"🔍 Asking the LLM about {len(labels)} unresolved label(s) for: {', '.join(missing)}")
+    mapping, _ = generate_with_retries(
+        lambda error: get_line_item_prompt(labels, missing, error_message=error),
+        get_line_item_retry, _line_item_parser(labels, missing), label="Line-item matching")
+    print(format_prompt_stats("line items"))
+    for item, label in (mapping or {}).items():
+        matched[item] = (label, values[label])
+        print(f"   {item}: {label!r} (from the LLM)")
+    return matched
+
+def extract_summary(data, prompt_data):
+    # Line-item statements are matched locally; the whole sheet only goes to the LLM when nothing in it
+    # looked like a statement line item
+    matched, unmatched = match_line_items(data)
+    if not matched:
+        json_data, response = generate_with_retries(
+            lambda error: get_extraction_prompt(prompt_data, error_message=error),
+            get_extraction_retry, _parse_summary, label="Summary extraction")
+        print(format_prompt_stats("extraction"))
+        return json_data, response
+    print_match_report(matched, unmatched)
+    missing = missing_items(matched)
+    if missing and unmatched:
+        resolve_line_items(matched, unmatched, missing)
+    return build_summary(matched), ""
+
 def extract_timeseries_with_retries(prompt_data, max_attempts=3):
-    last_error = ""
-    for attempt in range(max_attempts):
-        prompt = get_timeseries_prompt(prompt_data, error_message=last_error if attempt > 0 else None)
-        response = run_ollama_prompt(prompt)
-        try:
-            return extract_json_from_response(response)
-        except Exception as e:
-            last_error = str(e)
-            print(f"❌ Retry {attempt + 1} failed: {last_error}")
-    return {}
-
-def main(path_or_url, mode="summary"):
+    json_data, _ = generate_with_retries(
+        lambda error: get_timeseries_prompt(prompt_data, error_message=error),
+        get_timeseries_retry, _parse_timeseries, max_attempts, label="Time series extraction")
+    print(format_prompt_stats("timeseries"))
+    return json_data or {}
+
+def save_rollup_cube(json_data, transactions=None, renamed=None, filepath=CUBE_FILE):
+    # Daily levels when the transactions are at hand (registered schema), months and up otherwise
+    digest = hash_json(json_data)
+    if transactions is not None:
+        transactions = transactions.assign(sku=transactions["sku"].astype(str).replace(renamed or {}))
+        cube = build_cube(transactions, categories=json_data.get("sku_categories"), digest=digest)
+    else:
+        cube = cube_from_sku_forecast(json_data, digest)
+    save_cube(cube, filepath)
+    print(f"🧊 Rollup cube saved to {filepath}: {len(cube.skus)} SKU(s), {len(cube.categories)} categor"
+          f"{'y' if len(cube.categories) == 1 else 'ies'}, levels {', '.join(cube.levels)}")
+
+def main(path_or_url, mode="summary", incremental=False):
     data = read_data(path_or_url)
     if not data:
         print("❌ No data extracted from file.")
         return
 
+    if mode == "forecast":
+        data, _ = cleanse_sheets(data)
     prompt_data = format_for_prompt(data)
     json_data = None
+    response = ""
+    warm_start = False
+
+    transactions = None
+    if mode == "forecast":
+        json_data, transactions = extract_with_schema(data)
+    from_schema = json_data is not None
+
+    if incremental and mode == "forecast" and not from_schema:
+        json_data = extract_incremental(path_or_url, data)
+        warm_start = json_data is not None
 
-    if mode == "summary":
+    if from_schema:
+        print("🗂️ Aggregated transactions with a registered schema.")
+    elif warm_start:
+        print("📎 Merged appended rows into the previous extraction.")
+    elif mode == "summary":
         print("🔍 Running summary extraction...")
-        for attempt in range(3):
-            prompt = get_extraction_prompt(prompt_data)
-            response = run_ollama_prompt(prompt)
-            json_data = extract_json_from_response(response)
-            if "revenue_analysis" in json_data:
-                break
+        json_data, response = extract_summary(data, prompt_data)
     elif mode == "forecast":
         print("📈 Extracting time series for Prophet...")
         json_data = extract_timeseries_with_retries(prompt_data)
@@ -100,13 +272,23 @@ def main(path_or_url, mode="summary"):
         with open("financial_output_raw.txt", "w") as f:
             f.write(response)
     else:
-        with open("financial_output.json", "w") as f:
+        if mode == "forecast":
+            # Learned on the names as they appear in the sheet, before variants are merged
+            if not from_schema:
+                learn_schema(data, json_data, path_or_url)
+            json_data, renamed = cluster_sku_forecast(json_data)
+        with open(OUTPUT_FILE, "w") as f:
             json.dump(json_data, f, indent=2)
-        print("✅ JSON data saved to financial_output.json")
+        save_extract_state(build_extract_state(path_or_url, data, mode, warm_start=warm_start))
+        print(f"✅ JSON data saved to {OUTPUT_FILE}")
+        if mode == "forecast":
+            save_rollup_cube(json_data, transactions, renamed)
+    if PROMPT_EVAL_STATS["retries"]:
+        print(format_prompt_eval_stats())
 
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 3:
-        print("Usage: python extract2.py <path_or_url> <mode: summary|forecast>")
+        print("Usage: python extract3.py <path_or_url> <mode: summary|forecast> [incremental]")
     else:
-        main(sys.argv[1], sys.argv[2])
+        main(sys.argv[1], sys.argv[2], incremental="incremental" in sys.argv[3:])
@@ -0,0 +1,208 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from collections import OrderedDict
+import numpy as np
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+# Series longer than this are drawn with WebGL, longer than MAX_POINTS are downsampled with LTTB
+SCATTERGL_MIN_POINTS = 500
+MAX_POINTS = 1000
+DECIMALS = 2
+GZIP_MIN_BYTES = 1024
+
+FIGURE_CACHE_DIR = "figure_cache"
+FIGURE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+FIGURE_CACHE_MEMORY_ITEMS = 128
+
+# The handful of plotly_dark settings these charts rely on. The full plotly_dark template is ~8 KB
+# and was being embedded in every single figure.
+COMPACT_TEMPLATE = {
+    "layout": {
+        "colorway": ["#636efa", "#EF553B", "#00cc96", "#ab63fa", "#FFA15A",
+                     "#19d3f3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52"],
+        "font": {"color": "#f2f5fa"},
+        "hovermode": "closest",
+        "paper_bgcolor": "rgb(17,17,17)",
+        "plot_bgcolor": "rgb(17,17,17)",
+        "xaxis": {"gridcolor": "#283442", "linecolor": "#506784", "zerolinecolor": "#283442"},
+        "yaxis": {"gridcolor": "#283442", "linecolor": "#506784", "zerolinecolor": "#283442"}
+    }
+}
+
+# Compact figures only name the template. plotly.py resolves the name through its registry; in the browser the
+# dashboard page carries the template once and resolves it there (see dashboard3.figure_graph).
+TEMPLATE_NAME = "smb_dark"
+pio.templates[TEMPLATE_NAME] = COMPACT_TEMPLATE
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keep the point per bucket that spans the largest triangle
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:nxt_end].mean(), y[end:nxt_end].mean()
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[prev] - avg_x) * (by - y[prev]) - (x[prev] - bx) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        keep[i + 1] = prev
+    return keep
+
+def _numeric_x(x):
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ms]").astype(float)
+    try:
+        return x.astype(float)
+    except (TypeError, ValueError):
+        return np.arange(len(x), dtype=float)
+
+def _compact_x(x):
+    # Midnight timestamps serialise as "2023-01-31" instead of "2023-01-31T00:00:00"
+    if np.issubdtype(x.dtype, np.datetime64):
+        days = x.astype("datetime64[D]")
+        if (x == days).all():
+            return np.datetime_as_string(days, unit="D").tolist()
+        return np.datetime_as_string(x.astype("datetime64[s]"), unit="s").tolist()
+    return x.tolist()
+
+def _compact_trace(trace, max_points, gl_threshold, decimals):
+    trace = dict(trace)
+    if trace.get("type") != "scatter" or "x" not in trace or "y" not in trace:
+        return trace
+    x, y = np.asarray(trace["x"]), np.asarray(trace["y"], dtype=float)
+    if x.dtype == object and len(x) and isinstance(x[0], datetime.date):
+        # go.Figure.to_plotly_json hands dates back as datetime objects
+        x = x.astype("datetime64[us]")
+    if len(y) > max_points:
+        keep = lttb_indices(_numeric_x(x), np.nan_to_num(y), max_points)
+        x, y = x[keep], y[keep]
+    trace["x"] = _compact_x(x)
+    trace["y"] = np.round(y, decimals).tolist()
+    if len(y) >= gl_threshold:
+        trace["type"] = "scattergl"
+    return trace
+
+def _merge_bounds(traces):
+    # Lower/Upper Bound line pairs become one filled band trace
+    names = [t.get("name") for t in traces]
+    if "Lower Bound" not in names or "Upper Bound" not in names:
+        return traces
+    lower = traces[names.index("Lower Bound")]
+    upper = traces[names.index("Upper Bound")]
+    band = {
+        "type": upper["type"],
+        "name": "80% Interval",
+        "x": list(lower["x"]) + list(upper["x"])[::-1],
+        "y": list(lower["y"]) + list(upper["y"])[::-1],
+        "fill": "toself",
+        "fillcolor": "rgba(99,110,250,0.2)",
+        "line": {"width": 0},
+        "hoverinfo": "skip"
+    }
+    rest = [t for t in traces if t.get("name") not in ("Lower Bound", "Upper Bound")]
+    return [band] + rest
+
+def compact_figure(fig, max_points=MAX_POINTS, gl_threshold=SCATTERGL_MIN_POINTS, decimals=DECIMALS):
+    # go.Figure (or figure dict) -> plain dict that dcc.Graph accepts, with the payload trimmed
+    fig_dict = fig.to_plotly_json() if hasattr(fig, "to_plotly_json") else fig
+    traces = [_compact_trace(t, max_points, gl_threshold, decimals) for t in fig_dict.get("data", [])]
+    layout = dict(fig_dict.get("layout", {}))
+    layout["template"] = TEMPLATE_NAME
+    return {"data": _merge_bounds(traces), "layout": layout}
+
+def payload_size(obj):
+    raw = json.dumps(obj, cls=PlotlyJSONEncoder).encode("utf-8")
+    return len(raw), len(gzip.compress(raw, compresslevel=6))
+
+GZIP_MIMETYPES = ("application/json", "text/html", "text/javascript", "application/javascript", "text/css")
+
+def enable_gzip(server, min_size=GZIP_MIN_BYTES):
+    # Compress layout/callback JSON and Dash's JS/CSS bundles when the browser allows it
+    from flask import request
+    # Fingerprinted bundles are immutable (Dash sends a one-year max-age), so compress each only once
+    static_cache = {}
+
+    @server.after_request
+    def gzip_response(response):
+        if (response.direct_passthrough or response.status_code != 200
+                or "Content-Encoding" in response.headers
+                or "gzip" not in request.headers.get("Accept-Encoding", "").lower()
+                or response.mimetype not in GZIP_MIMETYPES):
+            return response
+        immutable = "max-age" in response.headers.get("Cache-Control", "")
+        if immutable and request.full_path in static_cache:
+            compressed = static_cache[request.full_path]
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            compressed = gzip.compress(data, compresslevel=6)
+            if immutable:
+                static_cache[request.full_path] = compressed
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers["Content-Length"] = str(len(response.get_data()))
+        response.headers.add("Vary", "Accept-Encoding")
+        return response
+
+    return server
+
+def hash_json(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, cls=PlotlyJSONEncoder).encode("utf-8")).hexdigest()
+
+# In-process LRU of serialized blobs in front of the on-disk cache
+_memory_cache = OrderedDict()
+
+def _remember(key, blob):
+    _memory_cache[key] = blob
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > FIGURE_CACHE_MEMORY_ITEMS:
+        _memory_cache.popitem(last=False)
+
+def figure_cache_get(key, cache_dir=FIGURE_CACHE_DIR):
+    path = os.path.join(cache_dir, f"{key}.json")
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        if os.path.exists(path):
+            os.utime(path)
+        return json.loads(_memory_cache[key])
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            blob = f.read()
+        # File mtime doubles as the on-disk LRU clock
+        os.utime(path)
+    except OSError:
+        return None
+    _remember(key, blob)
+    return json.loads(blob)
+
+def figure_cache_put(key, obj, cache_dir=FIGURE_CACHE_DIR, max_bytes=FIGURE_CACHE_MAX_BYTES):
+    blob = json.dumps(obj, cls=PlotlyJSONEncoder)
+    _remember(key, blob)
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(blob)
+    os.replace(tmp_path, path)
+    _evict(cache_dir, max_bytes)
+    return blob
+
+def _evict(cache_dir, max_bytes):
+    entries = [e for e in os.scandir(cache_dir) if e.name.endswith(".json")]
+    total = sum(e.stat().st_size for e in entries)
+    for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+        if total <= max_bytes:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+        _memory_cache.pop(entry.name[:-len(".json")], None)
@@ -1,6 +1,22 @@
 from prophet import Prophet
+import hashlib
+import json
+import os
+import time
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
+from dates3 import parse_dates
+
+# Fitted Prophet parameters for warm starts, one file per data source; kept with the other caches, never in
+# the working directory
+FORECAST_CACHE_DIR = os.environ.get("SMB_FORECAST_CACHE", "forecast_cache")
+# "accurate" (default): Prophet's defaults (80% intervals from 1000 posterior samples); "fast", opt-in: no
+# uncertainty sampling (so no intervals), only the seasonalities the series can show, one future frame per date grid
+FORECAST_PROFILES = ("fast", "accurate")
+FORECAST_PROFILE = os.environ.get("SMB_FORECAST_PROFILE", "accurate")
+# Prophet's default yearly Fourier order; only the fast profile lowers it
+YEARLY_FOURIER_ORDER = 10
 
 def clean_price(price_str):
     if isinstance(price_str, str):
@@ -39,87 +55,433 @@ def prepare_prophet_input(financial_data):
     else:
         return []
 
-def forecast_timeseries(data, field_name="Revenue", periods=12, freq="ME"):
+def prophet_params_file(source):
+    # Keyed by the extracted file, so two workbooks with the same SKU names never share parameters
+    digest = hashlib.sha256(str(source).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(FORECAST_CACHE_DIR, f"prophet_params-{digest}.json")
+
+def load_prophet_params(filepath):
+    if not os.path.exists(filepath):
+        return {}
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read saved Prophet parameters: {e}")
+        return {}
+
+def save_prophet_params(params, filepath):
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(params, f)
+    os.replace(tmp_path, filepath)
+
+def _stan_init(model):
+    # MAP fit => first (only) sample of each parameter
+    init = {name: float(model.params[name][0][0]) for name in ("k", "m", "sigma_obs")}
+    init.update({name: model.params[name][0].tolist() for name in ("delta", "beta")})
+    return init
+
+def _warm_init(saved, n_rows, n_changepoints=25, changepoint_range=0.8):
+    # Appended months shift Prophet's changepoint count, so pad/trim delta to the new grid
+    hist_size = int(np.floor(n_rows * changepoint_range))
+    n_delta = max(min(n_changepoints, hist_size - 1), 1)
+    delta = np.zeros(n_delta)
+    old_delta = np.asarray(saved["delta"], dtype=float)[:n_delta]
+    delta[:len(old_delta)] = old_delta
+    init = {name: saved[name] for name in ("k", "m", "sigma_obs")}
+    init["delta"] = delta
+    init["beta"] = np.asarray(saved["beta"], dtype=float)
+    return init
+
+def _seasonality_options(ds):
+    # Fast profile only. Same rules as Prophet's "auto" (yearly from 2 years of history, weekly/daily only for
+    # sub-weekly/daily grids), decided up front; the yearly order is capped at what the sampling rate can
+    # resolve, since at 12 points a year harmonics above 5 are aliases of lower ones
+    ds = pd.Series(ds).sort_values()
+    span = (ds.iloc[-1] - ds.iloc[0]).days
+    spacing = ds.diff().dropna()
+    step = spacing[spacing > pd.Timedelta(0)].median() if len(spacing) else pd.Timedelta(days=1)
+    points_per_year = int(round(pd.Timedelta(days=365.25) / step)) if pd.notna(step) and step else 0
+    yearly_order = min(YEARLY_FOURIER_ORDER, points_per_year // 2 - 1)
+    return {
+        "yearly_seasonality": yearly_order if span >= 730 and yearly_order >= 1 else False,
+        "weekly_seasonality": span >= 14 and step < pd.Timedelta(days=7),
+        "daily_seasonality": span >= 2 and step < pd.Timedelta(days=1)
+    }
+
+def _new_prophet(df, profile):
+    if profile == "accurate":
+        return Prophet()
+    if profile != "fast":
+        raise ValueError(f"Unknown forecast profile: {profile}. Use one of {FORECAST_PROFILES}")
+    return Prophet(uncertainty_samples=0, **_seasonality_options(df["ds"]))
+
+def _fit_prophet(df, label, warm_params=None, profile="accurate"):
+    saved = warm_params.get(label) if warm_params is not None else None
+    model = _new_prophet(df, profile)
+    if saved:
+        try:
+            model.fit(df, init=_warm_init(saved, len(df)))
+        except Exception as e:
+            # Also hit when the profile or the series length changed the seasonality terms
+            print(f"⚠️ Warm start failed for '{label}', refitting from scratch: {e}")
+            model = _new_prophet(df, profile)
+            model.fit(df)
+    else:
+        model.fit(df)
+    if warm_params is not None:
+        warm_params[label] = _stan_init(model)
+    return model
+
+def forecast_timeseries(data, field_name="Revenue", periods=12, freq="ME", warm_start=False,
+                        hierarchy=None, categories=None, auto_select=False, budget_seconds=None,
+                        engine_overrides=None, profile=FORECAST_PROFILE, source=None):
+    if isinstance(data, dict) and hierarchy:
+        reconciled = forecast_hierarchy(data, categories, method=hierarchy, periods=periods, freq=freq,
+                                        profile=profile)
+        level, node = reconciled["level"].to_numpy(), reconciled["node"].astype(str)
+        labels = np.select([level == "total", level == "category"],
+                           [TOTAL_LABEL, (CATEGORY_PREFIX + node).to_numpy()], (SKU_PREFIX + node).to_numpy())
+        frame = reconciled.assign(sku=labels, yhat_lower=np.nan, yhat_upper=np.nan, price=np.nan, cost=np.nan,
+                                  is_forecast=True)
+        return ForecastTable(frame[list(TABLE_COLUMNS)], "hierarchy"), "hierarchy"
+
+    # Every run with a known source saves its fitted parameters, so the first incremental run after a full
+    # extraction can already warm-start; only warm-start runs read them back
+    params_file = prophet_params_file(source) if source else None
+    warm_params = load_prophet_params(params_file) if warm_start and params_file else {}
     if isinstance(data, dict):
-        figures = []
-        for sku, records in data.items():
-            fig, forecast_data, units_fig = _forecast_sku(records, sku, periods, freq)
-            if not forecast_data.empty:
-                figures.append((sku, fig, forecast_data, units_fig))
-        return figures, "multi"
+        selection = select_engines(data, engine_overrides) if auto_select else {}
+        budget = _start_budget(budget_seconds)
+        # Under a budget the biggest sellers go first, so they are the ones that keep their full model
+        order = sorted(data, key=lambda sku: -_series_revenue(data[sku])) if budget else list(data)
+        results, used = {}, {}
+        futures = {} if profile == "fast" else None
+        for sku in order:
+            engine = _afford(selection.get(sku, (None, "prophet"))[1], budget)
+            started = time.monotonic()
+            results[sku] = _forecast_sku(data[sku], sku, periods, freq, warm_params, engine=engine,
+                                         profile=profile, futures=futures)
+            _charge(budget, engine, time.monotonic() - started)
+            used[engine] = used.get(engine, 0) + 1
+
+        if auto_select or budget:
+            summary = ", ".join(f"{count} {engine}" for engine, count in sorted(used.items()))
+            degraded = f" ({budget['degraded']} degraded by budget)" if budget else ""
+            print(f"🧭 Forecast engines: {summary}{degraded}")
+        if params_file:
+            save_prophet_params(warm_params, params_file)
+        table = build_forecast_table({sku: results[sku] for sku in data if results[sku] is not None}, "multi")
+        return table, "multi"
     elif isinstance(data, list):
-        fig, forecast_df = _forecast_single(data, label=field_name, periods=periods, freq=freq)
-        return [(field_name, fig, forecast_df, None)], "single"
+        result = _forecast_single(data, label=field_name, periods=periods, freq=freq, warm_params=warm_params)
+        if params_file:
+            save_prophet_params(warm_params, params_file)
+        return build_forecast_table({field_name: result} if result is not None else {}, "single"), "single"
     else:
-        return [], "none"
+        return build_forecast_table({}, "none"), "none"
 
-def _forecast_single(data, label="Forecast", periods=12, freq="ME"):
-    if not data or not isinstance(data, list) or len(data) < 2:
-        print(f"⚠️ Skipping single forecast for '{label}' — not enough data.")
-        return go.Figure(), pd.DataFrame()
+# z for Prophet's default 80% interval, reused by the simple engines
+INTERVAL_Z = 1.2816
 
-    df = pd.DataFrame(data)
-    if df.shape[1] < 2:
-        print(f"⚠️ '{label}' forecast input does not have 2 columns.")
-        return go.Figure(), pd.DataFrame()
+def _interval(yhat, sigma, steps):
+    spread = INTERVAL_Z * sigma * np.sqrt(steps)
+    return yhat - spread, yhat + spread
 
-    df.columns = ['ds', 'y']
-    df['ds'] = pd.to_datetime(df['ds'])
-    df = df.dropna(subset=['y'])
+def _naive_engine(y, horizon):
+    steps = np.arange(1, horizon + 1)
+    sigma = np.std(np.diff(y)) if len(y) > 2 else 0.0
+    yhat = np.full(horizon, y[-1], dtype=float)
+    return (yhat,) + _interval(yhat, sigma, steps)
 
-    if len(df) < 2:
-        print(f"⚠️ Skipping forecast for '{label}' — not enough valid data.")
-        return go.Figure(), pd.DataFrame()
+def _drift_engine(y, horizon):
+    steps = np.arange(1, horizon + 1)
+    slope = (y[-1] - y[0]) / (len(y) - 1) if len(y) > 1 else 0.0
+    sigma = np.std(np.diff(y) - slope) if len(y) > 2 else 0.0
+    yhat = y[-1] + slope * steps
+    return (yhat,) + _interval(yhat, sigma, steps)
+
+def _mean_engine(y, horizon):
+    yhat = np.full(horizon, np.mean(y), dtype=float)
+    return (yhat,) + _interval(yhat, np.std(y), np.ones(horizon))
 
+def _prophet_engine(train_df, future_dates):
     model = Prophet()
-    model.fit(df)
-    future = model.make_future_dataframe(periods=periods, freq=freq)
-    forecast = model.predict(future)
+    model.fit(train_df)
+    forecast = model.predict(pd.DataFrame({"ds": future_dates}))
+    return forecast["yhat"].to_numpy(), forecast["yhat_lower"].to_numpy(), forecast["yhat_upper"].to_numpy()
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat_lower"],
-                             mode='lines', name='Lower Bound', line=dict(dash='dot')))
-    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat_upper"],
-                             mode='lines', name='Upper Bound', line=dict(dash='dot')))
-    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat"],
-                             mode='lines+markers', name='Forecast'))
+def _croston_engine(y, horizon, alpha=0.1):
+    # Croston's method: smooth non-zero demand sizes and the gaps between them separately
+    nonzero = np.flatnonzero(y)
+    if len(nonzero) == 0:
+        return np.zeros(horizon), np.zeros(horizon), np.zeros(horizon)
+    sizes = y[nonzero]
+    gaps = np.diff(np.concatenate([[-1], nonzero]))
+    size, gap = sizes[0], gaps[0]
+    for s, q in zip(sizes[1:], gaps[1:]):
+        size += alpha * (s - size)
+        gap += alpha * (q - gap)
+    yhat = np.full(horizon, size / gap, dtype=float)
+    return (yhat,) + _interval(yhat, np.std(y), np.ones(horizon))
 
-    fig.update_layout(
-        title=f"📈 Forecast: {label}",
-        template="plotly_dark",
-        height=450,
-        xaxis_title="Date",
-        yaxis_title="Predicted Value"
-    )
+FORECAST_ENGINES = ("prophet", "naive", "drift", "mean", "croston")
 
-    return fig, forecast.tail(periods)[["ds", "yhat"]]
+def engine_forecast(engine, train_df, future_dates):
+    # train_df: ds/y history; returns a ds/yhat/yhat_lower/yhat_upper frame over future_dates
+    if engine == "prophet":
+        yhat, lower, upper = _prophet_engine(train_df, future_dates)
+    elif engine == "croston":
+        # Reported months only, like classify_series: a missing month is unknown rather than a zero sale
+        y = train_df.sort_values("ds")["y"].to_numpy(dtype=float)
+        yhat, lower, upper = _croston_engine(y, len(future_dates))
+    elif engine in ("naive", "drift", "mean"):
+        simple = {"naive": _naive_engine, "drift": _drift_engine, "mean": _mean_engine}[engine]
+        yhat, lower, upper = simple(train_df["y"].to_numpy(dtype=float), len(future_dates))
+    else:
+        raise ValueError(f"Unknown forecasting engine: {engine}. Use one of {FORECAST_ENGINES}")
+    return pd.DataFrame({"ds": future_dates, "yhat": yhat, "yhat_lower": lower, "yhat_upper": upper})
 
-def _forecast_sku(data, label="SKU", periods=12, freq="ME"):
-    df = pd.DataFrame(data)
+def _future_dates(last_date, periods, freq):
+    # Same grid as Prophet's make_future_dataframe
+    dates = pd.date_range(start=last_date, periods=periods + 1, freq=freq)
+    return dates[dates > last_date][:periods]
+
+def _simple_forecast(engine, history, periods, freq):
+    # History rows carry the actuals as yhat so the figures still show the observed part
+    future = engine_forecast(engine, history, _future_dates(history["ds"].max(), periods, freq))
+    fitted = history.assign(yhat=history["y"], yhat_lower=history["y"], yhat_upper=history["y"])
+    return pd.concat([fitted.drop(columns="y"), future], ignore_index=True)
+
+# Series length thresholds (in monthly points) for model selection
+TOO_SHORT_POINTS = 4
+PROPHET_MIN_POINTS = 12
+SEASONAL_POINTS = 24
+# Average demand interval above which a series counts as intermittent (Syntetos–Boylan cut-off)
+INTERMITTENT_ADI = 1.32
+
+# Series class -> cheapest adequate engine
+ENGINE_BY_CLASS = {
+    "too_short": "naive",
+    "intermittent": "croston",
+    "short": "drift",
+    "regular": "prophet",
+    "seasonal": "prophet"
+}
+# Cheaper stand-in once the forecast budget can no longer afford an engine
+BUDGET_FALLBACK = {"prophet": "drift"}
+PROPHET_COST_GUESS = 1.0
+
+def classify_series(records):
+    # Length first: a handful of points is too short for any model, however sparse. Intermittency is judged
+    # on the reported months only; a month missing from an LLM extraction is unknown, not a zero sale.
+    df = pd.DataFrame(records)
+    if "ds" not in df.columns or len(df.dropna(subset=["y"])) < 2:
+        return None
     df = df.dropna(subset=["y"])
-    if "ds" not in df.columns:
-        print(f"⚠️ Data missing 'ds' column for {label}. Skipping.")
-        return go.Figure(), pd.DataFrame(), None
-    df["ds"] = pd.to_datetime(df["ds"])
+    if len(df) < TOO_SHORT_POINTS:
+        return "too_short"
+    nonzero = int((df["y"] != 0).sum())
+    if nonzero >= 2 and len(df) / nonzero > INTERMITTENT_ADI:
+        return "intermittent"
+    if len(df) < PROPHET_MIN_POINTS:
+        return "short"
+    if len(df) >= SEASONAL_POINTS:
+        return "seasonal"
+    return "regular"
 
-    if len(df) < 2:
-        print(f"⚠️ Skipping forecast for '{label}' — not enough data.")
-        return go.Figure(), pd.DataFrame(), None
+def select_engines(prophet_input, overrides=None):
+    # {sku: (series class, engine)}; overrides (e.g. backtest3.best_engines) win over the class rule
+    overrides = overrides or {}
+    selection = {}
+    for sku, records in prophet_input.items():
+        series_class = classify_series(records)
+        engine = ENGINE_BY_CLASS.get(series_class, "naive")
+        if overrides.get(sku) in FORECAST_ENGINES:
+            engine = overrides[sku]
+        selection[sku] = (series_class, engine)
+    return selection
 
-    price = df["price"].iloc[-1]
-    cost = df["cost"].iloc[-1]
+def _series_revenue(records):
+    return sum(r["y"] * r.get("price", 1) for r in records)
 
-    model = Prophet()
-    model.fit(df[["ds", "y"]])
-    future = model.make_future_dataframe(periods=periods, freq=freq)
-    forecast = model.predict(future)
+def _start_budget(budget_seconds):
+    if not budget_seconds:
+        return None
+    return {"deadline": time.monotonic() + budget_seconds, "prophet_time": 0.0, "prophet_fits": 0, "degraded": 0}
+
+def _afford(engine, budget):
+    if budget is None or engine not in BUDGET_FALLBACK:
+        return engine
+    fits = budget["prophet_fits"]
+    expected = budget["prophet_time"] / fits if fits else PROPHET_COST_GUESS
+    if time.monotonic() + expected <= budget["deadline"]:
+        return engine
+    budget["degraded"] += 1
+    return BUDGET_FALLBACK[engine]
+
+def _charge(budget, engine, seconds):
+    if budget is not None and engine == "prophet":
+        budget["prophet_time"] += seconds
+        budget["prophet_fits"] += 1
+
+# "auto" fits the most detailed level that has enough signal and reconciles from there
+RECONCILE_METHODS = ("auto", "bottom_up", "top_down", "middle_out", "mint")
+
+# Levels that get their own Prophet fit under each reconciliation method
+FIT_LEVELS = {
+    "bottom_up": ("sku",),
+    "top_down": ("total",),
+    "middle_out": ("category",),
+    "mint": ("total", "category", "sku")
+}
+# The single-level method that fits each level, for "auto"
+LEVEL_METHODS = {"sku": "bottom_up", "category": "middle_out", "total": "top_down"}
+# Share of months with sales a level's series need on average to be fitted directly: SKUs that started late,
+# stopped, or sell every other month leave Prophet mostly zeros to fit, and their category carries the signal
+MIN_LEVEL_DENSITY = 0.8
+# Table keys of the hierarchy's nodes. Every level has its own prefix, so a SKU named "Total" or
+# "Category: Drinks" never collides with the total or a category.
+TOTAL_LABEL = "Total"
+CATEGORY_PREFIX = "Category: "
+SKU_PREFIX = "SKU: "
+
+def build_hierarchy(prophet_input, categories=None):
+    # One pass over every SKU record -> aligned (ds x sku) revenue/profit matrices and the summing matrix S
+    rows = [(sku, r["ds"], r["y"] * r["price"], r["y"] * (r["price"] - r["cost"]))
+            for sku, records in prophet_input.items() for r in records]
+    long_df = pd.DataFrame(rows, columns=["sku", "ds", "revenue", "profit"])
+    long_df["ds"] = parse_dates(long_df["ds"])
+    revenue = long_df.pivot_table(index="ds", columns="sku", values="revenue", aggfunc="sum", fill_value=0.0)
+    profit = long_df.pivot_table(index="ds", columns="sku", values="profit", aggfunc="sum", fill_value=0.0)
+    profit = profit.reindex(index=revenue.index, columns=revenue.columns, fill_value=0.0)
+
+    skus = list(revenue.columns)
+    categories = categories or {}
+    sku_cats = np.array([categories.get(sku, "Uncategorized") for sku in skus])
+    cat_names = sorted(set(sku_cats))
+    cat_rows = (sku_cats[None, :] == np.array(cat_names)[:, None]).astype(float)
+    S = np.vstack([np.ones((1, len(skus))), cat_rows, np.eye(len(skus))])
+    nodes = [("total", "Total")] + [("category", c) for c in cat_names] + [("sku", sku) for sku in skus]
+    return {
+        "dates": revenue.index,
+        "nodes": nodes,
+        "S": S,
+        "revenue": revenue.to_numpy(dtype=float),
+        "profit": profit.to_numpy(dtype=float)
+    }
+
+def level_density(hier):
+    # -> {level: share of (month, node) cells with sales}. Short histories and intermittent sales both count
+    # against a level.
+    history = hier["revenue"] @ hier["S"].T
+    levels = np.array([level for level, _ in hier["nodes"]])
+    return {level: float((history[:, levels == level] != 0).mean()) for level in ("total", "category", "sku")}
+
+def signal_level(hier, min_density=MIN_LEVEL_DENSITY):
+    # The most detailed level whose series are dense enough to forecast on their own
+    density = level_density(hier)
+    return next((level for level in ("sku", "category") if density[level] >= min_density), "total")
+
+def _safe_divide(a, b):
+    return np.divide(a, b, out=np.zeros_like(a, dtype=float), where=b != 0)
+
+def _shrink_covariance(residuals):
+    # Schäfer–Strimmer shrinkage towards the diagonal, as used by MinT(shrink)
+    n = residuals.shape[0]
+    cov = residuals.T @ residuals / n
+    std = np.sqrt(np.diag(cov))
+    std[std == 0] = 1.0
+    xs = residuals / std
+    corr = xs.T @ xs / n
+    v = (1 / (n * (n - 1))) * ((xs ** 2).T @ (xs ** 2) - (xs.T @ xs) ** 2 / n) if n > 1 else np.zeros_like(cov)
+    np.fill_diagonal(v, 0)
+    d = (corr - np.eye(len(corr))) ** 2
+    lam = float(np.clip(v.sum() / d.sum(), 0, 1)) if d.sum() > 0 else 1.0
+    shrunk = lam * np.diag(np.diag(cov)) + (1 - lam) * cov
+    # Constant series have zero residual variance; a small ridge keeps W invertible
+    return shrunk + np.eye(len(shrunk)) * (1e-6 * np.mean(np.diag(shrunk)) + 1e-9)
+
+def reconcile_forecasts(base, hier, method, residuals=None):
+    # base: (h x nodes) base forecasts, zero where a node was not fitted. Returns coherent (h x nodes)
+    S = hier["S"]
+    levels = np.array([level for level, _ in hier["nodes"]])
+    sku_totals = hier["revenue"].sum(axis=0)
+
+    if method == "bottom_up":
+        bottom = base[:, levels == "sku"]
+    elif method == "top_down":
+        # Proportions of historical totals (Gross–Sohl F), robust to months with zero sales
+        bottom = base[:, levels == "total"] * _safe_divide(sku_totals, np.array(sku_totals.sum()))
+    elif method == "middle_out":
+        cat_rows = S[levels == "category"]
+        share = _safe_divide(sku_totals, cat_rows.T @ (cat_rows @ sku_totals))
+        bottom = (base[:, levels == "category"] @ cat_rows) * share
+    elif method == "mint":
+        W = _shrink_covariance(residuals)
+        Winv_S = np.linalg.solve(W, S)
+        G = np.linalg.solve(S.T @ Winv_S, Winv_S.T)
+        bottom = base @ G.T
+    else:
+        raise ValueError(f"Unknown reconciliation method: {method}")
+    return bottom @ S.T
 
-    forecast["price"] = price
-    forecast["cost"] = cost
-    forecast["revenue"] = forecast["yhat"] * price
-    forecast["profit"] = forecast["yhat"] * (price - cost)
-    forecast["margin_pct"] = (forecast["profit"] / forecast["revenue"].replace(0, 1)) * 100
+def forecast_hierarchy(prophet_input, categories=None, method="auto", periods=12, freq="ME",
+                       profile="accurate"):
+    if method not in RECONCILE_METHODS:
+        raise ValueError(f"Unknown reconciliation method: {method}. Use one of {RECONCILE_METHODS}")
+    if not prophet_input:
+        return pd.DataFrame(columns=["level", "node", "ds", "yhat", "revenue", "profit", "margin_pct"])
 
+    hier = build_hierarchy(prophet_input, categories)
+    dates, nodes, S = hier["dates"], hier["nodes"], hier["S"]
+    if len(dates) < 2:
+        print("⚠️ Skipping hierarchical forecast — not enough data.")
+        return pd.DataFrame(columns=["level", "node", "ds", "yhat", "revenue", "profit", "margin_pct"])
+
+    history = hier["revenue"] @ S.T
+    future_dates = _future_dates(dates[-1], periods, freq)
+    future = pd.DataFrame({"ds": dates.append(future_dates)})
+
+    if method == "auto":
+        level = signal_level(hier)
+        density = ", ".join(f"{name} {share:.0%}" for name, share in level_density(hier).items())
+        print(f"🌲 Fitting the {level} level (months with sales: {density})")
+        method = LEVEL_METHODS[level]
+    fit_levels = FIT_LEVELS[method]
+    base = np.zeros((len(future), len(nodes)))
+    fits = 0
+    for i, (level, node) in enumerate(nodes):
+        if level not in fit_levels:
+            continue
+        model = _fit_prophet(pd.DataFrame({"ds": dates, "y": history[:, i]}), f"{level}:{node}",
+                             profile=profile)
+        base[:, i] = model.predict(future)["yhat"].to_numpy()
+        fits += 1
+    n_skus = S.shape[1]
+    print(f"🌲 Hierarchical forecast ({method}): {fits} model fit(s) for {n_skus} SKU(s)")
+
+    residuals = history - base[:len(dates)] if method == "mint" else None
+    revenue = reconcile_forecasts(base[len(dates):], hier, method, residuals)
+    # Profit follows each SKU's historical margin and is rolled up through S, so it stays coherent too
+    sku_margin = _safe_divide(hier["profit"].sum(axis=0), hier["revenue"].sum(axis=0))
+    profit = (revenue[:, -n_skus:] * sku_margin) @ S.T
+
+    h = len(future_dates)
+    result = pd.DataFrame({
+        "level": np.repeat([level for level, _ in nodes], h),
+        "node": np.repeat([node for _, node in nodes], h),
+        "ds": np.tile(future_dates, len(nodes)),
+        "revenue": revenue.T.ravel(),
+        "profit": profit.T.ravel()
+    })
+    result["yhat"] = result["revenue"]
+    result["margin_pct"] = (result["profit"] / result["revenue"].replace(0, 1)) * 100
+    return result
+
+def _revenue_figure(forecast, label):
     # Revenue/Profit/Margin plot
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["revenue"], name="Revenue Forecast"))
@@ -138,21 +500,186 @@ def _forecast_sku(data, label="SKU", periods=12, freq="ME"):
             showgrid=False
         )
     )
+    return fig
 
-    # Units forecast plot
-    units_fig = go.Figure()
-    units_fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat"], mode="lines+markers", name="Units Forecast"))
-    units_fig.update_layout(
+def _units_figure(forecast, label):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat"], mode="lines+markers", name="Units Forecast"))
+    fig.update_layout(
         title=f"📊 Units Forecast Over Time – {label}",
         template="plotly_dark",
         xaxis_title="Date",
         yaxis_title="Units Sold",
         height=400
     )
+    return fig
+
+def _interval_figure(forecast, label):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat_lower"],
+                             mode='lines', name='Lower Bound', line=dict(dash='dot')))
+    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat_upper"],
+                             mode='lines', name='Upper Bound', line=dict(dash='dot')))
+    fig.add_trace(go.Scatter(x=forecast["ds"], y=forecast["yhat"],
+                             mode='lines+markers', name='Forecast'))
+
+    fig.update_layout(
+        title=f"📈 Forecast: {label}",
+        template="plotly_dark",
+        height=450,
+        xaxis_title="Date",
+        yaxis_title="Predicted Value"
+    )
+    return fig
+
+TABLE_COLUMNS = ("sku", "ds", "yhat", "yhat_lower", "yhat_upper", "price", "cost", "revenue", "profit",
+                 "margin_pct", "is_forecast")
+FORECAST_COLUMNS = ["ds", "yhat", "revenue", "profit", "margin_pct"]
+
+class ForecastTable:
+    # Every series of one forecast run as a single long frame indexed by (sku, ds): fitted history rows and
+    # the forecast rows (is_forecast) of each SKU, category or series are contiguous, so a series is one
+    # slice, and group queries (top sellers, totals) run over the whole frame. Figures are built on request.
+    def __init__(self, frame, mode):
+        self.mode = mode
+        codes, labels = pd.factorize(frame["sku"], sort=False)
+        order = np.argsort(codes, kind="stable")
+        self.frame = frame.iloc[order].set_index(["sku", "ds"])
+        self.labels = list(labels)
+        ends = np.cumsum(np.bincount(codes, minlength=len(labels)))
+        starts = np.concatenate([[0], ends[:-1]])
+        self._slices = {label: slice(start, end) for label, start, end in zip(self.labels, starts, ends)}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def series(self, label):
+        # History and forecast rows of one series, ds as a column
+        return self.frame.iloc[self._slices[label]].reset_index(level="sku", drop=True).reset_index()
+
+    def forecast(self, label):
+        # Forecast rows only: ds, yhat, revenue, profit, margin_pct
+        rows = self.series(label)
+        return rows.loc[rows["is_forecast"].to_numpy(dtype=bool), FORECAST_COLUMNS].reset_index(drop=True)
+
+    def _future(self):
+        return self.frame[self.frame["is_forecast"].to_numpy(dtype=bool)]
+
+    def totals(self, measure="revenue"):
+        # Forecast `measure` summed over the horizon, per series
+        return self._future()[measure].groupby(level="sku", sort=False).sum().reindex(self.labels)
 
-    return fig, forecast.tail(periods)[["ds", "yhat", "revenue", "profit", "margin_pct"]], units_fig
+    def top(self, n=10, measure="revenue"):
+        # -> Series of the n largest horizon totals, largest first
+        return self.totals(measure).nlargest(n)
+
+    def by_period(self, measure="revenue"):
+        # Forecast `measure` summed across series per date
+        return self._future()[measure].groupby(level="ds").sum()
+
+    def figure(self, label):
+        if self.mode == "single":
+            return _interval_figure(self.series(label), label)
+        return _revenue_figure(self.series(label), label)
+
+    def units_figure(self, label):
+        # Only SKU forecasts are in units
+        return _units_figure(self.series(label), label) if self.mode == "multi" else None
+
+def build_forecast_table(results, mode):
+    # results: {label: (Prophet-style forecast frame, price, cost)}. Revenue, profit and margin are
+    # computed once for all series: each SKU's price and cost are broadcast through its row codes.
+    if not results:
+        empty = pd.DataFrame(columns=list(TABLE_COLUMNS)).astype(
+            {col: float for col in TABLE_COLUMNS if col not in ("sku", "ds", "is_forecast")})
+        return ForecastTable(empty.astype({"ds": "datetime64[ns]", "is_forecast": bool}), mode)
+    labels = list(results)
+    parts = [results[label][0] for label in labels]
+    lengths = np.array([len(part) for part in parts])
+    # Column by column: selecting a column subset of each Prophet frame costs more than the arithmetic
+    frame = pd.DataFrame({col: np.concatenate([part[col].to_numpy() for part in parts])
+                          for col in ("ds", "yhat", "yhat_lower", "yhat_upper", "is_forecast")})
+    codes = np.repeat(np.arange(len(labels)), lengths)
+    prices = np.array([results[label][1] for label in labels], dtype=float)[codes]
+    costs = np.array([results[label][2] for label in labels], dtype=float)[codes]
+    yhat = frame["yhat"].to_numpy(dtype=float)
+    revenue = yhat * prices
+    profit = yhat * (prices - costs)
+    frame["sku"] = np.array(labels, dtype=object)[codes]
+    frame["price"] = prices
+    frame["cost"] = costs
+    frame["revenue"] = revenue
+    frame["profit"] = profit
+    frame["margin_pct"] = profit / np.where(revenue == 0, 1, revenue) * 100
+    return ForecastTable(frame[list(TABLE_COLUMNS)], mode)
+
+def _forecast_single(data, label="Forecast", periods=12, freq="ME", warm_params=None):
+    # -> (forecast frame, price, cost) or None. The series is revenue itself: a price of 1 and no cost.
+    if not data or not isinstance(data, list) or len(data) < 2:
+        print(f"⚠️ Skipping single forecast for '{label}' — not enough data.")
+        return None
+
+    df = pd.DataFrame(data)
+    if df.shape[1] < 2:
+        print(f"⚠️ '{label}' forecast input does not have 2 columns.")
+        return None
+
+    df.columns = ['ds', 'y']
+    df['ds'] = parse_dates(df['ds'])
+    df = df.dropna(subset=['y'])
+
+    if len(df) < 2:
+        print(f"⚠️ Skipping forecast for '{label}' — not enough valid data.")
+        return None
+
+    model = _fit_prophet(df, label, warm_params)
+    forecast = _predict(model, model.make_future_dataframe(periods=periods, freq=freq))
+    forecast["is_forecast"] = forecast["ds"] > df["ds"].max()
+    return forecast, 1.0, np.nan
+
+def _future_frame(model, periods, freq, futures=None):
+    # SKUs observed over the same months predict over the same frame, so it is built once per date grid
+    if futures is None:
+        return model.make_future_dataframe(periods=periods, freq=freq)
+    key = (model.history_dates.to_numpy().tobytes(), periods, freq)
+    if key not in futures:
+        futures[key] = model.make_future_dataframe(periods=periods, freq=freq)
+    return futures[key]
+
+def _predict(model, future):
+    # Without uncertainty sampling Prophet returns no bounds; keep the columns so every profile looks alike
+    forecast = model.predict(future)
+    for col in ("yhat_lower", "yhat_upper"):
+        if col not in forecast:
+            forecast[col] = np.nan
+    return forecast
+
+def _forecast_sku(data, label="SKU", periods=12, freq="ME", warm_params=None, engine="prophet",
+                  profile="accurate", futures=None):
+    # -> (forecast frame over history and horizon, last price, last cost) or None
+    df = pd.DataFrame(data)
+    df = df.dropna(subset=["y"])
+    if "ds" not in df.columns:
+        print(f"⚠️ Data missing 'ds' column for {label}. Skipping.")
+        return None
+    df["ds"] = parse_dates(df["ds"])
+
+    if len(df) < 2:
+        print(f"⚠️ Skipping forecast for '{label}' — not enough data.")
+        return None
+
+    if engine == "prophet":
+        model = _fit_prophet(df[["ds", "y"]], label, warm_params, profile)
+        forecast = _predict(model, _future_frame(model, periods, freq, futures))
+    else:
+        forecast = _simple_forecast(engine, df.sort_values("ds")[["ds", "y"]], periods, freq)
+    forecast["is_forecast"] = forecast["ds"] > df["ds"].max()
+    return forecast, df["price"].iloc[-1], df["cost"].iloc[-1]
 
-def generate_forecast_insight(df, sku="SKU"):
+def generate_forecast_insight(df, sku="SKU", accuracy=None, intervals=True):
     if df.empty:
         return f"No forecast insight available for {sku}."
 
@@ -166,8 +693,18 @@ def generate_forecast_insight(df, sku="SKU"):
     direction = "increasing" if trend_diff > 0 else "decreasing"
     margin_trend = "healthy" if avg_margin > 25 else "tight"
 
-    return (
+    insight = (
         f"📊 Forecast for {sku}: Revenue is {direction} over the next few periods "
         f"(up to ${latest['revenue']:.2f}), with a {margin_trend} margin of "
         f"~{avg_margin:.1f}%. Consider adjusting production, marketing, or pricing accordingly."
     )
+    if accuracy:
+        # accuracy: leaderboard row for this SKU's Prophet backtest (see backtest3.py)
+        insight += f" Backtest: sMAPE {accuracy['smape']:.1f}%, "
+        if intervals:
+            insight += f"interval coverage {accuracy['coverage'] * 100:.0f}% "
+        else:
+            # The fast profile draws no intervals, so the backtest's coverage says nothing about this forecast
+            insight += "interval coverage unavailable (fast profile) "
+        insight += f"over {accuracy['n_forecasts']} held-out points."
+    return insight
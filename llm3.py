@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from prompts import NUM_CTX
+
+LLM_CONFIG_FILE = os.environ.get("SMB_LLM_CONFIG", "llm_config.json")
+
+# llm_config.json is merged over this; SMB_LLM_BACKEND / SMB_LLM_MODEL / SMB_LLM_RECORD override it
+DEFAULT_LLM_CONFIG = {
+    "backend": "ollama",
+    "model": "llama3",
+    # Append every prompt/response pair to this JSONL file, for the replay backend and benchmarks
+    "record": None,
+    "backends": {
+        "ollama": {
+            "url": os.environ.get("OLLAMA_URL", "http://127.0.0.1:11434"),
+            # Requests the server runs concurrently per model; more than this just queue server-side
+            "concurrency": int(os.environ.get("OLLAMA_NUM_PARALLEL", "1")),
+            "timeout": 90
+        },
+        "llama_cpp": {
+            "model_path": "models/llama3.gguf",
+            "concurrency": 1,
+            "timeout": 300,
+            "max_tokens": 2048
+        },
+        "replay": {
+            "path": "llm_recordings.jsonl",
+            # Replays the recorded sequence exactly, so no speculative samples
+            "concurrency": 1,
+            "timeout": 1
+        }
+    }
+}
+
+# Sample i of a speculative batch runs with seed i + 1 and the i-th temperature (cycled)
+SPECULATIVE_TEMPERATURES = (0.2, 0.5, 0.8, 1.0)
+
+def load_llm_config(filepath=LLM_CONFIG_FILE):
+    config = json.loads(json.dumps(DEFAULT_LLM_CONFIG))
+    if os.path.exists(filepath):
+        with open(filepath, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        for name, settings in saved.pop("backends", {}).items():
+            config["backends"].setdefault(name, {}).update(settings)
+        config.update(saved)
+    config["backend"] = os.environ.get("SMB_LLM_BACKEND", config["backend"])
+    config["model"] = os.environ.get("SMB_LLM_MODEL", config["model"])
+    config["record"] = os.environ.get("SMB_LLM_RECORD", config["record"])
+    return config
+
+class OllamaBackend:
+    # Ollama's HTTP API. Passing the `context` of a previous call continues from it, so only `prompt` is evaluated.
+    name = "ollama"
+
+    def __init__(self, model, url, concurrency=1, timeout=90):
+        self.model, self.url, self.timeout = model, url, timeout
+        self.concurrency = max(int(concurrency), 1)
+        self.slots = threading.BoundedSemaphore(self.concurrency)
+
+    def generate(self, prompt, context=None, options=None, cancel=None, timeout=None):
+        # With a `cancel` event the answer is streamed and the connection dropped once the event is set,
+        # which stops generation server-side; None is returned then
+        body = {"model": self.model, "prompt": prompt, "stream": cancel is not None,
+                "options": {"num_ctx": NUM_CTX, **(options or {})}}
+        if context:
+            body["context"] = context
+        request = urllib.request.Request(f"{self.url}/api/generate", data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with self.slots:
+            if cancel is not None and cancel.is_set():
+                return None
+            start = time.perf_counter()
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as resp:
+                result = json.loads(resp.read().decode("utf-8")) if cancel is None else _read_stream(resp, cancel)
+        if result is not None:
+            result.setdefault("total_duration", int((time.perf_counter() - start) * 1e9))
+        return result
+
+    def available(self):
+        try:
+            urllib.request.urlopen(f"{self.url}/api/tags", timeout=5).close()
+            return True
+        except OSError:
+            return False
+
+def _read_stream(resp, cancel):
+    parts = []
+    for line in resp:
+        if cancel.is_set():
+            return None
+        chunk = json.loads(line)
+        parts.append(chunk.get("response", ""))
+        if chunk.get("done"):
+            chunk["response"] = "".join(parts)
+            return chunk
+    return {"response": "".join(parts)}
+
+class LlamaCppBackend:
+    # In-process llama-cpp-python. There is no `context` to hand back, but the RAM cache keeps the KV state
+    # of the longest matching prefix, so a re-sent prompt only evaluates what changed.
+    name = "llama_cpp"
+
+    def __init__(self, model, model_path, concurrency=1, timeout=300, max_tokens=2048):
+        self.model, self.model_path, self.timeout, self.max_tokens = model, model_path, timeout, max_tokens
+        # A Llama context is not thread-safe, so every slot gets its own instance (the weights are mmapped and
+        # shared; each instance adds its own KV cache). Instances are created on first use, up to `concurrency`.
+        self.concurrency = max(int(concurrency), 1)
+        self.slots = threading.BoundedSemaphore(self.concurrency)
+        self._idle = []
+        self._pool_lock = threading.Lock()
+
+    def _new_llm(self):
+        from llama_cpp import Llama, LlamaRAMCache
+        llm = Llama(model_path=self.model_path, n_ctx=NUM_CTX, verbose=False)
+        llm.set_cache(LlamaRAMCache())
+        return llm
+
+    def _acquire(self):
+        # Called while holding a slot, so there are never more instances than slots
+        with self._pool_lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._new_llm()
+
+    def _release(self, llm):
+        with self._pool_lock:
+            self._idle.append(llm)
+
+    def generate(self, prompt, context=None, options=None, cancel=None, timeout=None):
+        options = options or {}
+        deadline = time.perf_counter() + (timeout or self.timeout)
+        with self.slots:
+            llm = self._acquire()
+            stream = None
+            try:
+                start = time.perf_counter()
+                parts = []
+                stream = llm.create_completion(prompt, max_tokens=self.max_tokens, stream=True,
+                                               temperature=options.get("temperature", 0.8), seed=options.get("seed"))
+                for chunk in stream:
+                    if cancel is not None and cancel.is_set():
+                        return None
+                    if time.perf_counter() > deadline:
+                        raise TimeoutError(f"llama.cpp generation exceeded {timeout or self.timeout}s")
+                    parts.append(chunk["choices"][0]["text"])
+            finally:
+                # The instance goes back to the pool only once its generation has stopped
+                if stream is not None:
+                    stream.close()
+                self._release(llm)
+        return {"response": "".join(parts), "total_duration": int((time.perf_counter() - start) * 1e9)}
+
+    def available(self):
+        try:
+            import llama_cpp  # noqa: F401
+        except ImportError:
+            return False
+        return os.path.exists(self.model_path)
+
+def recording_key(prompt, context=None, options=None):
+    # The model is left out so recordings made with one model replay under any configured model
+    payload = json.dumps({"prompt": prompt, "context": context, "options": options or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ReplayBackend:
+    # Serves responses recorded earlier (record = path), for offline runs and reproducible benchmarks
+    name = "replay"
+
+    def __init__(self, model, path, concurrency=1, timeout=1):
+        self.model, self.path, self.timeout = model, path, timeout
+        self.concurrency = max(int(concurrency), 1)
+        self._recordings = None
+
+    def recordings(self):
+        if self._recordings is None:
+            self._recordings = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        self._recordings[entry["key"]] = entry
+        return self._recordings
+
+    def generate(self, prompt, context=None, options=None, cancel=None, timeout=None):
+        entry = self.recordings().get(recording_key(prompt, context, options))
+        if entry is None:
+            raise KeyError(f"No recorded response for this prompt in {self.path}")
+        return dict(entry["result"])
+
+    def available(self):
+        return bool(self.recordings())
+
+class RecordingBackend:
+    # Wraps another backend and appends every completed call to a JSONL file
+    def __init__(self, backend, path):
+        self.backend, self.path = backend, path
+        self.name, self.model, self.concurrency = backend.name, backend.model, backend.concurrency
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, context=None, options=None, cancel=None, timeout=None):
+        result = self.backend.generate(prompt, context=context, options=options, cancel=cancel, timeout=timeout)
+        if result is not None:
+            entry = {"key": recording_key(prompt, context, options), "backend": self.name, "model": self.model,
+                     "prompt": prompt, "options": options or {}, "continued": bool(context), "result": result}
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return result
+
+    def available(self):
+        return self.backend.available()
+
+LLM_BACKENDS = {
+    "ollama": OllamaBackend,
+    "llama_cpp": LlamaCppBackend,
+    "replay": ReplayBackend
+}
+
+def make_backend(name=None, config=None):
+    config = config or load_llm_config()
+    name = name or config["backend"]
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}. Use one of: {', '.join(LLM_BACKENDS)}")
+    backend = LLM_BACKENDS[name](config["model"], **config["backends"].get(name, {}))
+    if config.get("record") and name != "replay":
+        backend = RecordingBackend(backend, config["record"])
+    return backend
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_backend()
+        return _backend
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+def run_llm_prompt(prompt, backend=None):
+    try:
+        return (backend or get_backend()).generate(prompt)["response"]
+    except Exception as e:
+        return f"Error running LLM: {e}"
+
+# Prompt evaluation across retries: tokens/seconds actually evaluated vs. what full re-sends would have cost
+PROMPT_EVAL_STATS = {"retries": 0, "tokens": 0, "seconds": 0.0, "full_tokens": 0, "full_seconds": 0.0}
+
+# Seconds from the first request to a parsed answer, per sampling mode; failures are only counted
+TIME_TO_VALID = {"sequential": {"valid": [], "failed": 0}, "speculative": {"valid": [], "failed": 0}}
+
+def _eval_seconds(result):
+    return result.get("prompt_eval_duration", 0) / 1e9
+
+def _sample(backend, prompt, context, parse, timeout, options=None, cancel=None):
+    # -> (result, parsed, error); result is None when the sample was cancelled
+    try:
+        result = backend.generate(prompt, context=context, options=options, cancel=cancel, timeout=timeout)
+        if result is None:
+            return None, None, "cancelled"
+    except Exception as e:
+        result = {"response": f"Error running LLM: {e}"}
+    try:
+        return result, parse(result.get("response", "")), None
+    except Exception as e:
+        return result, None, str(e)
+
+def _speculate(backend, prompt, context, parse, timeout, samples):
+    # Races `samples` differently-seeded generations; the first one that parses wins and the rest are cancelled
+    cancel = threading.Event()
+    failure = None
+    with ThreadPoolExecutor(max_workers=samples) as pool:
+        futures = [pool.submit(_sample, backend, prompt, context, parse, timeout,
+                               {"seed": i + 1, "temperature": SPECULATIVE_TEMPERATURES[i % len(SPECULATIVE_TEMPERATURES)]},
+                               cancel)
+                   for i in range(samples)]
+        for future in as_completed(futures):
+            result, parsed, error = future.result()
+            if error is None:
+                cancel.set()
+                return result, parsed, None
+            if failure is None:
+                failure = (result, None, error)
+    return failure
+
+def generate_with_retries(build_prompt, retry_suffix, parse, max_attempts=3, label="LLaMA", timeout=None,
+                          samples=None, backend=None):
+    # build_prompt(error) -> full prompt; retry_suffix(error) -> short corrective text; parse(response) raises
+    # on bad output. Retries continue from the previous call's context and only send the suffix; backends
+    # without a context re-send the full prompt, which still shares its prefix.
+    # With samples > 1 (default: the backend's concurrency) every attempt races that many sampled generations.
+    backend = backend or get_backend()
+    samples = samples or backend.concurrency
+    mode = "speculative" if samples > 1 else "sequential"
+    context, last_error, first, response = None, None, None, ""
+    start = time.perf_counter()
+    for attempt in range(max_attempts):
+        print(f"🔁 {label}, attempt {attempt + 1}{f' ({samples} samples)' if samples > 1 else ''}...")
+        prompt = retry_suffix(last_error) if context else build_prompt(last_error)
+        if samples > 1:
+            result, parsed, error = _speculate(backend, prompt, context, parse, timeout, samples)
+        else:
+            result, parsed, error = _sample(backend, prompt, context, parse, timeout)
+        response = result.get("response", "")
+        if first is None:
+            first = result
+        elif context and first.get("prompt_eval_count"):
+            _record_retry(result, first)
+        if error is None:
+            TIME_TO_VALID[mode]["valid"].append(time.perf_counter() - start)
+            return parsed, response
+        last_error = error
+        context = result.get("context")
+        print(f"❌ {label} attempt {attempt + 1} failed: {last_error}")
+    TIME_TO_VALID[mode]["failed"] += 1
+    return None, response
+
+def _record_retry(result, first):
+    # A full re-send would re-evaluate the first prompt plus this suffix at the first call's rate
+    rate = _eval_seconds(first) / first["prompt_eval_count"]
+    tokens, seconds = result.get("prompt_eval_count", 0), _eval_seconds(result)
+    full_tokens = first["prompt_eval_count"] + tokens
+    stats = PROMPT_EVAL_STATS
+    stats["retries"] += 1
+    stats["tokens"] += tokens
+    stats["seconds"] += seconds
+    stats["full_tokens"] += full_tokens
+    stats["full_seconds"] += full_tokens * rate
+    print(f"⏱️ Retry evaluated {tokens:,} prompt tokens in {seconds:.2f}s "
+          f"instead of {full_tokens:,} (~{full_tokens * rate - seconds:.2f}s saved)")
+
+def format_prompt_eval_stats():
+    s = PROMPT_EVAL_STATS
+    return (f"⏱️ Context reuse over {s['retries']} retr{'y' if s['retries'] == 1 else 'ies'}: "
+            f"{s['tokens']:,} prompt tokens in {s['seconds']:.2f}s instead of "
+            f"{s['full_tokens']:,} in ~{s['full_seconds']:.2f}s")
@@ -1,6 +1,139 @@
-def get_extraction_prompt(prompt_data, error_message=None):
-    error_section = f"\nNote: The previous attempt failed with this parsing error:\n{error_message}\nTry to fix the JSON formatting.\n" if error_message else ""
-    suggested_structure = '''
+import json
+import os
+
+# Context window the prompts are budgeted against (llama3 is trained with 8K) and room kept for the answer
+NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", "8192"))
+RESPONSE_RESERVE_TOKENS = 1024
+
+# Marks where each report starts, both in the batched prompt and in the expected answer
+REPORT_DELIMITER = "### REPORT:"
+
+TRUNCATION_MARKER = "[... {} line(s) omitted to fit the context window ...]"
+CUT_LINE_MARKER = "[... rest of the data omitted to fit the context window ...]"
+RECORD_MARKER = "[... {} record(s) omitted to fit the context window ...]"
+
+def estimate_tokens(text):
+    # ~4 characters per token for LLaMA-style BPE on English/JSON
+    return len(text) // 4
+
+_encoding = None
+
+def count_tokens(text):
+    # Uses tiktoken when installed (cl100k is close to llama3's BPE), otherwise the character heuristic
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return len(_encoding.encode(text, disallowed_special=())) if _encoding else estimate_tokens(text)
+
+def _split_blocks(data):
+    # "### Sheet: ..." / "### REPORT: ..." headers start a new block
+    blocks = []
+    for line in data.splitlines():
+        if line.startswith("### ") or not blocks:
+            blocks.append([])
+        blocks[-1].append(line)
+    return blocks
+
+def _minify(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def _trim_json(value, limit, depth=1):
+    # -> (value, records dropped): leading list items / object keys whose minified text fits in `limit`
+    # characters. A top-level key that doesn't fit (e.g. "sku_forecast") keeps its own leading records,
+    # which are kept or dropped whole, so the result is always valid JSON without half-written records.
+    is_dict = isinstance(value, dict)
+    items = list(value.items()) if is_dict else list(value)
+    kept, size = [], 2
+    for n, item in enumerate(items):
+        key_size = len(_minify(item[0])) + 1 if is_dict else 0
+        inner = item[1] if is_dict else item
+        comma = 1 if kept else 0
+        cost = comma + key_size + len(_minify(inner))
+        if size + cost <= limit:
+            kept.append(item)
+            size += cost
+            continue
+        dropped = len(items) - n
+        if depth and isinstance(inner, (dict, list)) and inner:
+            part, inner_dropped = _trim_json(inner, limit - size - comma - key_size, depth - 1)
+            if part:
+                kept.append((item[0], part) if is_dict else part)
+                dropped = len(items) - n - 1 + inner_dropped
+        return (dict(kept) if is_dict else kept), dropped
+    return value, 0
+
+def _trim_line(line, limit):
+    # One oversized line: minified JSON keeps whole records, anything else is cut by characters
+    try:
+        value = json.loads(line)
+    except ValueError:
+        value = None
+    if isinstance(value, (dict, list)):
+        trimmed, dropped = _trim_json(value, limit)
+        return _minify(trimmed), RECORD_MARKER.format(dropped)
+    return line[:limit], CUT_LINE_MARKER
+
+def trim_to_budget(data, budget):
+    # Drops trailing rows of each block, sharing the budget evenly between blocks (water-filling),
+    # so one huge sheet can't crowd the others out
+    total = count_tokens(data)
+    if total <= budget:
+        return data, 0
+    # One tokenizer pass; per-line costs are scaled from character counts
+    ratio = total / max(len(data), 1)
+    blocks = _split_blocks(data)
+    costs = [[(len(line) + 1) * ratio for line in block] for block in blocks]
+    needs = sorted(range(len(blocks)), key=lambda i: sum(costs[i]))
+    allowance, remaining = {}, budget - count_tokens(TRUNCATION_MARKER.format(0)) * len(blocks)
+    for n, i in enumerate(needs):
+        share = remaining / (len(needs) - n)
+        allowance[i] = min(sum(costs[i]), share)
+        remaining -= allowance[i]
+    kept_lines, omitted = [], 0
+    for i, block in enumerate(blocks):
+        # A "### ..." header, and the CSV column line after it, are kept even when over budget
+        protected = (2 if len(block) > 2 else 1) if block[0].startswith("### ") else 0
+        used, keep = sum(costs[i][:protected]), protected
+        while keep < len(block) and used + costs[i][keep] <= allowance[i]:
+            used += costs[i][keep]
+            keep += 1
+        kept_lines.extend(block[:keep])
+        if keep < len(block):
+            if len(block) - protected == 1:
+                # A single oversized line (minified JSON) is trimmed instead of dropped
+                marker_cost = count_tokens(RECORD_MARKER.format(0))
+                line, marker = _trim_line(block[keep], int(max(allowance[i] - used - marker_cost, 0) / ratio))
+                kept_lines.extend([line, marker])
+            else:
+                omitted += len(block) - keep
+                kept_lines.append(TRUNCATION_MARKER.format(len(block) - keep))
+    return "\n".join(kept_lines), omitted
+
+# Token split of the most recent prompt per label, for reports
+PROMPT_STATS = {}
+
+def assemble_prompt(label, prefix, data, suffix="", num_ctx=None, reserve=RESPONSE_RESERVE_TOKENS):
+    # Static prefix, then data, then the per-attempt suffix: a retry shares everything up to the suffix
+    # with the previous attempt, so the KV cache covers the spreadsheet. Only `data` is ever trimmed.
+    num_ctx = num_ctx or NUM_CTX
+    static, suffix_tokens = count_tokens(prefix), count_tokens(suffix)
+    data, omitted = trim_to_budget(data, max(num_ctx - reserve - static - suffix_tokens, 0))
+    PROMPT_STATS[label] = {"static": static, "dynamic": count_tokens(data) + suffix_tokens,
+                           "num_ctx": num_ctx, "omitted_lines": omitted}
+    if omitted:
+        print(f"✂️ {label} prompt: dropped {omitted} data line(s) to fit num_ctx={num_ctx}")
+    return prefix + data + suffix
+
+def format_prompt_stats(label):
+    s = PROMPT_STATS[label]
+    return (f"🧮 {label} prompt: {s['static']:,} static + {s['dynamic']:,} dynamic tokens "
+            f"= {s['static'] + s['dynamic']:,} of {s['num_ctx']:,}")
+
+EXTRACTION_STRUCTURE = '''
 {
   "revenue_analysis": {
     "revenue": 0
@@ -18,7 +151,8 @@ def get_extraction_prompt(prompt_data, error_message=None):
   }
 }
 '''
-    return f"""
+
+EXTRACTION_PREFIX = f"""
 You are a financial analyst AI. Given the following spreadsheet data from a small-to-medium retail business,
 convert it into a structured JSON format needed to perform:
 
@@ -33,19 +167,36 @@ IMPORTANT:
 - For example, \"Net Loss\" of 2000 should be entered as -2000.
 - Do not treat \"Loss\" values as revenue or income. Subtract them appropriately.
 Please follow this suggested JSON structure exactly as a guide. Output only valid JSON — no commentary or explanation.
-Error form previous attempts:
-{error_section}
 
 Suggested structure:
-{suggested_structure}
+{EXTRACTION_STRUCTURE}
+"""
+
+def get_extraction_retry(error_message):
+    return f"\nNote: The previous attempt failed with this parsing error:\n{error_message}\nTry to fix the JSON formatting.\n"
+
+def get_extraction_prompt(prompt_data, error_message=None):
+    error_section = get_extraction_retry(error_message) if error_message else ""
+    return assemble_prompt("extraction", EXTRACTION_PREFIX + "\nSpreadsheet data:\n", prompt_data, "\n" + error_section)
 
-Spreadsheet data:
-{prompt_data}
+LINE_ITEM_PREFIX = """
+You are a financial analyst AI. Below are row labels from a company's financial statements that could not be matched automatically,
+followed by the line items that are still missing.
+For each missing line item, pick the one label that reports it, or null if none of the labels do.
+Do not guess: a balance-sheet balance (e.g. "Inventory") is not a cost.
+Output only a valid JSON object mapping each missing line item to a label copied exactly, or null — no commentary or explanation.
+Example: {"inventory_costs": "Inventory write-downs", "logistics_costs": null}
 """
 
-def get_dashboard_prompt(json_str, error_message=None):
-    error_section = f"\nNote: The previous attempt failed with this JSON parsing error:\n{error_message}\nPlease output valid JSON.\n" if error_message else ""
-    chart_guide = """
+def get_line_item_retry(error_message):
+    return f"\nNote: The previous attempt failed with this error:\n{error_message}\nOutput only the JSON object, using labels exactly as listed.\n"
+
+def get_line_item_prompt(labels, missing, error_message=None):
+    error_section = get_line_item_retry(error_message) if error_message else ""
+    data = "Labels:\n" + "\n".join(labels) + "\n\nMissing line items: " + ", ".join(missing) + "\n"
+    return assemble_prompt("line items", LINE_ITEM_PREFIX + "\n", data, "\n" + error_section)
+
+DASHBOARD_CHART_GUIDE = """
 Revenue Analysis:
 - Line Chart: Revenue over time (monthly, yearly)
 - Bar Chart: Revenue per product/category/store
@@ -66,7 +217,8 @@ Cost Optimization Analysis:
 - Box Plot: Cost variance (outliers)
 - Trend Line Chart: Cost impact over time
 """
-    outputFormat = """
+
+DASHBOARD_OUTPUT_FORMAT = """
 [
   {
     "title": "Revenue Analysis",
@@ -79,7 +231,8 @@ Cost Optimization Analysis:
   },
 ]
 """
-    return f"""
+
+DASHBOARD_PREFIX = f"""
 You are a financial dashboard AI assistant.
 Empty strings are not legal JSON5.
 Given this JSON data for a small business, generate dashboards for these **3 fixed sections**:
@@ -88,7 +241,7 @@ You will generate **three high-quality dashboards** for a small business using t
 2. Profit Margin Analysis
 3. Cost Optimization Analysis
 For each, choose the best-fitting chart type using this guide:
-{chart_guide}
+{DASHBOARD_CHART_GUIDE}
 ❌ DO NOT include any introductions, bullet points, titles, commentary, or markdown.
 ✅ Your entire response must be a valid JSON list: [{{...}}, {{...}}, ...]
 
@@ -99,18 +252,22 @@ Each object should have:
 - "data_points": label → JSON path (e.g., "Revenue": "revenue_analysis.revenue")
 - "insight": a recommendation (2–3 sentences) about what the chart shows and how to improve
 
-Error form previous attempts:
-{error_section}
-
 Output format (JSON list):
-{outputFormat}
-
-Financial data:
-{json_str}
+{DASHBOARD_OUTPUT_FORMAT}
 """
-def get_timeseries_prompt(prompt_data, field_name="Revenue", error_message=None):
-    error_section = f"\nNote: Previous attempt failed:\n{error_message}\nPlease fix the formatting.\n" if error_message else ""
-    outputFormat = """
+
+def get_dashboard_retry(error_message):
+    return f"\nNote: The previous attempt failed with this JSON parsing error:\n{error_message}\nPlease output valid JSON.\n"
+
+def dashboard_prompt_parts(json_str, error_message=None):
+    # -> (prefix, data, suffix) before any trimming, as assemble_prompt takes them
+    error_section = get_dashboard_retry(error_message) if error_message else ""
+    return DASHBOARD_PREFIX + "\nFinancial data:\n", json_str, "\n" + error_section
+
+def get_dashboard_prompt(json_str, error_message=None):
+    return assemble_prompt("dashboard", *dashboard_prompt_parts(json_str, error_message))
+
+TIMESERIES_OUTPUT_FORMAT = """
 {
   "sku_forecast": {
     "SKU Name A": {
@@ -135,20 +292,8 @@ def get_timeseries_prompt(prompt_data, field_name="Revenue", error_message=None)
   }
 }
 """
-    outputFormat2 = """
-{
-  "sku_forecast": {
-    "PRODUCT NAME A": {
-      "2022-07": 152.30,
-      "2022-08": 98.00
-    },
-    "PRODUCT NAME B": {
-      "2022-07": 240.75
-    }
-  }
-}
-"""
-    return f"""
+
+TIMESERIES_PREFIX = f"""
 You are a financial data extraction AI.
 
 Given a sales spreadsheet with rows for **individual transactions** that include:
@@ -158,7 +303,7 @@ Given a sales spreadsheet with rows for **individual transactions** that include
 - a timestamp (e.g., date of transaction)
 
 Your task is to output a **monthly time series of total revenue per product** in this format:
-{outputFormat}
+{TIMESERIES_OUTPUT_FORMAT}
 Do not include any explanation, comments, or notes in your answer.
 Notes:
 - Compute revenue = quantity × price
@@ -166,11 +311,59 @@ Notes:
 - Timestamps should be grouped by **month** using YYYY-MM
 - If no date or revenue is available, skip that row
 - Skip SKUs with no sales
+- If the sheet has a product category or type column, also add a top-level "sku_categories" object mapping each SKU name to its category (e.g. "SKU Name A": "Bakery")
 ✅ Use exact format above.
 ✅ Use default 1.0 for missing units.
 ✅ Round all values to 2 decimal places.
-{error_section}
+"""
 
-Spreadsheet data:
-{prompt_data}
+def get_timeseries_retry(error_message):
+    return f"\nNote: Previous attempt failed:\n{error_message}\nPlease fix the formatting.\n"
+
+def get_timeseries_prompt(prompt_data, field_name="Revenue", error_message=None):
+    error_section = get_timeseries_retry(error_message) if error_message else ""
+    return assemble_prompt("timeseries", TIMESERIES_PREFIX + "\nSpreadsheet data:\n", prompt_data, "\n" + error_section)
+
+INSIGHT_PREFIX = """
+You are a financial analyst AI for a small business.
+Below are dashboard charts that have already been built, with the values each one shows.
+For each chart, write one recommendation (2–3 sentences) about what the chart shows and how to improve.
+❌ DO NOT include any introductions, titles, commentary, or markdown.
+✅ Your entire response must be a valid JSON list of strings, one per chart, in the same order: ["...", "...", ...]
 """
+
+def get_insight_prompt(charts_summary, error_message=None):
+    error_section = get_dashboard_retry(error_message) if error_message else ""
+    return assemble_prompt("insight", INSIGHT_PREFIX + "Charts:\n", charts_summary, "\n" + error_section)
+
+BATCHED_DASHBOARD_PREFIX = f"""
+You are a financial dashboard AI assistant.
+Empty strings are not legal JSON5.
+You will receive one or more small-business reports. Each report starts with a line "{REPORT_DELIMITER} <name>" followed by its JSON data.
+For EACH report, generate three high-quality dashboards, one for each of these fixed categories:
+1. Revenue Analysis
+2. Profit Margin Analysis
+3. Cost Optimization Analysis
+For each, choose the best-fitting chart type using this guide:
+{DASHBOARD_CHART_GUIDE}
+Each dashboard object should have:
+- "title": short chart name
+- "description": what it shows
+- "chart_type": one of: line, bar, treemap, bubble, waterfall, heatmap, horizontal bar, etc.
+- "data_points": label → JSON path into that report's data (e.g., "Revenue": "revenue_analysis.revenue")
+- "insight": a recommendation (2–3 sentences) about what the chart shows and how to improve
+
+❌ DO NOT include any introductions, bullet points, commentary, or markdown.
+✅ For every report, output the line "{REPORT_DELIMITER} <name>" and then that report's JSON list, like:
+{REPORT_DELIMITER} <name>
+{DASHBOARD_OUTPUT_FORMAT}
+"""
+
+def batched_dashboard_prompt_parts(reports, error_message=None):
+    # reports: {name: minified JSON string}; the instructions are sent once for all of them
+    error_section = f"\nNote: The previous attempt failed with this parsing error:\n{error_message}\nPlease output valid JSON for every report.\n" if error_message else ""
+    sections = "\n".join(f"{REPORT_DELIMITER} {name}\n{data}" for name, data in reports.items())
+    return BATCHED_DASHBOARD_PREFIX + "\nReports:\n", sections, "\n" + error_section
+
+def get_batched_dashboard_prompt(reports, error_message=None):
+    return assemble_prompt("batched dashboard", *batched_dashboard_prompt_parts(reports, error_message))
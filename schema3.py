@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from dates3 import detect_datetime_columns
+from transactions3 import (TRANSACTION_ROLES, aggregate_transactions, header_signature, parse_amounts,
+                           transaction_frame, aggregate_sku_months)
+
+SCHEMA_REGISTRY_FILE = "schema_registry.json"
+# Share of header tokens that must agree (same position) for a near match
+SCHEMA_MATCH_RATIO = 0.8
+# A learned mapping must reproduce this share of the LLM's SKUs, with units/prices within this relative error
+LEARN_MIN_SKU_OVERLAP = 0.5
+LEARN_MAX_ERROR = 0.25
+# Header-less exports get numbered columns, so every one with the same column count has the same signature.
+# Their entries only apply to a sheet whose first rows have the same value patterns and that sells at least
+# this share of the products the entry was learned on.
+FINGERPRINT_ROWS = 200
+FINGERPRINT_PRODUCTS = 50
+HEADERLESS_MIN_PRODUCT_OVERLAP = 0.5
+DATA_TOKENS = ("<num>", "<date>", "<time>", "<blank>")
+
+def schema_id(signature):
+    return hashlib.sha1("\x1f".join(signature).encode()).hexdigest()[:12]
+
+def load_schema_registry(filepath=SCHEMA_REGISTRY_FILE):
+    if not os.path.exists(filepath):
+        return {}
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read schema registry: {e}")
+        return {}
+
+def save_schema_registry(registry, filepath=SCHEMA_REGISTRY_FILE):
+    with open(filepath, "w") as f:
+        json.dump(registry, f, indent=2)
+
+def _similarity(a, b):
+    if len(a) != len(b) or not a:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+def is_headerless(signature):
+    return all(token in DATA_TOKENS for token in signature)
+
+def _value_pattern(value):
+    # "1.234,50 €" -> "9.9,9 €", "12/03/2024" -> "9/9/9", "Pain au chocolat" -> "a"
+    text = re.sub(r"\d+", "9", str(value).strip().lower())
+    return re.sub(r"[^\W\d_]+(?:\s+[^\W\d_]+)*", "a", text)
+
+def value_fingerprint(df, rows=FINGERPRINT_ROWS):
+    # Most common value pattern of each column over the first rows: date order and separators, decimal
+    # commas, currency symbols and text columns tell two same-shaped exports apart
+    head = df.head(rows)
+    patterns = [head.iloc[:, i].dropna().map(_value_pattern).mode() for i in range(head.shape[1])]
+    return [p.iat[0] if len(p) else "<blank>" for p in patterns]
+
+def _top_products(df, column, n=FINGERPRINT_PRODUCTS):
+    return df[column].dropna().astype(str).str.strip().value_counts().index[:n].tolist()
+
+def same_file(df, entry):
+    # A header-less sheet only matches an entry learned on the same export: the same value pattern in every
+    # column, and mostly the same products. Entries saved before fingerprints existed never match.
+    if entry.get("fingerprint") != value_fingerprint(df):
+        return False
+    product = resolve_roles(df, entry).get("product")
+    if product is None or not entry.get("products"):
+        return False
+    known = set(_top_products(df, product, n=None))
+    return sum(p in known for p in entry["products"]) / len(entry["products"]) >= HEADERLESS_MIN_PRODUCT_OVERLAP
+
+def find_schema(signature, registry, min_ratio=SCHEMA_MATCH_RATIO, df=None):
+    # -> (entry id, entry, similarity) for an exact signature, else the closest near match, else (None, None, 0).
+    # Header-less entries need the sheet itself (df) to pass same_file.
+    signature = list(signature)
+    key = schema_id(signature)
+    if key in registry and not is_headerless(signature):
+        return key, registry[key], 1.0
+    best = (None, None, 0.0)
+    for entry_id, entry in registry.items():
+        ratio = _similarity(signature, entry["signature"])
+        if ratio < min_ratio or ratio <= best[2]:
+            continue
+        if is_headerless(entry["signature"]) and (df is None or not same_file(df, entry)):
+            continue
+        best = (entry_id, entry, ratio)
+    return best
+
+def resolve_roles(df, entry):
+    # Roles by column name when the name is still there, otherwise by the position it was learned at
+    roles = {}
+    for role, column in entry["roles"].items():
+        if column in df.columns:
+            roles[role] = column
+        elif role in entry.get("positions", {}) and entry["positions"][role] < df.shape[1]:
+            roles[role] = df.columns[entry["positions"][role]]
+    return roles
+
+def lookup_schema(data, registry):
+    # -> (sheet, roles, entry id, similarity) for the first sheet with a registered layout; the sheet
+    # the entry was learned on is tried first
+    best = None
+    for sheet, df in data.items():
+        entry_id, entry, ratio = find_schema(header_signature(df), registry, df=df)
+        if entry is None:
+            continue
+        candidate = (sheet, resolve_roles(df, entry), entry_id, ratio)
+        if sheet == entry.get("sheet"):
+            return candidate
+        best = best or candidate
+    return best
+
+def register_schema(registry, df, sheet, roles, source, learned="llm"):
+    signature = list(header_signature(df))
+    fingerprint = value_fingerprint(df)
+    # Same-shaped header-less exports from different files get their own entries
+    entry_id = schema_id(signature + fingerprint if is_headerless(signature) else signature)
+    columns = list(df.columns)
+    previous = registry.get(entry_id, {})
+    registry[entry_id] = {
+        "signature": signature,
+        "sheet": sheet,
+        "roles": {role: str(column) for role, column in roles.items() if column is not None},
+        "positions": {role: columns.index(column) for role, column in roles.items() if column in columns},
+        "fingerprint": fingerprint,
+        "products": _top_products(df, roles["product"]) if roles.get("product") in columns else [],
+        "source": source,
+        "learned": learned,
+        "uses": previous.get("uses", 0),
+        "updated": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    return entry_id
+
+def _relative_error(expected, actual):
+    expected, actual = np.asarray(expected, dtype=float), np.asarray(actual, dtype=float)
+    return float(np.median(np.abs(actual - expected) / np.maximum(np.abs(expected), 1e-9)))
+
+def _llm_points(json_data, field):
+    return {(sku, month): float(val[field]) for sku, months in json_data.get("sku_forecast", {}).items()
+            for month, val in months.items() if isinstance(val, dict) and isinstance(val.get(field), (int, float))}
+
+def _score(df, roles, json_data, field):
+    # Median relative error of one field against the LLM's numbers, over the (sku, month) pairs both have
+    try:
+        ours = aggregate_sku_months(transaction_frame(df, roles))["sku_forecast"]
+    except Exception:
+        return np.inf
+    expected = _llm_points(json_data, field)
+    pairs = [(v, ours[sku][month].get(field)) for (sku, month), v in expected.items()
+             if month in ours.get(sku, {}) and ours[sku][month].get(field) is not None]
+    return _relative_error(*zip(*pairs)) if pairs else np.inf
+
+def infer_roles(df, json_data):
+    # Works out which columns an LLM extraction of this sheet must have used: the product column holds its
+    # SKU names, the date column is detected, and quantity/price are the numeric columns whose aggregation
+    # reproduces its units and prices. -> roles, or None when nothing reproduces the extraction.
+    skus = set(json_data.get("sku_forecast", {}))
+    if not skus:
+        return None
+    text_cols = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])
+                 and not pd.api.types.is_datetime64_any_dtype(df[c])]
+    overlap = {c: len(skus & set(df[c].dropna().astype(str).str.strip())) / len(skus) for c in text_cols}
+    product = max(overlap, key=overlap.get, default=None)
+    if product is None or overlap[product] < LEARN_MIN_SKU_OVERLAP:
+        return None
+    date, _ = detect_datetime_columns(df.drop(columns=[product]))
+    if date is None:
+        return None
+    numeric = [c for c in df.columns if c not in (product, date) and parse_amounts(df[c]).notna().mean() > 0.9]
+    roles = {"date": date, "product": product, "quantity": None, "price": None}
+    if numeric:
+        units_errors = {c: _score(df, dict(roles, quantity=c), json_data, "units") for c in numeric}
+        quantity = min(units_errors, key=units_errors.get)
+        if units_errors[quantity] <= LEARN_MAX_ERROR:
+            roles["quantity"] = quantity
+        price_errors = {c: _score(df, dict(roles, price=c), json_data, "price")
+                        for c in numeric if c != roles["quantity"]}
+        if price_errors:
+            price = min(price_errors, key=price_errors.get)
+            if price_errors[price] <= LEARN_MAX_ERROR:
+                roles["price"] = price
+    if roles["price"] is None:
+        return None
+    categories = json_data.get("sku_categories", {})
+    for c in text_cols if categories else []:
+        if c == product:
+            continue
+        modes = df.groupby(product, observed=True)[c].agg(lambda v: v.mode().iat[0] if v.notna().any() else None)
+        modes.index = modes.index.astype(str).str.strip()
+        agree = sum(str(modes.get(sku)) == str(category) for sku, category in categories.items())
+        if agree / len(categories) >= LEARN_MIN_SKU_OVERLAP:
+            roles["category"] = c
+            break
+    return roles
+
+def learn_schema(data, json_data, source, filepath=SCHEMA_REGISTRY_FILE):
+    # After a successful LLM extraction: remember the sheet and column roles that reproduce it
+    registry = load_schema_registry(filepath)
+    for sheet, df in data.items():
+        roles = infer_roles(df, json_data)
+        if roles:
+            entry_id = register_schema(registry, df, sheet, roles, source)
+            save_schema_registry(registry, filepath)
+            print(f"🗂️ Learned schema {entry_id} for sheet '{sheet}': "
+                  + ", ".join(f"{role}={column}" for role, column in roles.items() if column))
+            return entry_id
+    return None
+
+def extract_with_schema(data, filepath=SCHEMA_REGISTRY_FILE):
+    # Deterministic forecast extraction for layouts seen before. -> (json data, transaction frame), or
+    # (None, None) when no registered schema applies
+    registry = load_schema_registry(filepath)
+    match = lookup_schema(data, registry)
+    if match is None:
+        return None, None
+    sheet, roles, entry_id, ratio = match
+    kind = "exact" if ratio == 1.0 else f"near ({ratio:.0%})"
+    try:
+        frame = transaction_frame(data[sheet], roles)
+        json_data = aggregate_sku_months(frame)
+    except Exception as e:
+        print(f"⚠️ Schema {entry_id} ({kind} match) does not fit sheet '{sheet}': {e}")
+        return None, None
+    if not json_data["sku_forecast"]:
+        print(f"⚠️ Schema {entry_id} ({kind} match) produced no rows for sheet '{sheet}'")
+        return None, None
+    registry[entry_id]["uses"] = registry[entry_id].get("uses", 0) + 1
+    save_schema_registry(registry, filepath)
+    print(f"🗂️ Schema {entry_id} ({kind} match) on sheet '{sheet}': aggregated "
+          f"{len(json_data['sku_forecast'])} SKU(s) without the LLM")
+    return json_data, frame
+
+def _print_entry(entry_id, entry):
+    roles = ", ".join(f"{role}={column}" for role, column in entry["roles"].items())
+    print(f"{entry_id}  sheet '{entry['sheet']}'  {roles}")
+    print(f"    learned from {entry.get('source')} ({entry.get('learned')}, {entry.get('updated')}), "
+          f"used {entry.get('uses', 0)} time(s)")
+
+def main(argv):
+    # python schema3.py list
+    # python schema3.py show <file>
+    # python schema3.py set <file> [sheet=<name>] date=<col> product=<col> [quantity=<col>] [price=<col>] ...
+    # python schema3.py remove <id>
+    registry = load_schema_registry()
+    command = argv[0] if argv else "list"
+    if command == "list":
+        if not registry:
+            print("No schemas registered yet.")
+        for entry_id, entry in registry.items():
+            _print_entry(entry_id, entry)
+    elif command == "show" and len(argv) == 2:
+        from extract3 import read_data
+        for sheet, df in read_data(argv[1]).items():
+            entry_id, entry, ratio = find_schema(header_signature(df), registry, df=df)
+            print(f"Sheet '{sheet}': signature {schema_id(header_signature(df))} {list(header_signature(df))}")
+            if entry:
+                print(f"  matches ({ratio:.0%}):")
+                _print_entry(entry_id, entry)
+    elif command == "set" and len(argv) >= 2:
+        from extract3 import read_data
+        data = read_data(argv[1])
+        assignments = dict(arg.split("=", 1) for arg in argv[2:] if "=" in arg)
+        sheet = assignments.pop("sheet", next(iter(data), None))
+        if sheet not in data:
+            print(f"❌ Sheet '{sheet}' not found; sheets: {', '.join(data)}")
+            return
+        # Excel headers can be numbers; match the typed names by their text
+        columns = {str(c): c for c in data[sheet].columns}
+        assignments = {role: columns.get(column, column) for role, column in assignments.items()}
+        bad = [role for role in assignments if role not in TRANSACTION_ROLES]
+        if bad:
+            print(f"❌ Unknown role(s) {', '.join(bad)}; roles: {', '.join(TRANSACTION_ROLES)}")
+            return
+        try:
+            aggregate_transactions(data[sheet], assignments)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        entry_id = register_schema(registry, data[sheet], sheet, assignments, argv[1], learned="cli")
+        save_schema_registry(registry)
+        print(f"✅ Saved schema {entry_id}")
+        _print_entry(entry_id, registry[entry_id])
+    elif command == "remove" and len(argv) == 2:
+        if registry.pop(argv[1], None) is None:
+            print(f"❌ No schema {argv[1]}")
+            return
+        save_schema_registry(registry)
+        print(f"🗑️ Removed schema {argv[1]}")
+    else:
+        print("Usage: python schema3.py list | show <file> | set <file> [sheet=<name>] role=<column> ... | remove <id>")
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
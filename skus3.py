@@ -0,0 +1,190 @@
+import json
+import os
+import re
+from collections import Counter, defaultdict
+import pandas as pd
+from transactions3 import parse_amounts
+
+SKU_ALIAS_FILE = os.environ.get("SMB_SKU_ALIASES", "sku_aliases.json")
+# Dice similarity of two names' character n-grams needed to merge them; 1.0 merges only exact normalized matches
+SKU_MATCH_THRESHOLD = float(os.environ.get("SMB_SKU_THRESHOLD", "0.85"))
+NGRAM_SIZE = 3
+# N-grams shared by more names than this (" pa", "ain" in a bakery) are skipped when looking up candidates,
+# which keeps the lookup close to linear; real near-duplicates still share plenty of rarer n-grams
+MAX_NGRAM_POSTINGS = 200
+
+def _singular(word):
+    if len(word) > 3 and word.endswith(("ses", "xes", "zes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def normalize_sku(name):
+    # "  Croissants ", "CROISSANT" and "croissant." -> "croissant"
+    words = re.sub(r"[^\w]+", " ", str(name).casefold()).split()
+    return " ".join(_singular(w) for w in words)
+
+def ngrams(text, n=NGRAM_SIZE):
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+def dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 1.0
+
+def _digits(text):
+    return re.findall(r"\d+", text)
+
+def load_sku_aliases(filepath=SKU_ALIAS_FILE):
+    # {"variant name": "canonical name"}, applied before any matching. Canonical names in the file are never
+    # merged with each other, so {"Pain": "Pain", "Pains": "Pains"} keeps two look-alikes apart.
+    if not os.path.exists(filepath):
+        return {}
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read SKU aliases: {e}")
+        return {}
+
+class _UnionFind:
+    def __init__(self, items):
+        self.parent = {item: item for item in items}
+
+    def find(self, item):
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        self.parent[self.find(b)] = self.find(a)
+
+def cluster_names(names, threshold=SKU_MATCH_THRESHOLD, aliases=None, weights=None):
+    # -> {original name: canonical name}. Aliases first, then exact matches after normalize_sku, then
+    # near matches found through an n-gram inverted index (never across different numbers: "Boule 400G"
+    # and "Boule 200G" stay apart). The canonical name of a group is its heaviest member (by `weights`).
+    aliases = {k.strip(): v.strip() for k, v in (aliases or {}).items()}
+    weights = weights or {}
+    # Canonical names that normalize alike (e.g. "Pain" and "Pains") keep their exact spelling as the key
+    clashes = Counter(normalize_sku(target) for target in set(aliases.values()))
+
+    def key_for(name):
+        target = aliases.get(name.strip())
+        if target is None:
+            return normalize_sku(name)
+        key = normalize_sku(target)
+        return key if clashes[key] == 1 else f"={target}"
+
+    keys = {name: key_for(name) for name in names}
+    pinned_keys = {keys[name] for name in names if name.strip() in aliases}
+    distinct = sorted(set(keys.values()))
+    groups = _UnionFind(distinct)
+    if threshold < 1.0:
+        grams = {key: ngrams(key) for key in distinct}
+        postings = defaultdict(list)
+        for key in distinct:
+            for gram in grams[key]:
+                postings[gram].append(key)
+        for key in distinct:
+            shared = Counter(other for gram in grams[key] if len(postings[gram]) <= MAX_NGRAM_POSTINGS
+                             for other in postings[gram] if other > key)
+            # Dice >= t needs at least t * (|a| + |b|) / 2 shared n-grams, so most candidates are skipped unscored
+            for other, count in shared.items():
+                if count < threshold * (len(grams[key]) + len(grams[other])) / 2:
+                    continue
+                if _digits(key) != _digits(other) or (key in pinned_keys and other in pinned_keys):
+                    continue
+                if dice(grams[key], grams[other]) >= threshold:
+                    groups.union(key, other)
+    members = defaultdict(list)
+    for name in names:
+        members[groups.find(keys[name])].append(name)
+    mapping = {}
+    for root, group in members.items():
+        preferred = [aliases[n.strip()] for n in group if n.strip() in aliases]
+        canonical = preferred[0] if preferred else max(group, key=lambda n: (weights.get(n, 0), -len(n), n)).strip()
+        for name in group:
+            mapping[name] = canonical
+    return mapping
+
+def _amount(value):
+    # Prices and units as the LLM wrote them ("1,20 €", "3", 2.5) -> float, or None when unreadable
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    parsed = parse_amounts(pd.Series([value], dtype=object)).iloc[0]
+    return None if pd.isna(parsed) else float(parsed)
+
+def _as_entry(val):
+    # A simplified month (a bare price) is one unit at that price, as in prepare_prophet_input
+    if isinstance(val, dict):
+        return {key: _amount(val[key]) for key in ("units", "price", "cost") if key in val}
+    return {"units": 1.0, "price": _amount(val)}
+
+def _merge_months(target, months, label=None):
+    # Units add up; price and cost become unit-weighted averages. Months only one variant has are copied.
+    for month, val in months.items():
+        if month not in target:
+            target[month] = dict(val) if isinstance(val, dict) else val
+            continue
+        old = target[month]
+        if not isinstance(old, dict) and not isinstance(val, dict):
+            a, b = _amount(old), _amount(val)
+            if a is None or b is None:
+                kept, bad = (old, val) if a is not None else (val, old)
+                print(f"⚠️ {label} {month}: could not read {bad!r}, kept {kept!r}")
+                target[month] = kept
+            else:
+                target[month] = round(a + b, 2)
+            continue
+        old, new = _as_entry(old), _as_entry(val)
+        old_units, new_units = (1.0 if e.get("units") is None else e["units"] for e in (old, new))
+        total = old_units + new_units
+        merged = {"units": round(total, 2)}
+        for key in ("price", "cost"):
+            a, b = old.get(key), new.get(key)
+            if a is None and b is None:
+                if key == "price":
+                    print(f"⚠️ {label} {month}: no readable price in either variant")
+                continue
+            a, b = (b, b) if a is None else (a, a) if b is None else (a, b)
+            merged[key] = round((a * old_units + b * new_units) / total, 2) if total else b
+        target[month] = merged
+
+def _units(months):
+    return sum((_amount(v.get("units", 1)) or 0.0) if isinstance(v, dict) else 1.0 for v in months.values())
+
+def cluster_sku_forecast(json_data, threshold=SKU_MATCH_THRESHOLD, aliases=None, report=True):
+    # Merges near-duplicate SKU keys of an extraction, so each product gets one series and one Prophet fit.
+    # -> (merged json_data, {original name: canonical name} for the names that changed)
+    forecast = json_data.get("sku_forecast")
+    if not isinstance(forecast, dict) or not forecast:
+        return json_data, {}
+    aliases = load_sku_aliases() if aliases is None else aliases
+    weights = {sku: _units(months) for sku, months in forecast.items() if isinstance(months, dict)}
+    mapping = cluster_names(list(weights), threshold, aliases, weights)
+    merged = {}
+    for sku, months in forecast.items():
+        if isinstance(months, dict):
+            _merge_months(merged.setdefault(mapping[sku], {}), months, mapping[sku])
+    result = dict(json_data, sku_forecast={sku: dict(sorted(months.items())) for sku, months in merged.items()})
+    if isinstance(json_data.get("sku_categories"), dict):
+        categories = {}
+        for sku in sorted(json_data["sku_categories"], key=lambda s: -weights.get(s, 0)):
+            categories.setdefault(mapping.get(sku, sku), json_data["sku_categories"][sku])
+        result["sku_categories"] = categories
+    renamed = {sku: canonical for sku, canonical in mapping.items() if sku != canonical}
+    if report:
+        print_merge_report(len(forecast), len(merged), renamed)
+    return result, renamed
+
+def print_merge_report(before, after, renamed):
+    if before == after and not renamed:
+        print(f"🔗 SKU names: {before} distinct, nothing to merge")
+        return
+    print(f"🔗 SKU names: {before} -> {after} series ({before - after} merged)")
+    by_canonical = defaultdict(list)
+    for sku, canonical in renamed.items():
+        by_canonical[canonical].append(sku)
+    for canonical, variants in sorted(by_canonical.items()):
+        print(f"   {canonical} <- {', '.join(repr(v) for v in sorted(variants))}")
@@ -0,0 +1,251 @@
+import re
+from util3 import to_number, escape_key, split_path
+
+SECTIONS = ("Revenue Analysis", "Profit Margin Analysis", "Cost Optimization Analysis")
+
+# Checked in this order, so "profit_margin_analysis.revenue" lands in the profit section. A price is what
+# revenue is made of, so it sits with revenue ("cost_price" still hits "cost" first).
+SECTION_KEYWORDS = [
+    ("Profit Margin Analysis", ("profit", "margin", "net_income", "net income", "gross", "earnings", "ebit")),
+    ("Cost Optimization Analysis", ("cost", "expense", "cogs", "opex", "spend", "logistics", "inventory",
+                                    "overhead", "debt", "liabilit")),
+    ("Revenue Analysis", ("revenue", "sales", "turnover", "income", "units", "sold", "quantity", "price"))
+]
+
+SECTION_DESCRIPTIONS = {
+    "Revenue Analysis": "Revenue figures found in the extracted data.",
+    "Profit Margin Analysis": "Profit and margin figures found in the extracted data.",
+    "Cost Optimization Analysis": "Cost components found in the extracted data."
+}
+
+MAX_BARS = 12
+
+MONTHS = "jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec"
+PERIOD_PATTERNS = [
+    re.compile(r"^(19|20)\d{2}$"),
+    re.compile(r"^(19|20)\d{2}-\d{2}(-\d{2})?$"),
+    re.compile(r"^(q[1-4][ -]?(19|20)\d{2}|(19|20)\d{2}[ -]?q[1-4])$"),
+    re.compile(r"^fy ?\d{2,4}$"),
+    re.compile(rf"^({MONTHS})[a-z]* ?((19|20)?\d{{2}})?$")
+]
+
+def is_period(key):
+    key = str(key).strip().lower()
+    return any(p.match(key) for p in PERIOD_PATTERNS)
+
+def _number(value):
+    return None if isinstance(value, bool) else to_number(value)
+
+def normalize_path(path):
+    # "Revenue_Analysis.Net-Income" and "revenue analysis.netincome" both become "revenueanalysis.netincome"
+    return "".join(ch for ch in str(path).lower() if ch.isalnum() or ch == ".")
+
+def build_path_index(financial_data):
+    # One walk: every numeric leaf by dotted path, plus every period-keyed dict as a series,
+    # plus lookup tables that map near-miss spellings back to real paths. Dots inside keys ("Cola 0.5L")
+    # are escaped in the path (see util3.escape_key).
+    index = {"values": {}, "series": {}, "fuzzy": {}, "leaves": {}}
+
+    def walk(node, keys):
+        if not isinstance(node, dict):
+            value = _number(node)
+            if value is not None and keys:
+                index["values"][".".join(keys)] = value
+            return
+        items = [(str(k), v) for k, v in node.items()]
+        periods = [k for k, _ in items if is_period(k)]
+        if len(periods) >= 2 and len(periods) == len(items):
+            _add_series(index, keys, items)
+        for key, value in items:
+            walk(value, keys + [escape_key(key)])
+
+    walk(financial_data, [])
+    # Ambiguous spellings map to None so they are reported instead of guessed
+    for path in index["values"]:
+        key = normalize_path(path)
+        index["fuzzy"][key] = path if key not in index["fuzzy"] else None
+        leaf = key.rsplit(".", 1)[-1]
+        index["leaves"][leaf] = path if leaf not in index["leaves"] else None
+    return index
+
+def resolve_path(index, path):
+    # -> (real path or None, "ok" | "corrected" | "invalid"); every lookup is a dict hit
+    candidates = path if isinstance(path, list) else [path]
+    for candidate in candidates:
+        if isinstance(candidate, str) and candidate in index["values"]:
+            return candidate, "ok"
+    for candidate in candidates:
+        if not isinstance(candidate, str):
+            continue
+        key = normalize_path(candidate)
+        fixed = index["fuzzy"].get(key) or index["leaves"].get(key.rsplit(".", 1)[-1])
+        if fixed:
+            return fixed, "corrected"
+    return None, "invalid"
+
+def validate_dashboards(dashboards, index):
+    # Fix near-miss data_points paths in place of silently plotting 0; drop what can't be resolved
+    valid, report = [], []
+    for dash in dashboards:
+        if not isinstance(dash, dict) or not isinstance(dash.get("data_points"), dict):
+            report.append({"chart": str(dash)[:60], "label": None, "path": None, "status": "invalid", "resolved": None})
+            continue
+        points = {}
+        for label, path in dash["data_points"].items():
+            resolved, status = resolve_path(index, path)
+            report.append({"chart": dash.get("title"), "label": label, "path": path,
+                           "status": status, "resolved": resolved})
+            if resolved:
+                points[label] = resolved
+        if points:
+            valid.append(dict(dash, data_points=points))
+    return valid, report
+
+def print_validation_report(report):
+    counts = {status: sum(1 for r in report if r["status"] == status) for status in ("ok", "corrected", "invalid")}
+    print(f"🧭 Dashboard paths: {counts['ok']} ok, {counts['corrected']} corrected, {counts['invalid']} invalid")
+    for r in report:
+        if r["status"] == "corrected":
+            print(f"   ✏️ {r['chart']} / {r['label']}: {r['path']} -> {r['resolved']}")
+        elif r["status"] == "invalid":
+            print(f"   ❌ {r['chart']} / {r['label']}: {r['path']} not found in the data")
+
+def _add_series(index, keys, items):
+    parent = ".".join(keys)
+    fields = {}
+    for period, value in items:
+        if isinstance(value, dict):
+            for field, v in value.items():
+                if _number(v) is not None:
+                    fields.setdefault(str(field), {})[period] = f"{parent}.{escape_key(period)}.{escape_key(field)}"
+        elif _number(value) is not None:
+            fields.setdefault(None, {})[period] = f"{parent}.{escape_key(period)}"
+    for field, points in fields.items():
+        if len(points) >= 2:
+            name = parent if field is None else f"{parent}.*.{escape_key(field)}"
+            index["series"][name] = {
+                "parent": parent,
+                "field": field,
+                "points": dict(sorted(points.items(), key=lambda kv: _period_sort_key(kv[0])))
+            }
+
+def _period_sort_key(period):
+    key = str(period).strip().lower()
+    quarter = re.match(r"^q([1-4])[ -]?(\d{4})$", key) or re.match(r"^(\d{4})[ -]?q([1-4])$", key)
+    if quarter:
+        a, b = quarter.groups()
+        year, q = (b, a) if key.startswith("q") else (a, b)
+        return f"{year}-q{q}"
+    return key
+
+def section_for(path):
+    lowered = path.lower()
+    for section, keywords in SECTION_KEYWORDS:
+        if any(k in lowered for k in keywords):
+            return section
+    return None
+
+def humanize(key):
+    return str(key).replace("_", " ").strip().title()
+
+def _last_key(path):
+    keys = split_path(path)
+    return keys[-1] if keys else ""
+
+def _parent(path):
+    return ".".join(escape_key(key) for key in split_path(path)[:-1])
+
+def _series_chart(section, name, series):
+    label = humanize(series["field"] or _last_key(series["parent"]))
+    points = series["points"]
+    return {
+        "title": f"{section}: {label} over time",
+        "description": f"{label} per period ({name}).",
+        "chart_type": "line",
+        "data_points": {str(period): path for period, path in points.items()}
+    }
+
+def _entity_chart(section, parent, field, group, index):
+    # Same metric for many entities (e.g. units per SKU). The bars compare the latest period every entity
+    # reported; when they share none, each bar is its entity's own latest period and is labelled with it.
+    shared = set.intersection(*(set(series["points"]) for series in group))
+    common = max(shared, key=_period_sort_key) if shared else None
+    bars = {}
+    for series in group:
+        entity = _last_key(series["parent"])
+        if common is not None:
+            bars[entity] = series["points"][common]
+        else:
+            period, path = list(series["points"].items())[-1]
+            bars[f"{entity} ({period})"] = path
+    top = sorted(bars.items(), key=lambda kv: -abs(index["values"].get(kv[1], 0)))[:MAX_BARS]
+    label = humanize(field or _last_key(parent))
+    when = f"{common}" if common is not None else "each entry's latest period"
+    return {
+        "title": f"{section}: {label} by {humanize(_last_key(parent) or 'item')}",
+        "description": f"{label} in {when} for the top {len(top)} entries.",
+        "chart_type": "bar",
+        "data_points": dict(top)
+    }
+
+def _scalar_chart(section, paths):
+    labels = {}
+    for path in paths[:MAX_BARS]:
+        keys = split_path(path)
+        label = humanize(keys[-1])
+        if label in labels:
+            label = f"{humanize(keys[-2])} {label}" if len(keys) > 1 else path
+        labels[label] = path
+    return {
+        "title": section,
+        "description": SECTION_DESCRIPTIONS[section],
+        "chart_type": "bar",
+        "data_points": labels
+    }
+
+def describe_chart(chart, index):
+    # Deterministic insight text; the LLM can replace it later
+    values = [(label, index["values"].get(path)) for label, path in chart["data_points"].items()]
+    values = [(label, v) for label, v in values if v is not None]
+    if not values:
+        return "No values available for this chart."
+    if chart["chart_type"] == "line":
+        (first_label, first), (last_label, last) = values[0], values[-1]
+        change = f" ({(last - first) / abs(first) * 100:+.1f}%)" if first else ""
+        peak_label, peak = max(values, key=lambda kv: kv[1])
+        return (f"Moved from {first:,.2f} in {first_label} to {last:,.2f} in {last_label}{change}; "
+                f"the peak was {peak:,.2f} in {peak_label}.")
+    top_label, top = max(values, key=lambda kv: kv[1])
+    low_label, low = min(values, key=lambda kv: kv[1])
+    total = sum(v for _, v in values)
+    # A share only means something when nothing shown is negative
+    share = f" ({top / total * 100:.0f}% of the total shown)" if low >= 0 and top > 0 else ""
+    return f"Largest is {top_label} at {top:,.2f}{share}; smallest is {low_label} at {low:,.2f}."
+
+def generate_dashboard_spec(financial_data, index=None):
+    # Chart specs for the three fixed sections whose data_points all resolve by construction
+    index = index or build_path_index(financial_data)
+    series_paths = {path for s in index["series"].values() for path in s["points"].values()}
+    dashboards = []
+    for section in SECTIONS:
+        series = {name: s for name, s in index["series"].items() if section_for(name) == section}
+        chart = None
+        if series:
+            groups = {}
+            for s in series.values():
+                groups.setdefault((_parent(s["parent"]), s["field"]), []).append(s)
+            (parent, field), group = max(groups.items(), key=lambda kv: len(kv[1]))
+            if len(group) >= 2:
+                chart = _entity_chart(section, parent, field, group, index)
+            else:
+                name, longest = max(series.items(), key=lambda kv: len(kv[1]["points"]))
+                chart = _series_chart(section, name, longest)
+        else:
+            scalars = [p for p in index["values"] if p not in series_paths and section_for(p) == section]
+            if scalars:
+                chart = _scalar_chart(section, scalars)
+        if chart:
+            chart["section"] = section
+            chart["insight"] = describe_chart(chart, index)
+            dashboards.append(chart)
+    return dashboards
@@ -0,0 +1,211 @@
+import re
+import pandas as pd
+from util3 import to_number
+
+# Fields of the summary structure in prompts.EXTRACTION_STRUCTURE, as (section, key)
+SUMMARY_FIELDS = [
+    ("revenue_analysis", "revenue"),
+    ("profit_margin_analysis", "revenue"),
+    ("profit_margin_analysis", "cost_of_goods_sold"),
+    ("profit_margin_analysis", "gross_profit"),
+    ("profit_margin_analysis", "net_income"),
+    ("cost_optimization_analysis", "operating_expenses"),
+    ("cost_optimization_analysis", "inventory_costs"),
+    ("cost_optimization_analysis", "logistics_costs")
+]
+
+# Line item -> labels it goes by, most specific first. Labels are matched after normalize_label,
+# so "Revenue (Sales)", "Revenue ($B)" and "REVENUE:" all hit "revenue".
+LINE_ITEM_SYNONYMS = {
+    "revenue": ("total revenue", "total revenues", "net revenue", "net revenues", "revenue", "revenues",
+                "net sales", "total sales", "sales", "sales revenue", "turnover"),
+    "cost_of_goods_sold": ("cost of goods sold", "cogs", "cost of sales", "cost of revenue", "cost of revenues",
+                           "direct costs", "cost of merchandise sold"),
+    "gross_profit": ("gross profit", "gross margin", "gross income"),
+    "net_income": ("net income", "net profit", "net earnings", "earnings", "profit after tax",
+                   "net income loss", "net profit loss", "profit for the year"),
+    "operating_expenses": ("total operating expenses", "operating expenses", "opex", "total expenses",
+                           "operating costs", "sg and a", "selling general and administrative"),
+    "inventory_costs": ("inventory costs", "inventory cost", "inventory holding costs", "carrying costs",
+                        "stock costs", "inventory purchases"),
+    "logistics_costs": ("logistics costs", "logistics", "shipping", "shipping costs", "freight",
+                        "delivery costs", "distribution costs", "transportation")
+}
+
+# Labels that report the same item with the opposite sign, e.g. "Net Loss" of 2000 is net income of -2000
+NEGATED_SYNONYMS = {
+    "net loss": "net_income",
+    "net loss for the year": "net_income",
+    "gross loss": "gross_profit"
+}
+
+# Columns (in column-per-item sheets) that hold the period of each row
+PERIOD_COLUMN_NAMES = ("year", "fiscal year", "fy", "period", "date")
+
+YEAR_PATTERN = re.compile(r"^(?:fy ?)?((?:19|20)\d{2})(?:\.0)?$")
+
+def normalize_label(label):
+    # "Cost of Goods Sold (COGS)" -> ["cost of goods sold", "cogs"]: the label without parentheses,
+    # then whatever the parentheses held
+    text = str(label).lower().replace("&", " and ")
+    inner = re.findall(r"\(([^)]*)\)", text)
+    candidates = [re.sub(r"\([^)]*\)", " ", text)] + inner
+    return [c for c in (" ".join(re.sub(r"[^a-z0-9]+", " ", c).split()) for c in candidates) if c]
+
+def _synonym_lookup():
+    lookup = {}
+    for item, labels in LINE_ITEM_SYNONYMS.items():
+        for rank, label in enumerate(labels):
+            lookup.setdefault(label, (item, 1, rank))
+    for label, item in NEGATED_SYNONYMS.items():
+        lookup.setdefault(label, (item, -1, 0))
+    return lookup
+
+SYNONYM_LOOKUP = _synonym_lookup()
+
+def _number(value):
+    # to_number, minus the NaN of empty cells
+    value = None if isinstance(value, bool) else to_number(value)
+    return None if value is None or value != value else value
+
+def year_of(value):
+    # 2023, "2023", "FY2023", "FY 2023" -> 2023; anything else -> None
+    if isinstance(value, bool):
+        return None
+    match = YEAR_PATTERN.match(str(value).strip().lower())
+    return int(match.group(1)) if match else None
+
+# Statements are short; longer sheets are transaction lists and are left to the other extractors
+MAX_STATEMENT_ROWS = 500
+
+# Rows searched for a year header when the sheet's own header has none (title rows above the table)
+HEADER_SEARCH_ROWS = 10
+
+def _label_column(df, exclude=()):
+    # First column whose values are mostly text: the line-item labels
+    for name in df.columns:
+        if name in exclude:
+            continue
+        values = df[name].dropna()
+        if len(values) and values.map(lambda v: isinstance(v, str) and _number(v) is None).mean() >= 0.5:
+            return name
+    return None
+
+def _period_column(df):
+    for name in df.columns:
+        if " ".join(normalize_label(name)[:1]) in PERIOD_COLUMN_NAMES:
+            return name
+    for name in df.columns:
+        values = df[name].dropna()
+        if len(values) >= 2 and values.map(year_of).notna().all():
+            return name
+    return None
+
+def _year_header(df):
+    # -> (year columns in order, first data row) from a year row under some title rows
+    for i in range(min(HEADER_SEARCH_ROWS, len(df))):
+        row = df.iloc[i]
+        year_cols = {name: year_of(v) for name, v in row.items() if pd.notna(v) and year_of(v) is not None}
+        if year_cols:
+            return year_cols, i + 1
+    return {}, 0
+
+def _row_values(row, label_col, year_cols):
+    # Values by year; when the numbers sit beside their year column (a "$" cell in between, merged
+    # cells), a row with exactly one number per year is read in column order instead
+    cells = [_number(v) for name, v in row.items() if name != label_col]
+    numbers = [v for v in cells if v is not None]
+    if not year_cols:
+        return {0: numbers[-1]} if numbers else {}
+    direct = {year: _number(row[name]) for name, year in year_cols.items()}
+    direct = {year: v for year, v in direct.items() if v is not None}
+    if len(direct) < len(year_cols) and len(numbers) == len(year_cols):
+        return dict(zip(year_cols.values(), numbers))
+    return direct
+
+def statement_line_items(df):
+    # -> [(label, {year: value})] for a statement sheet. Years as columns ("Metric | 2023 | 2024"),
+    # years as rows ("Year | Revenue | ...") and single-period statements (year 0) all work.
+    if len(df) > MAX_STATEMENT_ROWS:
+        return []
+    year_cols, first_row = {name: year_of(name) for name in df.columns if year_of(name) is not None}, 0
+    period_col = None if year_cols else _period_column(df)
+    if period_col is not None:
+        years = df[period_col].map(year_of)
+        items = []
+        for name in df.columns:
+            if name == period_col:
+                continue
+            values = {year: _number(v) for year, v in zip(years, df[name]) if year is not None}
+            values = {year: v for year, v in values.items() if v is not None}
+            if values:
+                items.append((str(name), values))
+        return items
+    if not year_cols:
+        year_cols, first_row = _year_header(df)
+    body = df.iloc[first_row:]
+    label_col = _label_column(body, year_cols)
+    if label_col is None:
+        return []
+    items = []
+    for _, row in body.iterrows():
+        label = row[label_col]
+        values = _row_values(row, label_col, year_cols) if isinstance(label, str) else {}
+        if values:
+            items.append((label.strip(), values))
+    return items
+
+def match_line_items(sheets):
+    # One pass over every label of every sheet, each a dict lookup.
+    # -> ({item: (label, {year: value})}, [unmatched labels]); earlier sheets and more specific synonyms win.
+    matched, ranks, unmatched = {}, {}, []
+    for df in sheets.values():
+        for label, values in statement_line_items(df):
+            hit = next((SYNONYM_LOOKUP[c] for c in normalize_label(label) if c in SYNONYM_LOOKUP), None)
+            if hit is None:
+                unmatched.append((label, values))
+                continue
+            item, sign, rank = hit
+            if item not in matched or rank < ranks[item]:
+                matched[item] = (label, {year: sign * v for year, v in values.items()})
+                ranks[item] = rank
+    return matched, unmatched
+
+def missing_items(matched):
+    missing = [item for item in LINE_ITEM_SYNONYMS if item not in matched]
+    if "gross_profit" in missing and {"revenue", "cost_of_goods_sold"} <= set(matched):
+        missing.remove("gross_profit")
+    return missing
+
+def _derive_gross_profit(matched):
+    if "gross_profit" in matched or not {"revenue", "cost_of_goods_sold"} <= set(matched):
+        return
+    revenue, cogs = matched["revenue"][1], matched["cost_of_goods_sold"][1]
+    matched["gross_profit"] = ("revenue - cost of goods sold",
+                               {year: revenue[year] - cogs[year] for year in revenue if year in cogs})
+
+def build_summary(matched):
+    # The summary structure with the latest year's values, plus a "by_year" series per section when there
+    # are several years, so the dashboard can chart the trend
+    _derive_gross_profit(matched)
+    summary = {section: {} for section, _ in SUMMARY_FIELDS}
+    for section, key in SUMMARY_FIELDS:
+        values = matched.get(key, (None, {}))[1]
+        summary[section][key] = values[max(values)] if values else 0
+    for section, key in SUMMARY_FIELDS:
+        values = {year: v for year, v in matched.get(key, (None, {}))[1].items() if year}
+        if len(values) >= 2:
+            by_year = summary[section].setdefault("by_year", {})
+            for year in sorted(values):
+                by_year.setdefault(str(year), {})[key] = values[year]
+    for section in summary.values():
+        if "by_year" in section:
+            section["by_year"] = dict(sorted(section["by_year"].items()))
+    return summary
+
+def print_match_report(matched, unmatched):
+    print(f"🧾 Matched {len(matched)} of {len(LINE_ITEM_SYNONYMS)} line items locally "
+          f"({len(unmatched)} other label(s) left)")
+    for item, (label, values) in matched.items():
+        years = ", ".join(str(y) for y in sorted(values) if y)
+        print(f"   {item}: {label!r}{f' ({years})' if years else ''}")
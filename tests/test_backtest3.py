@@ -0,0 +1,68 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from backtest3 import (rolling_origin_cutoffs, score_forecasts, backtest, build_leaderboard, overall_leaderboard,
+                       best_engines, engine_accuracy, save_leaderboard, load_leaderboard)
+
+def _series(values, start="2023-01"):
+    months = pd.period_range(start, periods=len(values), freq="M").strftime("%Y-%m")
+    return [{"ds": month, "y": float(v), "price": 2.0, "cost": 1.0} for month, v in zip(months, values)]
+
+def test_rolling_origin_cutoffs_leave_a_held_out_point():
+    assert rolling_origin_cutoffs(6) == [3, 4, 5]
+    assert rolling_origin_cutoffs(10, initial=4, step=3) == [4, 7]
+    assert rolling_origin_cutoffs(3) == []
+
+def test_score_forecasts():
+    scores = score_forecasts([100, 200, 0], [110, 180, 10], [90, 190, -5], [120, 195, 5])
+    assert scores["mape"] == pytest.approx((0.1 + 0.1) / 2 * 100)
+    assert scores["smape"] == pytest.approx(np.mean([20 / 210, 40 / 380, 2.0]) * 100)
+    assert scores["coverage"] == pytest.approx(2 / 3)
+    assert scores["n_forecasts"] == 3
+    # All-zero actuals have no MAPE, and a perfect zero forecast has no sMAPE error
+    assert math.isnan(score_forecasts([0, 0], [0, 0], [0, 0], [0, 0])["mape"])
+    assert score_forecasts([0, 0], [0, 0], [0, 0], [0, 0])["smape"] == 0.0
+
+def test_backtest_scores_each_cutoff(tmp_path):
+    data = {"Cola": _series([10, 20, 30, 40, 50, 60]), "Flat": _series([5, 5, 5, 5, 5])}
+    leaderboard = backtest(data, engines=("naive", "drift"), horizon=2, max_workers=1,
+                           cache_dir=str(tmp_path))
+    naive = engine_accuracy(leaderboard, "Cola", "naive")
+    # Cutoffs 3, 4, 5: last value 30 vs (40, 50), 40 vs (50, 60), 50 vs 60
+    errors = np.array([10, 20, 10, 20, 10]) / np.array([40, 50, 50, 60, 60])
+    assert naive["n_forecasts"] == 5
+    assert naive["mape"] == pytest.approx(errors.mean() * 100)
+    # A straight line is drift's best case
+    assert engine_accuracy(leaderboard, "Cola", "drift")["smape"] == pytest.approx(0.0)
+    assert best_engines(leaderboard)["Cola"] == "drift"
+    assert set(leaderboard["sku"]) == {"Cola", "Flat"}
+
+def test_backtest_reuses_cached_cutoffs(tmp_path, capsys):
+    data = {"Cola": _series([10, 20, 30, 40, 50, 60])}
+    first = backtest(data, engines=("naive",), max_workers=1, cache_dir=str(tmp_path))
+    second = backtest(data, engines=("naive",), max_workers=1, cache_dir=str(tmp_path))
+    assert "3 cached, 0 cutoff fit(s)" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(first, second)
+
+def test_leaderboard_ranking():
+    rows = [{"sku": "A", "engine": "naive", "mape": 10.0, "smape": 12.0, "coverage": 0.5, "n_forecasts": 2},
+            {"sku": "A", "engine": "drift", "mape": 5.0, "smape": 6.0, "coverage": 1.0, "n_forecasts": 2},
+            {"sku": "B", "engine": "naive", "mape": 1.0, "smape": 2.0, "coverage": 1.0, "n_forecasts": 6},
+            {"sku": "B", "engine": "drift", "mape": 3.0, "smape": 4.0, "coverage": 0.0, "n_forecasts": 6}]
+    leaderboard = build_leaderboard(rows)
+    assert leaderboard[["sku", "engine", "rank"]].values.tolist() == [
+        ["A", "drift", 1], ["A", "naive", 2], ["B", "naive", 1], ["B", "drift", 2]]
+    overall = overall_leaderboard(leaderboard).set_index("engine")
+    # Weighted by held-out points: B counts three times as much as A
+    assert overall.loc["naive", "smape"] == pytest.approx((12 * 2 + 2 * 6) / 8)
+    assert overall.loc["drift", "coverage"] == pytest.approx(2 / 8)
+    assert overall["wins"].to_dict() == {"naive": 1, "drift": 1}
+    assert build_leaderboard([]).empty and best_engines(build_leaderboard([])) == {}
+
+def test_leaderboard_is_tied_to_its_data(tmp_path):
+    leaderboard = build_leaderboard([{"sku": "A", "engine": "naive", "mape": 1.0, "smape": 1.0, "coverage": 1.0,
+                                      "n_forecasts": 1}])
+    save_leaderboard(leaderboard, "digest-a", cache_dir=str(tmp_path))
+    assert best_engines(load_leaderboard("digest-a", cache_dir=str(tmp_path))) == {"A": "naive"}
+    assert load_leaderboard("digest-b", cache_dir=str(tmp_path)).empty
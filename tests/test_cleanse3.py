@@ -0,0 +1,76 @@
+import pandas as pd
+from cleanse3 import _guess_roles, cleanse_sheets, cleanse_transactions
+from schema3 import register_schema
+
+def _sales(rows, columns=("date", "product", "quantity", "unit_price")):
+    return pd.DataFrame(rows, columns=list(columns))
+
+def test_exact_duplicates_are_dropped():
+    df = _sales([("2024-01-02", "Cola", 1, 2.0), ("2024-01-02", "Cola", 1, 2.0), ("2024-01-03", "Cola", 2, 2.0)])
+    cleaned, summary = cleanse_transactions(df)
+    assert len(cleaned) == 2
+    assert summary["exact_duplicates"] == 1
+
+def test_distinct_orders_that_look_alike_are_kept():
+    # Two orders of the same item, on the same day, at the same quantity and price are two sales
+    df = pd.DataFrame({"order_id": [1001, 1002, 1003], "date": ["2024-01-02"] * 3, "product": ["Cola"] * 3,
+                       "quantity": [1, 1, 2], "unit_price": [2.0, 2.0, 2.0]})
+    cleaned, summary = cleanse_transactions(df)
+    assert len(cleaned) == 3
+    assert summary["repeated_lines"] == 0 and summary["line_ids"] == []
+
+def test_order_keys_and_value_columns_are_never_line_ids():
+    df = pd.DataFrame({"order_id": [1001, 1002], "date": ["2024-01-02"] * 2, "product": ["Cola"] * 2,
+                       "quantity": [1, 2], "unit_price": [2.0, 2.0]})
+    cleaned, summary = cleanse_transactions(df, line_ids=["order_id", "quantity"])
+    assert len(cleaned) == 2
+    assert summary["line_ids"] == []
+
+def test_configured_line_id_drops_lines_scanned_twice():
+    df = pd.DataFrame({"line": [1, 2, 3], "ticket": [7, 7, 7], "date": ["2024-01-02"] * 3,
+                       "product": ["Coupe", "Coupe", "Baguette"], "quantity": [1, 1, 1],
+                       "unit_price": [0.15, 0.15, 0.9]})
+    cleaned, summary = cleanse_transactions(df, roles={"line_id": "line"})
+    assert cleaned["product"].tolist() == ["Coupe", "Baguette"]
+    assert summary["repeated_lines"] == 1 and summary["line_ids"] == ["line"]
+    kept, summary = cleanse_transactions(df, roles={"line_id": "line"}, drop_repeated=False)
+    assert len(kept) == 3 and summary["repeated_lines"] == 1
+
+def test_zero_price_and_zero_quantity_rows_are_dropped():
+    df = _sales([("2024-01-02", "Cola", 1, 0.0), ("2024-01-02", "Water", 0, 1.0), ("2024-01-02", "Tea", 1, 1.5)])
+    cleaned, summary = cleanse_transactions(df)
+    assert cleaned["product"].tolist() == ["Tea"]
+    assert summary["zero_price"] == 2
+
+def test_refunds_are_flagged_and_kept_unless_asked():
+    df = pd.DataFrame({"date": ["2024-01-02"] * 3, "product": ["Cola", "Cola", "Tea"], "quantity": [2, -1, 1],
+                       "unit_price": [2.0, 2.0, 1.5], "note": ["", "", "refund"]})
+    cleaned, summary = cleanse_transactions(df)
+    assert len(cleaned) == 3 and summary["refunds"] == 2
+    cleaned, _ = cleanse_transactions(df, drop_refunds=True)
+    assert cleaned["product"].tolist() == ["Cola"]
+
+def test_discount_is_not_the_quantity_column():
+    df = pd.DataFrame({"date": ["2024-01-02"] * 4, "product": ["A", "B", "C", "D"], "discount": [0, 0, 0, 5],
+                       "quantity": [1, 2, 3, 4], "unit_price": [1.0, 2.0, 3.0, 4.0]})
+    assert _guess_roles(df, None) == {"quantity": "quantity", "price": "unit_price"}
+    cleaned, summary = cleanse_transactions(df)
+    assert len(cleaned) == 4 and summary["zero_price"] == 0
+
+def test_amount_columns_are_not_prices():
+    df = pd.DataFrame({"date": ["2024-01-02"] * 2, "product": ["A", "B"], "tax_amount": [0.0, 0.0],
+                       "qty": [1, 2], "prix": [1.0, 2.0]})
+    assert _guess_roles(df, None) == {"quantity": "qty", "price": "prix"}
+    assert len(cleanse_transactions(df)[0]) == 2
+
+def test_registered_schema_roles_win_over_hints():
+    df = pd.DataFrame({"date": ["2024-01-02"] * 3, "item": ["A", "B", "C"], "n": [1, 2, 3],
+                       "price": [0.0, 0.0, 0.0], "net": [1.0, 2.0, 3.0]})
+    registry = {}
+    register_schema(registry, df, "Sheet1", {"date": "date", "product": "item", "quantity": "n", "price": "net"},
+                    "test.csv")
+    cleaned, summaries = cleanse_sheets({"Sheet1": df}, report=False, registry=registry)
+    assert len(cleaned["Sheet1"]) == 3
+    assert summaries["Sheet1"]["price"] == "net" and summaries["Sheet1"]["quantity"] == "n"
+    cleaned, _ = cleanse_sheets({"Sheet1": df}, report=False, registry={})
+    assert cleaned["Sheet1"].empty
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+from cube3 import build_cube, save_cube, load_cube, DEFAULT_COST_RATIO, UNCATEGORIZED
+from dates3 import period_labels
+
+def _transactions(n=400, seed=1):
+    rng = np.random.default_rng(seed)
+    skus = np.array(["Cola", "Juice", "Bread", "Croissant", "Tea"])
+    frame = pd.DataFrame({
+        "date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 540, n), unit="D"),
+        "sku": skus[rng.integers(0, len(skus), n)],
+        "units": rng.integers(1, 6, n).astype(float),
+        "price": rng.uniform(0.5, 5.0, n).round(2),
+        "cost": rng.uniform(0.2, 2.0, n).round(2)
+    })
+    # Missing costs fall back to the default ratio, missing units count as one
+    frame.loc[frame.index[::7], "cost"] = np.nan
+    frame.loc[frame.index[::11], "units"] = np.nan
+    return frame
+
+def _expected(frame, level):
+    units = frame["units"].fillna(1.0)
+    cost = frame["cost"].fillna(frame["price"] * DEFAULT_COST_RATIO)
+    expected = pd.DataFrame({
+        "sku": frame["sku"], "period": period_labels(frame["date"], level), "units": units,
+        "revenue": units * frame["price"], "cost": units * cost
+    })
+    expected["profit"] = expected["revenue"] - expected["cost"]
+    return expected.groupby(["sku", "period"])[["units", "revenue", "cost", "profit"]].sum()
+
+@pytest.mark.parametrize("level", ["day", "week", "month", "quarter", "year"])
+def test_cube_cells_match_groupby(level):
+    frame = _transactions()
+    cube = build_cube(frame)
+    expected = _expected(frame, level)
+    for (sku, period), row in expected.iterrows():
+        for measure in ("units", "revenue", "cost", "profit"):
+            assert cube.value(sku, period, measure, level) == pytest.approx(row[measure])
+    # Cells with no transactions are zero, not missing
+    assert cube.sku_data[level][:, :, 0].sum() == pytest.approx(expected["units"].sum())
+
+def test_cube_rollups_match_groupby():
+    frame = _transactions()
+    categories = {"Cola": "Drinks", "Juice": "Drinks", "Tea": "Drinks", "Bread": "Bakery"}
+    cube = build_cube(frame, categories=categories)
+    expected = _expected(frame, "month").reset_index()
+    expected["category"] = expected["sku"].map(categories).fillna(UNCATEGORIZED)
+
+    by_category = expected.groupby("category")["revenue"].sum()
+    assert cube.breakdown("revenue", "month") == pytest.approx(by_category.to_dict())
+    by_sku = expected.groupby("sku")["profit"].sum()
+    assert cube.breakdown("profit", "month", by="sku") == pytest.approx(by_sku.to_dict())
+
+    periods, values = cube.series("revenue", "month")
+    total = expected.groupby("period")["revenue"].sum()
+    assert periods == list(total.index) and values == pytest.approx(total.to_numpy())
+    _, drinks = cube.series("units", "month", category="Drinks")
+    assert drinks == pytest.approx(expected[expected["category"] == "Drinks"]
+                                   .groupby("period")["units"].sum().reindex(periods, fill_value=0).to_numpy())
+
+    top = cube.top(3, "revenue", "month")
+    assert [sku for sku, _ in top] == list(expected.groupby("sku")["revenue"].sum().nlargest(3).index)
+    assert [sku for sku, _ in cube.top(5, category="Drinks")] == list(
+        expected[expected["category"] == "Drinks"].groupby("sku")["revenue"].sum()
+        .sort_values(ascending=False).index)
+
+def test_cube_category_column_and_round_trip(tmp_path):
+    frame = _transactions().assign(category=lambda f: f["sku"].map({"Bread": "Bakery", "Croissant": "Bakery"}))
+    cube = build_cube(frame, levels=("month",), digest="abc")
+    assert cube.categories == ["Bakery", UNCATEGORIZED]
+    path = str(tmp_path / "cube.npz")
+    save_cube(cube, path)
+    loaded = load_cube(path, digest="abc")
+    assert loaded.skus == cube.skus and loaded.levels == cube.levels
+    assert np.array_equal(loaded.sku_data["month"], cube.sku_data["month"])
+    assert load_cube(path, digest="other") is None
@@ -0,0 +1,44 @@
+from dashboard3 import (pack_reports, split_batched_response, report_token_savings, minify_json,
+                        DASHBOARD_ANSWER_TOKENS)
+from prompts import batched_dashboard_prompt_parts, count_tokens, BATCHED_DASHBOARD_PREFIX
+
+def _report(i, n_skus=40):
+    return {"revenue_analysis": {"total": 1000.0 + i},
+            "sku_forecast": {f"SKU {i}-{s}": {"2024-01": {"units": s, "price": 2.5}} for s in range(n_skus)}}
+
+def _minified(n, n_skus=40):
+    return {f"report_{i}.json": minify_json(_report(i, n_skus)) for i in range(n)}
+
+def test_pack_reports_fits_every_batch_in_order():
+    minified = _minified(20)
+    batches = pack_reports(minified, num_ctx=4096)
+    assert len(batches) > 1
+    assert [name for batch in batches for name in batch] == list(minified)
+    for batch in batches:
+        prompt = count_tokens("".join(batched_dashboard_prompt_parts(batch)))
+        assert prompt + DASHBOARD_ANSWER_TOKENS * len(batch) <= 4096
+
+def test_pack_reports_gives_oversized_reports_their_own_batch():
+    minified = _minified(3, n_skus=2000)
+    assert pack_reports(minified, num_ctx=2048) == [{name: text} for name, text in minified.items()]
+
+def test_split_batched_response_parses_each_report():
+    response = ('### REPORT: **a.json**\n[{"title": "A", "type": "bar", "data_path": "x"}]\n'
+                '### REPORT: "b.json"\nHere you go: [{"title": "B", "type": "line", "data_path": "y"}]\n'
+                "### REPORT: c.json\nnot json at all\n"
+                '### REPORT: stray.json\n[{"title": "S"}]\n')
+    parsed, errors = split_batched_response(response, ["a.json", "b.json", "c.json", "d.json"])
+    assert parsed["a.json"][0]["title"] == "A"
+    assert parsed["b.json"] == [{"title": "B", "type": "line", "data_path": "y"}]
+    assert set(errors) == {"c.json", "d.json"}
+    assert errors["d.json"] == "Report missing from the response"
+    assert "stray.json" not in parsed
+
+def test_token_savings_count_every_report_in_full():
+    reports = {f"report_{i}.json": _report(i) for i in range(20)}
+    savings = report_token_savings(reports, num_ctx=4096)
+    data = sum(count_tokens(text) for text in _minified(20).values())
+    # Nothing is trimmed away: the batches carry all of the data plus one instruction block per call
+    assert savings["batched"] >= data + savings["calls"] * count_tokens(BATCHED_DASHBOARD_PREFIX)
+    assert 1 < savings["calls"] < 20
+    assert savings["single"] > savings["batched"]
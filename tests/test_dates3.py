@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+import dates3
+from dates3 import infer_format, parse_dates
+
+@pytest.mark.parametrize("values, expected", [
+    # Every day <= 12: both orders parse everything, so the earlier (month-first) format wins
+    (["03/04/2024", "05/06/2024"], "%m/%d/%Y"),
+    # One day > 12 settles the whole column as day-first
+    (["03/04/2024", "13/04/2024", "01/12/2024"], "%d/%m/%Y"),
+    (["03/04/2024", "04/13/2024"], "%m/%d/%Y"),
+    (["03/04/24", "05/06/24"], "%m/%d/%y"),
+    (["03.04.2024"], "%d.%m.%Y"),
+    (["2024-03", "2024-04"], "%Y-%m"),
+    (["Mar 2024"], "%b %Y"),
+    (["not a date", None], None),
+])
+def test_infer_format(values, expected):
+    assert infer_format(values) == expected
+
+def test_parse_dates_uses_one_order_for_the_column():
+    # "03/04" is read the way the rest of the column says, not per value
+    day_first = parse_dates(["03/04/2024", "13/04/2024"])
+    assert day_first.tolist() == [pd.Timestamp("2024-04-03"), pd.Timestamp("2024-04-13")]
+    month_first = parse_dates(["03/04/2024", "04/13/2024"])
+    assert month_first.tolist() == [pd.Timestamp("2024-03-04"), pd.Timestamp("2024-04-13")]
+
+def test_parse_dates_explicit_format_overrides_inference():
+    assert parse_dates(["03/04/2024"], fmt="%d/%m/%Y").tolist() == [pd.Timestamp("2024-04-03")]
+
+def test_parse_dates_mixed_formats_and_missing_values():
+    values = pd.Series(["13/04/2024", None, "2024-05-01", "13/04/2024", "garbage"], index=[5, 6, 7, 8, 9], name="d")
+    parsed = parse_dates(values)
+    assert parsed.index.tolist() == [5, 6, 7, 8, 9] and parsed.name == "d"
+    assert parsed.iloc[0] == parsed.iloc[3] == pd.Timestamp("2024-04-13")
+    assert parsed.iloc[2] == pd.Timestamp("2024-05-01")
+    assert pd.isna(parsed.iloc[1]) and pd.isna(parsed.iloc[4])
+
+def test_parse_dates_passes_datetimes_through():
+    values = pd.Series(pd.to_datetime(["2024-01-31", "2024-02-29"]))
+    assert parse_dates(values).equals(values)
+
+def test_cached_values_parse_like_cold_ones(monkeypatch):
+    monkeypatch.setattr(dates3, "_parsed", {})
+    first = ["13/04/2024", "garbage", "2024-05-01"]
+    cold = parse_dates(first)
+    # Partly cached: old values (the unparseable one included) come from the cache, new ones are parsed
+    warm = parse_dates(["2024-05-01", "14/04/2024", "garbage", "13/04/2024"])
+    assert warm.iloc[[0, 2, 3]].tolist() == [cold.iloc[2], cold.iloc[1], cold.iloc[0]]
+    assert warm.iloc[1] == pd.Timestamp("2024-04-14")
+    assert len(dates3._parsed["%d/%m/%Y"]) == 4
+
+def test_date_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(dates3, "_parsed", {})
+    monkeypatch.setattr(dates3, "DATE_CACHE_MAX_ITEMS", 5)
+    parse_dates([f"{d:02d}/01/2024" for d in range(13, 17)])
+    parse_dates([f"{d:02d}/02/2024" for d in range(13, 17)])
+    assert sum(map(len, dates3._parsed.values())) == 4
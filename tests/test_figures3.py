@@ -0,0 +1,99 @@
+import json
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import pytest
+from plotly.utils import PlotlyJSONEncoder
+from figures3 import lttb_indices, compact_figure, payload_size, COMPACT_TEMPLATE, TEMPLATE_NAME
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[[137, 512, 880]] = [50.0, -40.0, 30.0]
+    keep = lttb_indices(x, y, 100)
+    assert len(keep) == 100 and keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    # One point per bucket: the spikes span the largest triangles in theirs
+    assert {137, 512, 880} <= set(keep.tolist())
+
+def test_lttb_short_series_are_untouched():
+    assert lttb_indices(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb_indices(np.arange(5.0), np.arange(5.0), 2).tolist() == [0, 1, 2, 3, 4]
+
+def _figure(n):
+    dates = pd.date_range("2020-01-01", periods=n, freq="D")
+    y = np.sin(np.arange(n) / 20.0) * 100 + 1000
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=dates, y=y - 10, name="Lower Bound"))
+    fig.add_trace(go.Scatter(x=dates, y=y + 10, name="Upper Bound"))
+    fig.add_trace(go.Scatter(x=dates, y=y, name="Forecast"))
+    fig.update_layout(template="plotly_dark", title="Revenue")
+    return fig
+
+def test_compact_figure():
+    compact = compact_figure(_figure(3000), max_points=500, gl_threshold=400)
+    band, forecast = compact["data"]
+    assert band["name"] == "80% Interval" and band["fill"] == "toself" and len(band["x"]) == 1000
+    assert forecast["type"] == "scattergl" and len(forecast["y"]) == 500
+    assert forecast["x"][0] == "2020-01-01" and forecast["x"][-1] == "2028-03-18"
+    assert all(round(v, 2) == v for v in forecast["y"])
+    assert payload_size(compact)[0] < payload_size(_figure(3000))[0] / 4
+
+def test_compact_figure_names_its_template():
+    compact = compact_figure(_figure(10))
+    assert compact["layout"]["template"] == TEMPLATE_NAME
+    assert "paper_bgcolor" not in json.dumps(compact, cls=PlotlyJSONEncoder)
+    # plotly.py resolves the name through its registry
+    resolved = go.Figure(compact).layout.template.layout
+    assert resolved.paper_bgcolor == COMPACT_TEMPLATE["layout"]["paper_bgcolor"]
+
+def test_dashboard_layout_carries_the_template_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from dashboard3 import build_dash_app
+    data = {"revenue_analysis": {"revenue_by_month": {f"2023-{m:02d}": 100.0 + m for m in range(1, 13)}}}
+    app = build_dash_app([], data, use_cache=False)
+    layout = json.dumps(app.layout, cls=PlotlyJSONEncoder)
+    assert layout.count('"paper_bgcolor"') == 1
+    assert layout.count(f'"template": "{TEMPLATE_NAME}"') == 1
+
+@pytest.fixture
+def figure_cache(tmp_path, monkeypatch):
+    import figures3
+    monkeypatch.setattr(figures3, "_memory_cache", figures3.OrderedDict())
+    return figures3, str(tmp_path / "figure_cache")
+
+def test_figure_cache_round_trip(figure_cache):
+    figures3, cache_dir = figure_cache
+    section = {"mode": "multi", "items": [{"figure": compact_figure(_figure(20)), "insight": "Up"}]}
+    assert figures3.figure_cache_get("k", cache_dir) is None
+    figures3.figure_cache_put("k", section, cache_dir)
+    expected = json.loads(json.dumps(section, cls=PlotlyJSONEncoder))
+    assert figures3.figure_cache_get("k", cache_dir) == expected
+    # A new process only has the file
+    figures3._memory_cache.clear()
+    assert figures3.figure_cache_get("k", cache_dir) == expected
+    assert "k" in figures3._memory_cache
+
+def test_figure_cache_evicts_least_recently_used(figure_cache):
+    import os
+    figures3, cache_dir = figure_cache
+    blob = {"y": list(range(200))}
+    size = len(json.dumps(blob))
+    for age, key in enumerate(["a", "b"]):
+        figures3.figure_cache_put(key, blob, cache_dir)
+        os.utime(os.path.join(cache_dir, f"{key}.json"), (1000 + age, 1000 + age))
+    # Reading "a" makes "b" the least recently used entry
+    figures3.figure_cache_get("a", cache_dir)
+    figures3.figure_cache_put("c", blob, cache_dir, max_bytes=2 * size)
+    assert sorted(os.listdir(cache_dir)) == ["a.json", "c.json"]
+    assert figures3.figure_cache_get("b", cache_dir) is None
+
+def test_dashboard_sections_come_from_the_cache(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    from dashboard3 import build_dash_app
+    data = {"revenue_analysis": {"revenue_by_month": {f"2023-{m:02d}": 100.0 + m for m in range(1, 13)}}}
+    first = json.dumps(build_dash_app([], data).layout, cls=PlotlyJSONEncoder)
+    assert "0 hit(s)" in capsys.readouterr().out
+    second = json.dumps(build_dash_app([], data).layout, cls=PlotlyJSONEncoder)
+    assert "0 miss(es)" in capsys.readouterr().out
+    assert first == second
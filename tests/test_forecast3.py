@@ -0,0 +1,209 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import forecast3
+from forecast3 import (classify_series, select_engines, _new_prophet, _predict, generate_forecast_insight,
+                       build_hierarchy, reconcile_forecasts, forecast_hierarchy, build_forecast_table,
+                       RECONCILE_METHODS, FIT_LEVELS, signal_level, forecast_timeseries, prophet_params_file, load_prophet_params)
+
+def _monthly(values, start="2022-01"):
+    months = pd.period_range(start, periods=len(values), freq="M").strftime("%Y-%m")
+    return [{"ds": m, "y": float(v), "price": 2.0, "cost": 1.0} for m, v in zip(months, values)]
+
+def _sparse(months, values):
+    return [{"ds": m, "y": float(v), "price": 2.0, "cost": 1.0} for m, v in zip(months, values)]
+
+@pytest.mark.parametrize("records, expected", [
+    (_monthly([5]), None),
+    (_monthly([5, 6, 7]), "too_short"),
+    # Three reported months spread over a year: still too short, not intermittent
+    (_sparse(["2022-01", "2022-06", "2022-12"], [4, 5, 6]), "too_short"),
+    (_monthly(range(1, 9)), "short"),
+    (_monthly(range(1, 16)), "regular"),
+    (_monthly(range(1, 31)), "seasonal"),
+    # Gaps between reported months are unknown, not zero sales
+    (_sparse(["2021-01", "2021-04", "2021-07", "2021-10", "2022-01", "2022-04", "2022-07", "2022-10",
+              "2023-01", "2023-04", "2023-07", "2023-10"], range(1, 13)), "regular"),
+    # Reported zero-sales months make a series intermittent
+    (_monthly([0, 3, 0, 0, 4, 0, 0, 2, 0, 0, 5, 0, 0, 1]), "intermittent"),
+])
+def test_classify_series(records, expected):
+    assert classify_series(records) == expected
+
+def test_select_engines_routes_long_series_to_prophet():
+    selection = select_engines({"a": _monthly(range(1, 16)), "b": _monthly([1, 2]),
+                                "c": _monthly([0, 3, 0, 0, 4, 0, 0, 2, 0, 0, 5, 0])})
+    assert selection["a"] == ("regular", "prophet")
+    assert selection["b"] == ("too_short", "naive")
+    assert selection["c"] == ("intermittent", "croston")
+
+def test_select_engines_overrides_win():
+    selection = select_engines({"a": _monthly(range(1, 16))}, overrides={"a": "drift"})
+    assert selection["a"] == ("regular", "drift")
+
+def _history(n):
+    return pd.DataFrame({"ds": pd.date_range("2022-01-31", periods=n, freq="ME"),
+                         "y": [100.0 + 5 * i + (i % 12) for i in range(n)]})
+
+@pytest.mark.parametrize("profile, has_bounds", [("fast", False), ("accurate", True)])
+def test_profile_bounds(profile, has_bounds):
+    df = _history(24)
+    model = _new_prophet(df, profile)
+    model.fit(df)
+    forecast = _predict(model, model.make_future_dataframe(periods=3, freq="ME"))
+    assert forecast["yhat"].notna().all()
+    assert forecast[["yhat_lower", "yhat_upper"]].notna().all().all() == has_bounds
+
+def test_only_the_fast_profile_changes_seasonality():
+    df = _history(36)
+    accurate = _new_prophet(df, "accurate")
+    assert (accurate.yearly_seasonality, accurate.uncertainty_samples) == ("auto", 1000)
+    assert _new_prophet(df, "fast").yearly_seasonality == 5
+
+def test_new_prophet_rejects_unknown_profile():
+    with pytest.raises(ValueError):
+        _new_prophet(_history(6), "turbo")
+
+def test_insight_reports_coverage_only_with_intervals():
+    frame = pd.DataFrame({"ds": pd.date_range("2024-01-31", periods=3, freq="ME"),
+                          "yhat": [10.0, 11.0, 12.0], "revenue": [100.0, 110.0, 120.0],
+                          "profit": [30.0, 33.0, 36.0], "margin_pct": [30.0, 30.0, 30.0]})
+    accuracy = {"smape": 12.5, "coverage": 0.8, "n_forecasts": 9}
+    assert "interval coverage 80%" in generate_forecast_insight(frame, "Cola", accuracy)
+    fast = generate_forecast_insight(frame, "Cola", accuracy, intervals=False)
+    assert "sMAPE 12.5%" in fast and "coverage unavailable" in fast
+
+CATEGORIES = {"Cola": "Drinks", "Juice": "Drinks", "Bread": "Bakery"}
+
+def _hierarchy_input(months=18):
+    dates = pd.date_range("2022-01-31", periods=months, freq="ME").strftime("%Y-%m-%d")
+    units = {"Cola": 40.0, "Juice": 15.0, "Bread": 60.0}
+    prices = {"Cola": (2.0, 1.2), "Juice": (3.5, 2.0), "Bread": (1.5, 0.6)}
+    return {sku: [{"ds": ds, "y": base + 2 * i + (i % 4), "price": prices[sku][0], "cost": prices[sku][1]}
+                  for i, ds in enumerate(dates)] for sku, base in units.items()}
+
+def _assert_coherent(values, hier):
+    # Every node equals the sum of the SKUs under it
+    assert np.allclose(values, values[:, -hier["S"].shape[1]:] @ hier["S"].T)
+
+@pytest.mark.parametrize("method", FIT_LEVELS)
+def test_reconcile_forecasts_is_coherent(method):
+    hier = build_hierarchy(_hierarchy_input(), CATEGORIES)
+    rng = np.random.default_rng(0)
+    # Incoherent base forecasts on every node, as separate per-node fits would give
+    base = hier["revenue"][-3:] @ hier["S"].T * rng.uniform(0.8, 1.2, size=(3, len(hier["nodes"])))
+    residuals = rng.normal(size=(len(hier["dates"]), len(hier["nodes"])))
+    _assert_coherent(reconcile_forecasts(base, hier, method, residuals), hier)
+
+def test_reconcile_forecasts_keeps_the_fitted_level():
+    hier = build_hierarchy(_hierarchy_input(), CATEGORIES)
+    levels = np.array([level for level, _ in hier["nodes"]])
+    base = np.arange(3 * len(levels), dtype=float).reshape(3, len(levels)) + 1
+    assert np.allclose(reconcile_forecasts(base, hier, "bottom_up")[:, levels == "sku"], base[:, levels == "sku"])
+    assert np.allclose(reconcile_forecasts(base, hier, "top_down")[:, levels == "total"],
+                       base[:, levels == "total"])
+    assert np.allclose(reconcile_forecasts(base, hier, "middle_out")[:, levels == "category"],
+                       base[:, levels == "category"])
+
+def test_reconcile_forecasts_rejects_unknown_method():
+    hier = build_hierarchy(_hierarchy_input(), CATEGORIES)
+    with pytest.raises(ValueError):
+        reconcile_forecasts(np.zeros((1, len(hier["nodes"]))), hier, "sideways")
+
+@pytest.mark.parametrize("method", RECONCILE_METHODS)
+def test_forecast_hierarchy_totals_add_up(method):
+    result = forecast_hierarchy(_hierarchy_input(), CATEGORIES, method=method, periods=3, profile="fast")
+    for measure in ("revenue", "profit"):
+        by_level = result.pivot_table(index="ds", columns="level", values=measure, aggfunc="sum")
+        # Total, the categories and the SKUs each cover the whole business once
+        assert np.allclose(by_level["total"], by_level["category"])
+        assert np.allclose(by_level["total"], by_level["sku"])
+        drinks = result[(result["level"] == "sku") & result["node"].isin(["Cola", "Juice"])]
+        category = result[(result["level"] == "category") & (result["node"] == "Drinks")]
+        assert np.allclose(drinks.groupby("ds")[measure].sum().to_numpy(), category[measure].to_numpy())
+
+def _alternating(data, even, odd):
+    # SKUs in `even` only sell in even months, those in `odd` only in odd months
+    keep = lambda sku, i: (sku not in even or i % 2 == 0) and (sku not in odd or i % 2 == 1)
+    return {sku: [r for i, r in enumerate(records) if keep(sku, i)] for sku, records in data.items()}
+
+@pytest.mark.parametrize("even, odd, categories, expected", [
+    ((), (), CATEGORIES, "sku"),
+    # Intermittent SKUs whose category still sells every month
+    (("Cola",), ("Juice",), CATEGORIES, "category"),
+    # Only the total sells every month
+    (("Cola",), ("Juice", "Bread"), {"Cola": "Drinks", "Juice": "Bakery", "Bread": "Bakery"}, "total"),
+])
+def test_signal_level(even, odd, categories, expected):
+    data = _alternating(_hierarchy_input(), even, odd)
+    assert signal_level(build_hierarchy(data, categories)) == expected
+
+def test_hierarchy_labels_never_collide():
+    data = _hierarchy_input()
+    data["Total"] = data.pop("Bread")
+    data["Category: Drinks"] = data.pop("Juice")
+    categories = {"Cola": "Drinks", "Category: Drinks": "Drinks", "Total": "Bakery"}
+    table, mode = forecast_timeseries(data, hierarchy="bottom_up", categories=categories, periods=2,
+                                      profile="fast")
+    assert mode == "hierarchy"
+    assert list(table) == ["Total", "Category: Bakery", "Category: Drinks", "SKU: Category: Drinks",
+                           "SKU: Cola", "SKU: Total"]
+    totals = table.totals()
+    assert totals["Total"] == pytest.approx(totals["SKU: Total"] + totals["SKU: Cola"]
+                                            + totals["SKU: Category: Drinks"])
+
+def _prophet_frame(yhat, n_history, start="2024-01-31"):
+    n = len(yhat)
+    return pd.DataFrame({"ds": pd.date_range(start, periods=n, freq="ME"), "yhat": yhat,
+                         "yhat_lower": np.asarray(yhat) - 1.0, "yhat_upper": np.asarray(yhat) + 1.0,
+                         "is_forecast": [False] * n_history + [True] * (n - n_history)})
+
+def _table():
+    return build_forecast_table({
+        "Cola": (_prophet_frame([10.0, 12.0, 14.0, 16.0], 2), 2.0, 1.5),
+        "Bread": (_prophet_frame([30.0, 30.0, 20.0, 10.0], 2), 1.0, 0.25),
+        "Juice": (_prophet_frame([5.0, 6.0, 7.0], 1, start="2024-02-29"), 4.0, 0.0)
+    }, "multi")
+
+def test_forecast_table_rows():
+    table = _table()
+    assert list(table) == ["Cola", "Bread", "Juice"] and len(table) == 3
+    forecast = table.forecast("Cola")
+    assert list(forecast.columns) == ["ds", "yhat", "revenue", "profit", "margin_pct"]
+    assert forecast["yhat"].tolist() == [14.0, 16.0]
+    assert forecast["revenue"].tolist() == [28.0, 32.0]
+    assert forecast["profit"].tolist() == [7.0, 8.0]
+    assert np.allclose(forecast["margin_pct"], 25.0)
+    assert len(table.series("Juice")) == 3
+
+def test_forecast_table_aggregates_match_groupby():
+    table = _table()
+    future = pd.concat([table.forecast(label).assign(sku=label) for label in table])
+    for measure in ("revenue", "profit"):
+        expected = future.groupby("sku", sort=False)[measure].sum()
+        assert table.totals(measure).to_dict() == pytest.approx(expected.to_dict())
+        assert table.by_period(measure).to_dict() == pytest.approx(future.groupby("ds")[measure].sum().to_dict())
+    assert table.totals().to_dict() == {"Cola": 60.0, "Bread": 30.0, "Juice": 52.0}
+    assert list(table.top(2).index) == ["Cola", "Juice"]
+
+def test_empty_forecast_table():
+    table = build_forecast_table({}, "multi")
+    assert len(table) == 0
+    assert table.totals().empty and table.by_period().empty
+
+def test_every_run_saves_prophet_params_per_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(forecast3, "FORECAST_CACHE_DIR", str(tmp_path))
+    data = {"Cola": _hierarchy_input()["Cola"]}
+    # A cold run (the dashboard right after a full extraction) already leaves parameters behind
+    forecast_timeseries(data, source="january.csv", periods=2)
+    saved = load_prophet_params(prophet_params_file("january.csv"))
+    assert set(saved) == {"Cola"}
+    assert prophet_params_file("january.csv") != prophet_params_file("other.csv")
+    assert not os.path.exists(prophet_params_file("other.csv"))
+    # The incremental run warm-starts from them and saves again
+    table, mode = forecast_timeseries(data, source="january.csv", warm_start=True, periods=2)
+    assert mode == "multi" and list(table) == ["Cola"]
+    # Without a source there is nothing to key the parameters by
+    forecast_timeseries(data, periods=2)
+    assert len(os.listdir(tmp_path)) == 1
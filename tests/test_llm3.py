@@ -0,0 +1,140 @@
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+import llm3
+from llm3 import LlamaCppBackend, generate_with_retries, _speculate
+
+class FakeLlama:
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.busy = threading.Lock()
+        self.overlaps = 0
+        FakeLlama.instances.append(self)
+
+    def set_cache(self, cache):
+        pass
+
+    def create_completion(self, prompt, **kwargs):
+        if not self.busy.acquire(blocking=False):
+            self.overlaps += 1
+            self.busy.acquire()
+        try:
+            for word in prompt.split():
+                time.sleep(0.005)
+                yield {"choices": [{"text": word}]}
+        finally:
+            self.busy.release()
+
+def _fake_module(monkeypatch):
+    FakeLlama.instances = []
+    monkeypatch.setitem(sys.modules, "llama_cpp", types.SimpleNamespace(Llama=FakeLlama, LlamaRAMCache=object))
+
+def test_each_slot_gets_its_own_context(monkeypatch):
+    _fake_module(monkeypatch)
+    backend = LlamaCppBackend("llama3", "model.gguf", concurrency=3)
+    with ThreadPoolExecutor(6) as pool:
+        answers = list(pool.map(lambda i: backend.generate(f"a b c {i}")["response"], range(12)))
+    assert answers == [f"abc{i}" for i in range(12)]
+    assert 1 <= len(FakeLlama.instances) <= 3
+    assert sum(llm.overlaps for llm in FakeLlama.instances) == 0
+
+def test_cancelled_generation_returns_its_context(monkeypatch):
+    _fake_module(monkeypatch)
+    backend = LlamaCppBackend("llama3", "model.gguf", concurrency=1)
+    cancel = threading.Event()
+    cancel.set()
+    assert backend.generate("a b c", cancel=cancel) is None
+    assert backend.generate("a b")["response"] == "ab"
+    assert len(FakeLlama.instances) == 1
+
+class ScriptedBackend:
+    # Answers calls in order from `responses`; keeps a context only when `contexts` is set, like Ollama
+    name, model, concurrency = "scripted", "fake", 1
+
+    def __init__(self, responses, contexts=True):
+        self.responses, self.contexts, self.calls = list(responses), contexts, []
+
+    def generate(self, prompt, context=None, options=None, cancel=None, timeout=None):
+        self.calls.append({"prompt": prompt, "context": context})
+        n = len(self.calls)
+        result = {"response": self.responses[n - 1], "prompt_eval_count": len(prompt.split()),
+                  "prompt_eval_duration": len(prompt.split()) * 1e6}
+        if self.contexts:
+            result["context"] = [n]
+        return result
+
+def _parse_int(response):
+    return int(response)
+
+def _full_prompt(error):
+    return "data " * 50 + (f"note: {error}" if error else "")
+
+def test_retries_continue_the_context_with_only_the_note(monkeypatch):
+    monkeypatch.setattr(llm3, "PROMPT_EVAL_STATS", dict.fromkeys(llm3.PROMPT_EVAL_STATS, 0))
+    backend = ScriptedBackend(["oops", "still", "42"])
+    parsed, response = generate_with_retries(_full_prompt, lambda error: f"fix: {error}", _parse_int,
+                                             backend=backend)
+    assert (parsed, response) == (42, "42")
+    assert backend.calls[0] == {"prompt": _full_prompt(None), "context": None}
+    assert backend.calls[1]["prompt"].startswith("fix: invalid literal") and backend.calls[1]["context"] == [1]
+    assert backend.calls[2]["context"] == [2]
+    stats = llm3.PROMPT_EVAL_STATS
+    assert stats["retries"] == 2 and stats["tokens"] < stats["full_tokens"]
+
+def test_retries_without_context_resend_the_same_prefix():
+    backend = ScriptedBackend(["oops", "7"], contexts=False)
+    parsed, _ = generate_with_retries(_full_prompt, lambda error: f"fix: {error}", _parse_int, backend=backend)
+    first, retry = (call["prompt"] for call in backend.calls)
+    assert parsed == 7
+    # The data comes first, so the retry only differs in its trailing note
+    assert retry.startswith(first) and "note: invalid literal" in retry
+
+def test_exhausted_retries_return_the_last_response():
+    backend = ScriptedBackend(["a", "b"], contexts=False)
+    assert generate_with_retries(_full_prompt, str, _parse_int, max_attempts=2, backend=backend) == (None, "b")
+
+class SeededBackend:
+    # Seed 3 answers "3" straight away; the others stream "bad" slowly unless cancelled
+    name, model, concurrency = "seeded", "fake", 4
+
+    def __init__(self, valid_seeds=(3,)):
+        self.valid_seeds, self.options, self.cancelled = valid_seeds, [], []
+        self.lock = threading.Lock()
+
+    def generate(self, prompt, context=None, options=None, cancel=None, timeout=None):
+        with self.lock:
+            self.options.append(options)
+        if options["seed"] in self.valid_seeds:
+            return {"response": str(options["seed"])}
+        for _ in range(100):
+            if cancel.is_set():
+                with self.lock:
+                    self.cancelled.append(options["seed"])
+                return None
+            time.sleep(0.005)
+        return {"response": "bad"}
+
+def test_speculation_keeps_the_first_valid_sample_and_cancels_the_rest():
+    backend = SeededBackend()
+    start = time.perf_counter()
+    result, parsed, error = _speculate(backend, "p", None, _parse_int, None, samples=4)
+    assert (parsed, error) == (3, None) and result == {"response": "3"}
+    assert time.perf_counter() - start < 0.4
+    assert sorted(o["seed"] for o in backend.options) == [1, 2, 3, 4]
+    assert len({o["temperature"] for o in backend.options}) == 4
+    assert sorted(backend.cancelled) == [1, 2, 4]
+
+def test_speculation_reports_a_failure_when_no_sample_parses():
+    result, parsed, error = _speculate(SeededBackend(valid_seeds=()), "p", None, _parse_int, None, samples=2)
+    assert result == {"response": "bad"} and parsed is None and "invalid literal" in error
+
+def test_retries_race_samples_and_time_the_valid_answer(monkeypatch):
+    monkeypatch.setattr(llm3, "TIME_TO_VALID", {"sequential": {"valid": [], "failed": 0},
+                                                "speculative": {"valid": [], "failed": 0}})
+    parsed, _ = generate_with_retries(_full_prompt, str, _parse_int, backend=SeededBackend())
+    assert parsed == 3
+    assert len(llm3.TIME_TO_VALID["speculative"]["valid"]) == 1
+    assert llm3.TIME_TO_VALID["sequential"] == {"valid": [], "failed": 0}
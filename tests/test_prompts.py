@@ -0,0 +1,46 @@
+import json
+from prompts import CUT_LINE_MARKER, assemble_prompt, count_tokens, trim_to_budget
+
+def _report(n_skus=400):
+    return {"revenue_analysis": {"total": 1234.5},
+            "sku_forecast": {f"SKU {i}": {"2024-01": {"units": i, "price": 2.5}} for i in range(n_skus)}}
+
+def test_small_data_is_untouched():
+    data = "### Sheet: a\ndate,qty\n2024-01-01,3"
+    assert trim_to_budget(data, 1000) == (data, 0)
+
+def test_minified_json_is_trimmed_to_whole_records():
+    line = json.dumps(_report(), separators=(",", ":"))
+    trimmed, _ = trim_to_budget(f"### REPORT: r\n{line}", 300)
+    header, body, marker = trimmed.splitlines()
+    value = json.loads(body)
+    assert header == "### REPORT: r"
+    assert value["revenue_analysis"] == {"total": 1234.5}
+    kept = value["sku_forecast"]
+    assert 0 < len(kept) < 400
+    assert all(kept[sku] == {"2024-01": {"units": int(sku.split()[1]), "price": 2.5}} for sku in kept)
+    assert marker == f"[... {400 - len(kept)} record(s) omitted to fit the context window ...]"
+    assert count_tokens(trimmed) <= 300
+
+def test_json_list_keeps_leading_rows():
+    line = json.dumps([{"row": i, "value": "x" * 20} for i in range(500)])
+    trimmed, _ = trim_to_budget(line, 200)
+    rows = json.loads(trimmed.splitlines()[0])
+    assert [r["row"] for r in rows] == list(range(len(rows)))
+
+def test_plain_text_line_is_cut_by_characters():
+    trimmed, _ = trim_to_budget("word " * 5000, 100)
+    assert trimmed.splitlines()[-1] == CUT_LINE_MARKER
+
+def test_csv_rows_are_dropped_from_the_end():
+    rows = "\n".join(f"2024-01-{i % 28 + 1:02d},{i}" for i in range(2000))
+    trimmed, omitted = trim_to_budget(f"### Sheet: s\ndate,qty\n{rows}", 500)
+    lines = trimmed.splitlines()
+    assert lines[:2] == ["### Sheet: s", "date,qty"]
+    assert omitted > 0 and lines[-1] == f"[... {omitted} line(s) omitted to fit the context window ...]"
+
+def test_assemble_prompt_stays_in_context():
+    line = json.dumps(_report(5000), separators=(",", ":"))
+    prompt = assemble_prompt("test", "Extract:\n", line, num_ctx=2048, reserve=512)
+    assert count_tokens(prompt) <= 2048 - 512
+    json.loads(prompt.splitlines()[1])
@@ -0,0 +1,95 @@
+import json
+import numpy as np
+import pandas as pd
+from schema3 import learn_schema, extract_with_schema, load_schema_registry, find_schema, infer_roles
+from transactions3 import aggregate_transactions, header_signature
+
+ROLES = {"date": "Date", "product": "Item", "quantity": "Qty", "price": "Unit Price", "category": "Dept"}
+DEPTS = {"Cola": "Drinks", "Juice": "Drinks", "Bread": "Bakery", "Croissant": "Bakery"}
+
+def _sheet(n=120, seed=3, months=4, depts=DEPTS):
+    rng = np.random.default_rng(seed)
+    items = np.array(list(depts))
+    picked = items[rng.integers(0, len(items), n)]
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 30 * months, n), unit="D")
+    return pd.DataFrame({
+        "Ticket": np.arange(1000, 1000 + n),
+        "Date": dates.strftime("%d/%m/%Y"),
+        "Item": picked,
+        "Dept": [depts[item] for item in picked],
+        "Qty": rng.integers(1, 5, n),
+        "Unit Price": [f"{p:.2f} €".replace(".", ",") for p in rng.uniform(0.8, 4.0, n)]
+    })
+
+def test_infer_roles_reproduces_the_extraction():
+    df = _sheet()
+    assert infer_roles(df, aggregate_transactions(df, ROLES)) == ROLES
+
+def test_learn_then_extract_round_trip(tmp_path):
+    registry_file = str(tmp_path / "schema_registry.json")
+    df = _sheet()
+    # What the LLM extraction of this sheet would have returned
+    llm_json = aggregate_transactions(df, ROLES)
+    entry_id = learn_schema({"Receipts": df}, llm_json, "january.csv", filepath=registry_file)
+    assert entry_id is not None
+    entry = load_schema_registry(registry_file)[entry_id]
+    assert entry["roles"] == ROLES and entry["sheet"] == "Receipts" and entry["uses"] == 0
+
+    # Next month's export: same layout, new rows, plus an unrelated sheet
+    new_df = _sheet(seed=4)
+    json_data, frame = extract_with_schema({"Notes": pd.DataFrame({"x": [1]}), "Receipts": new_df},
+                                           filepath=registry_file)
+    assert json_data == aggregate_transactions(new_df, ROLES)
+    assert len(frame) == len(new_df)
+    assert load_schema_registry(registry_file)[entry_id]["uses"] == 1
+
+def test_near_match_resolves_renamed_columns_by_position(tmp_path):
+    registry_file = str(tmp_path / "schema_registry.json")
+    df = _sheet()
+    learn_schema({"Receipts": df}, aggregate_transactions(df, ROLES), "january.csv", filepath=registry_file)
+    renamed = _sheet(seed=5).rename(columns={"Unit Price": "Price"})
+    _, _, ratio = find_schema(header_signature(renamed), load_schema_registry(registry_file))
+    assert 0.8 <= ratio < 1.0
+    json_data, _ = extract_with_schema({"Receipts": renamed}, filepath=registry_file)
+    assert json_data == aggregate_transactions(renamed, dict(ROLES, price="Price"))
+
+def test_unknown_layout_is_not_extracted(tmp_path):
+    registry_file = str(tmp_path / "schema_registry.json")
+    with open(registry_file, "w") as f:
+        json.dump({}, f)
+    assert extract_with_schema({"Receipts": _sheet()}, filepath=registry_file) == (None, None)
+    assert learn_schema({"Receipts": _sheet()}, {"sku_forecast": {}}, "x.csv", filepath=registry_file) is None
+
+def _headerless(df):
+    # How workbook3 reads an export without a header row: numbered columns
+    return df.set_axis(range(df.shape[1]), axis=1)
+
+def _learn_headerless(registry_file):
+    df = _headerless(_sheet())
+    roles = {"date": 1, "product": 2, "quantity": 4, "price": 5, "category": 3}
+    return learn_schema({"Receipts": df}, aggregate_transactions(df, roles), "january.csv", filepath=registry_file)
+
+def test_headerless_layout_matches_the_same_export(tmp_path):
+    registry_file = str(tmp_path / "schema_registry.json")
+    assert _learn_headerless(registry_file) is not None
+    json_data, _ = extract_with_schema({"Receipts": _headerless(_sheet(seed=4))}, filepath=registry_file)
+    assert json_data is not None and set(json_data["sku_forecast"]) == set(DEPTS)
+
+def test_headerless_layout_ignores_other_exports_of_the_same_shape(tmp_path):
+    registry_file = str(tmp_path / "schema_registry.json")
+    _learn_headerless(registry_file)
+    other_shop = _headerless(_sheet(seed=4, depts={"Nails": "Tools", "Glue": "Tools", "Paint": "Decor"}))
+    iso_dates = _headerless(_sheet(seed=4).assign(Date=lambda d: pd.to_datetime(d["Date"], dayfirst=True)
+                                                  .dt.strftime("%Y-%m-%d")))
+    dollars = _headerless(_sheet(seed=4).assign(**{"Unit Price": lambda d: "$" + d["Unit Price"].str[:-2]}))
+    for df in (other_shop, iso_dates, dollars):
+        assert extract_with_schema({"Receipts": df}, filepath=registry_file) == (None, None)
+
+def test_headerless_entries_without_a_fingerprint_never_match(tmp_path):
+    registry_file = str(tmp_path / "schema_registry.json")
+    entry_id = _learn_headerless(registry_file)
+    registry = load_schema_registry(registry_file)
+    del registry[entry_id]["fingerprint"]
+    df = _headerless(_sheet(seed=4))
+    assert find_schema(header_signature(df), registry, df=df) == (None, None, 0.0)
+    assert find_schema(header_signature(df), load_schema_registry(registry_file))[1] is None
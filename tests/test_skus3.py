@@ -0,0 +1,65 @@
+import pytest
+from skus3 import _merge_months, cluster_names, cluster_sku_forecast, normalize_sku
+
+def test_normalize_sku():
+    assert normalize_sku("  Croissants ") == normalize_sku("CROISSANT") == normalize_sku("croissant.") == "croissant"
+    assert normalize_sku("Cookies") == "cookie"
+
+def test_near_duplicates_merge_to_heaviest_name():
+    names = ["Croissant", "croissant ", "CROISSANTS", "Baguette"]
+    mapping = cluster_names(names, weights={"Croissant": 10, "croissant ": 1, "CROISSANTS": 2})
+    assert {mapping[n] for n in names[:3]} == {"Croissant"}
+    assert mapping["Baguette"] == "Baguette"
+
+def test_misspellings_merge_through_the_ngram_index():
+    mapping = cluster_names(["Pain au chocolat", "Pain au chocolait", "Pain aux raisins"], threshold=0.8)
+    assert mapping["Pain au chocolait"] == mapping["Pain au chocolat"]
+    assert mapping["Pain aux raisins"] == "Pain aux raisins"
+
+@pytest.mark.parametrize("a, b", [("Cola 330ml", "Cola 500ml"), ("Boule 400G", "Boule 200G")])
+def test_different_numbers_never_merge(a, b):
+    mapping = cluster_names([a, b], threshold=0.5)
+    assert mapping[a] != mapping[b]
+
+def test_threshold_one_only_merges_exact_normalized_names():
+    mapping = cluster_names(["Croissant", "CROISSANTS", "Croisant"], threshold=1.0)
+    assert mapping["CROISSANTS"] == mapping["Croissant"]
+    assert mapping["Croisant"] == "Croisant"
+
+def test_pinned_aliases_stay_apart():
+    mapping = cluster_names(["Pain", "Pains", "pain "], aliases={"Pain": "Pain", "Pains": "Pains"})
+    assert mapping["Pain"] == "Pain" and mapping["Pains"] == "Pains"
+
+def test_merge_weights_price_and_cost_by_units():
+    target = {"2024-01": {"units": 2, "price": 1.0, "cost": 0.5}}
+    _merge_months(target, {"2024-01": {"units": 6, "price": 2.0, "cost": 1.0},
+                           "2024-02": {"units": 1, "price": 3.0}})
+    assert target["2024-01"] == {"units": 8, "price": 1.75, "cost": 0.88}
+    assert target["2024-02"] == {"units": 1, "price": 3.0}
+
+def test_merge_parses_text_prices():
+    target = {"2024-01": {"units": 1, "price": "1,20 €"}}
+    _merge_months(target, {"2024-01": {"units": "3", "price": "2,00 €"}})
+    assert target["2024-01"] == {"units": 4.0, "price": 1.8}
+
+def test_merge_dict_with_scalar_month():
+    # A bare price is one unit at that price
+    target = {"2024-01": {"units": 2, "price": 1.5}}
+    _merge_months(target, {"2024-01": 3.0})
+    assert target["2024-01"] == {"units": 3.0, "price": 2.0}
+
+def test_merge_scalar_months_add_up():
+    target = {"2024-01": 10.0}
+    _merge_months(target, {"2024-01": "5,50"})
+    assert target["2024-01"] == 15.5
+
+def test_cluster_sku_forecast_merges_series_and_categories():
+    data = {"sku_forecast": {"Croissant": {"2024-01": {"units": 10, "price": 1.0}},
+                             "CROISSANTS": {"2024-01": {"units": 2, "price": 1.6},
+                                            "2024-02": {"units": 1, "price": 1.0}}},
+            "sku_categories": {"Croissant": "Viennoiserie", "CROISSANTS": "Other"}}
+    merged, renamed = cluster_sku_forecast(data, aliases={}, report=False)
+    assert renamed == {"CROISSANTS": "Croissant"}
+    assert merged["sku_forecast"] == {"Croissant": {"2024-01": {"units": 12, "price": 1.1},
+                                                    "2024-02": {"units": 1, "price": 1.0}}}
+    assert merged["sku_categories"] == {"Croissant": "Viennoiserie"}
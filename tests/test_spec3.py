@@ -0,0 +1,115 @@
+import pytest
+from spec3 import generate_dashboard_spec, build_path_index, describe_chart, SECTIONS
+
+SUMMARY = {
+    "revenue_analysis": {"revenue": 1200, "by_year": {"2022": 1000, "2023": 1200}},
+    "profit_margin_analysis": {"gross_profit": 400, "net_income": "(50)"},
+    "cost_optimization_analysis": {"operating_expenses": 300, "logistics_costs": 40}
+}
+
+def test_spec_covers_each_section_with_resolvable_paths():
+    index = build_path_index(SUMMARY)
+    dashboards = generate_dashboard_spec(SUMMARY, index)
+    assert [d["section"] for d in dashboards] == list(SECTIONS)
+    for dash in dashboards:
+        assert dash["data_points"] and all(path in index["values"] for path in dash["data_points"].values())
+        assert dash["insight"]
+    revenue, profit, cost = dashboards
+    # A period-keyed series wins over scalars and is drawn as a line
+    assert revenue["chart_type"] == "line"
+    assert revenue["data_points"] == {"2022": "revenue_analysis.by_year.2022", "2023": "revenue_analysis.by_year.2023"}
+    assert profit["data_points"] == {"Gross Profit": "profit_margin_analysis.gross_profit",
+                                     "Net Income": "profit_margin_analysis.net_income"}
+    assert cost["chart_type"] == "bar" and len(cost["data_points"]) == 2
+
+def test_spec_is_deterministic():
+    assert generate_dashboard_spec(SUMMARY) == generate_dashboard_spec(dict(SUMMARY))
+
+def test_empty_data_has_no_charts():
+    assert generate_dashboard_spec({}) == []
+    assert generate_dashboard_spec({"notes": "nothing numeric"}) == []
+
+def test_describe_chart():
+    index = build_path_index(SUMMARY)
+    line = {"chart_type": "line", "data_points": {"2022": "revenue_analysis.by_year.2022",
+                                                  "2023": "revenue_analysis.by_year.2023"}}
+    assert describe_chart(line, index) == ("Moved from 1,000.00 in 2022 to 1,200.00 in 2023 (+20.0%); "
+                                           "the peak was 1,200.00 in 2023.")
+    bars = {"chart_type": "bar", "data_points": {"Opex": "cost_optimization_analysis.operating_expenses",
+                                                 "Logistics": "cost_optimization_analysis.logistics_costs"}}
+    assert describe_chart(bars, index) == ("Largest is Opex at 300.00 (88% of the total shown); "
+                                           "smallest is Logistics at 40.00.")
+    # No share of a total that includes a loss
+    mixed = {"chart_type": "bar", "data_points": {"Gross": "profit_margin_analysis.gross_profit",
+                                                  "Net": "profit_margin_analysis.net_income"}}
+    assert describe_chart(mixed, index) == "Largest is Gross at 400.00; smallest is Net at -50.00."
+    assert describe_chart({"chart_type": "bar", "data_points": {"x": "missing"}}, index) == (
+        "No values available for this chart.")
+
+def _sku_forecast(months_by_sku):
+    return {"sku_forecast": {sku: {month: {"units": units, "price": 2.0} for month, units in months.items()}
+                             for sku, months in months_by_sku.items()}}
+
+def test_path_index():
+    data = {"revenue_analysis": {"revenue": "1,200", "by_month": {"2023-01": 10, "2023-02": 12, "2023-03": 9}},
+            "notes": {"flag": True}}
+    index = build_path_index(data)
+    assert index["values"] == {"revenue_analysis.revenue": 1200.0, "revenue_analysis.by_month.2023-01": 10,
+                               "revenue_analysis.by_month.2023-02": 12, "revenue_analysis.by_month.2023-03": 9}
+    assert list(index["series"]["revenue_analysis.by_month"]["points"]) == ["2023-01", "2023-02", "2023-03"]
+
+def test_dotted_keys_are_escaped_not_dropped():
+    from util3 import get_nested_value
+    data = _sku_forecast({"Cola 0.5L": {"2023-01": 3, "2023-02": 4}, "Tea": {"2023-01": 1, "2023-02": 2}})
+    index = build_path_index(data)
+    path = "sku_forecast.Cola 0\\.5L.2023-02.units"
+    assert index["values"][path] == 4
+    assert get_nested_value(data, path) == 4
+    chart = generate_dashboard_spec(data, index)[0]
+    assert chart["data_points"]["Cola 0.5L"] == path
+
+def test_resolve_path():
+    from spec3 import resolve_path
+    index = build_path_index({"revenue_analysis": {"net_revenue": 5}, "a": {"total": 1}, "b": {"total": 2}})
+    assert resolve_path(index, "revenue_analysis.net_revenue") == ("revenue_analysis.net_revenue", "ok")
+    assert resolve_path(index, "Revenue_Analysis.Net-Revenue") == ("revenue_analysis.net_revenue", "corrected")
+    assert resolve_path(index, "profit.net_revenue") == ("revenue_analysis.net_revenue", "corrected")
+    assert resolve_path(index, ["missing", "revenue_analysis.net_revenue"]) == ("revenue_analysis.net_revenue", "ok")
+    # "total" is ambiguous, so it is reported rather than guessed
+    assert resolve_path(index, "c.total") == (None, "invalid")
+
+def test_validate_dashboards():
+    from spec3 import validate_dashboards
+    index = build_path_index({"revenue_analysis": {"revenue": 5, "units": 2}})
+    dashboards = [{"title": "A", "data_points": {"Revenue": "revenue_analysis.Revenue", "Ghost": "x.y"}},
+                  {"title": "B", "data_points": {"Ghost": "x.y"}},
+                  "not a chart"]
+    valid, report = validate_dashboards(dashboards, index)
+    assert valid == [{"title": "A", "data_points": {"Revenue": "revenue_analysis.revenue"}}]
+    assert [r["status"] for r in report] == ["corrected", "invalid", "invalid", "invalid"]
+
+def test_entity_chart_compares_a_common_period():
+    data = _sku_forecast({"Frankie": {"2022-02": 4, "2023-02": 5}, "Aalopuri": {"2023-01": 8, "2023-02": 9},
+                          "Tea": {"2022-02": 1, "2023-02": 2, "2023-03": 7}})
+    chart = generate_dashboard_spec(data)[0]
+    assert chart["data_points"] == {"Aalopuri": "sku_forecast.Aalopuri.2023-02.units",
+                                    "Frankie": "sku_forecast.Frankie.2023-02.units",
+                                    "Tea": "sku_forecast.Tea.2023-02.units"}
+    assert chart["description"] == "Units in 2023-02 for the top 3 entries."
+
+def test_entity_chart_labels_bars_without_a_common_period():
+    data = _sku_forecast({"Frankie": {"2022-01": 3, "2022-02": 4}, "Aalopuri": {"2023-01": 8, "2023-02": 9}})
+    chart = generate_dashboard_spec(data)[0]
+    assert chart["data_points"] == {"Aalopuri (2023-02)": "sku_forecast.Aalopuri.2023-02.units",
+                                    "Frankie (2022-02)": "sku_forecast.Frankie.2022-02.units"}
+
+@pytest.mark.parametrize("path, section", [
+    ("sku_forecast.*.price", "Revenue Analysis"),
+    ("products.unit_price", "Revenue Analysis"),
+    ("products.cost_price", "Cost Optimization Analysis"),
+    ("profit_margin_analysis.revenue", "Profit Margin Analysis"),
+    ("cost_optimization_analysis.logistics_costs", "Cost Optimization Analysis"),
+])
+def test_section_for(path, section):
+    from spec3 import section_for
+    assert section_for(path) == section
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+from statements3 import match_line_items, normalize_label
+
+def test_normalize_label():
+    assert normalize_label("Cost of Goods Sold (COGS)") == ["cost of goods sold", "cogs"]
+    assert normalize_label("SG&A") == ["sg and a"]
+
+def test_negated_synonyms_flip_the_sign():
+    df = pd.DataFrame({"Metric": ["Revenue", "Cost of Sales", "Gross Loss", "Net Loss", "Widgets"],
+                       "2023": [1000, 1200, 200, 2000, 5], "2024": ["1,500", "1,100", "(400)", "500", 6]})
+    matched, unmatched = match_line_items({"Income Statement": df})
+    assert matched["revenue"] == ("Revenue", {2023: 1000, 2024: 1500})
+    assert matched["net_income"] == ("Net Loss", {2023: -2000, 2024: -500})
+    # A gross loss already written as a negative number is a gross profit
+    assert matched["gross_profit"] == ("Gross Loss", {2023: -200, 2024: 400})
+    assert unmatched == [("Widgets", {2023: 5, 2024: 6})]
+
+def test_negated_synonyms_in_year_rows():
+    df = pd.DataFrame({"Year": [2023, 2024], "Net sales": [10, 20], "Net loss for the year": [3, 4]})
+    matched, _ = match_line_items({"Summary": df})
+    assert matched["revenue"][1] == {2023: 10, 2024: 20}
+    assert matched["net_income"] == ("Net loss for the year", {2023: -3, 2024: -4})
+
+@pytest.mark.parametrize("label", ["Net Income (Loss)", "Net income/(loss)"])
+def test_income_or_loss_labels_keep_their_sign(label):
+    # The label already reports income with its own sign; the "loss" in it must not negate it
+    df = pd.DataFrame({"Metric": [label], "2024": [-750]})
+    matched, _ = match_line_items({"IS": df})
+    assert matched["net_income"] == (label, {2024: -750})
@@ -0,0 +1,16 @@
+import math
+import pandas as pd
+from transactions3 import header_signature, parse_amounts
+
+def test_parse_amounts_formats():
+    values = pd.Series(["0,15 €", "$1,200.50", "(12.00)", "3", None, "n/a"], dtype=object)
+    parsed = parse_amounts(values).tolist()
+    assert parsed[:4] == [0.15, 1200.5, -12.0, 3.0]
+    assert math.isnan(parsed[4]) and math.isnan(parsed[5])
+
+def test_parse_amounts_integer_text_with_missing_values():
+    assert parse_amounts(pd.Series(["3", "4", None], dtype=object)).tolist()[:2] == [3.0, 4.0]
+
+def test_header_signature_collapses_data_cells():
+    df = pd.DataFrame(columns=["2021-01-02", "08:38", "150040", "BAGUETTE", "Unnamed: 4"])
+    assert header_signature(df) == ("<date>", "<time>", "<num>", "baguette", "<blank>")
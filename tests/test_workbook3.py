@@ -0,0 +1,64 @@
+import io
+import pandas as pd
+import workbook3
+from workbook3 import looks_headerless, read_csv_sheet, read_workbook, split_header
+
+HEADERLESS = "2021-01-02,08:38,150040,BAGUETTE,1,\"0,90 €\"\n2021-01-02,08:38,150040,PAIN AU CHOCOLAT,3,\"1,20 €\"\n"
+WITH_HEADER = "date,time,ticket,article,quantity,unit_price\n" + HEADERLESS
+
+def test_looks_headerless():
+    assert looks_headerless(["2021-01-02", "08:38", "150040", "BAGUETTE", "1", "0,90 €"])
+    assert not looks_headerless(["date", "time", "ticket", "article", "quantity", "unit_price"])
+    assert not looks_headerless(["Metric", "2023", "2024"])
+
+def test_headerless_csv_keeps_first_row(tmp_path):
+    path = tmp_path / "sales.csv"
+    path.write_text(HEADERLESS)
+    df = read_csv_sheet(str(path))
+    assert list(df.columns) == list(range(6))
+    assert df.shape == (2, 6)
+    assert df.iloc[0].tolist() == ["2021-01-02", "08:38", 150040, "BAGUETTE", 1, "0,90 €"]
+    assert df[4].dtype.kind == "i"
+
+def test_csv_with_header(tmp_path):
+    path = tmp_path / "sales.csv"
+    path.write_text(WITH_HEADER)
+    df = read_csv_sheet(str(path))
+    assert list(df.columns) == ["date", "time", "ticket", "article", "quantity", "unit_price"]
+    assert len(df) == 2
+
+def test_url_is_downloaded_once(monkeypatch):
+    calls = []
+
+    def urlopen(url):
+        calls.append(url)
+        return io.BytesIO(HEADERLESS.encode())
+
+    monkeypatch.setattr(workbook3.urllib.request, "urlopen", urlopen)
+    df = read_csv_sheet("https://docs.google.com/spreadsheets/d/x/export?format=csv")
+    assert len(calls) == 1
+    assert df.shape == (2, 6)
+
+def test_split_header_names_like_pandas():
+    raw = pd.DataFrame([["Metric", 2023, 2024, None, "Metric"], ["Revenue", 10, 12, 1, "x"]])
+    df = split_header(raw)
+    assert list(df.columns) == ["Metric", "2023", "2024", "Unnamed: 3", "Metric.1"]
+    assert df["2023"].dtype.kind == "i"
+
+def test_cache_key_includes_excel_engine(tmp_path, monkeypatch):
+    path = tmp_path / "book.xlsx"
+    pd.DataFrame({"Metric": ["Revenue"], "2024": [10]}).to_excel(path, index=False)
+    parsed = []
+
+    def parse(p, engine=None):
+        parsed.append(engine)
+        return {"Sheet1": pd.DataFrame({"Metric": ["Revenue"], "2024": [10 if engine == "openpyxl" else 11]})}
+
+    monkeypatch.setattr(workbook3, "parse_workbook", parse)
+    cache = str(tmp_path / "cache")
+    first = read_workbook(str(path), engine="openpyxl", cache_dir=cache)
+    again = read_workbook(str(path), engine="openpyxl", cache_dir=cache)
+    other = read_workbook(str(path), engine="calamine", cache_dir=cache)
+    assert parsed == ["openpyxl", "calamine"]
+    assert int(first["Sheet1"]["2024"].iloc[0]) == int(again["Sheet1"]["2024"].iloc[0]) == 10
+    assert int(other["Sheet1"]["2024"].iloc[0]) == 11
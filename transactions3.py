@@ -0,0 +1,91 @@
+import re
+import numpy as np
+import pandas as pd
+from dates3 import parse_dates, period_labels
+
+# Column roles of a transaction sheet; only product and date are required. line_id (a per-line running
+# number) is only used by cleanse3 to spot lines scanned twice.
+TRANSACTION_ROLES = ("date", "product", "quantity", "price", "cost", "category", "line_id")
+REQUIRED_ROLES = ("date", "product")
+
+def parse_amounts(values):
+    # "0,15 €", "$1,200.50", "(12.00)", 3 -> floats, each distinct string parsed once.
+    # A lone comma followed by one or two digits is a decimal comma; any other comma separates thousands.
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques).astype(str).str.strip()
+    negative = text.str.startswith("(") & text.str.endswith(")")
+    text = text.str.replace(r"[^\d,.\-]", "", regex=True)
+    decimal_comma = text.str.contains(r"^-?\d+,\d{1,2}$")
+    text = text.where(~decimal_comma, text.str.replace(",", ".", regex=False)).str.replace(",", "", regex=False)
+    amounts = pd.to_numeric(text, errors="coerce").where(~negative, lambda a: -a).to_numpy(dtype=float)
+    parsed = amounts[codes] if len(amounts) else np.full(len(codes), np.nan)
+    parsed[codes < 0] = np.nan
+    return pd.Series(parsed, index=series.index, name=series.name)
+
+def transaction_frame(df, roles):
+    # Raw sheet + {role: column} -> one row per transaction with date, sku, units, price (+ cost, category).
+    # Rows without a date or product are dropped; a missing quantity counts as 1 unit.
+    missing = [role for role in REQUIRED_ROLES if not roles.get(role)]
+    if missing:
+        raise ValueError(f"Missing column role(s): {', '.join(missing)}")
+    unknown = [column for column in roles.values() if column and column not in df.columns]
+    if unknown:
+        raise ValueError(f"Column(s) not in the sheet: {', '.join(map(str, unknown))}")
+    out = pd.DataFrame({
+        "date": parse_dates(df[roles["date"]]),
+        "sku": df[roles["product"]].astype("string").str.strip(),
+        "units": parse_amounts(df[roles["quantity"]]) if roles.get("quantity") else 1.0,
+        "price": parse_amounts(df[roles["price"]]) if roles.get("price") else np.nan
+    }, index=df.index)
+    if roles.get("cost"):
+        out["cost"] = parse_amounts(df[roles["cost"]])
+    if roles.get("category"):
+        out["category"] = df[roles["category"]].astype("string").str.strip()
+    return out.dropna(subset=["date", "sku"]).reset_index(drop=True)
+
+def aggregate_sku_months(frame):
+    # Transactions -> the "sku_forecast" structure the LLM extraction produces: units summed per SKU and
+    # month, price and cost as unit-weighted averages, all rounded to 2 decimals
+    frame = frame.assign(month=period_labels(frame["date"], "month"), units=frame["units"].fillna(1.0))
+    frame["revenue"] = frame["units"] * frame["price"]
+    sums = {"units": "sum", "revenue": "sum"}
+    if "cost" in frame:
+        frame["cost_total"] = frame["units"] * frame["cost"]
+        sums["cost_total"] = "sum"
+    grouped = frame.groupby(["sku", "month"], sort=True).agg(sums)
+    grouped["price"] = grouped["revenue"] / grouped["units"].where(grouped["units"] != 0)
+    if "cost_total" in grouped:
+        grouped["cost"] = grouped["cost_total"] / grouped["units"].where(grouped["units"] != 0)
+    fields = [f for f in ("units", "price", "cost") if f in grouped]
+    grouped = grouped[fields].round(2)
+    sku_forecast = {}
+    for (sku, month), row in zip(grouped.index, grouped.itertuples(index=False)):
+        sku_forecast.setdefault(sku, {})[month] = {f: float(v) for f, v in zip(fields, row) if pd.notna(v)}
+    result = {"sku_forecast": sku_forecast}
+    if "category" in frame:
+        categories = frame.dropna(subset=["category"]).groupby("sku")["category"].agg(lambda c: c.mode().iat[0])
+        result["sku_categories"] = {sku: str(category) for sku, category in categories.items()}
+    return result
+
+def aggregate_transactions(df, roles):
+    return aggregate_sku_months(transaction_frame(df, roles))
+
+def normalize_header(name):
+    # Header cell -> signature token. Header-less exports put their first transaction in the header, so cells
+    # that look like data collapse to a type token and next month's file still has the same signature.
+    text = str(name).strip().lower()
+    if re.fullmatch(r"\d{1,2}:\d{2}(:\d{2})?", text):
+        return "<time>"
+    if re.fullmatch(r"\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}", text):
+        return "<date>"
+    if re.fullmatch(r"[-+(]?[\d\s.,]+\)?\s*[€$£%]?|[€$£][\d\s.,]+", text):
+        return "<num>"
+    if text.startswith("unnamed:"):
+        return "<blank>"
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+def header_signature(df):
+    return tuple(normalize_header(c) for c in df.columns)
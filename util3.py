@@ -1,4 +1,14 @@
 # utils.py
+import re
+
+def escape_key(key):
+    # A dict key as one segment of a dotted path: "." and "\" inside the key are backslash-escaped
+    return str(key).replace("\\", "\\\\").replace(".", "\\.")
+
+def split_path(path):
+    # "sku_forecast.Cola 0\.5L.units" -> ["sku_forecast", "Cola 0.5L", "units"]
+    return [re.sub(r"\\(.)", r"\1", part) for part in re.findall(r"(?:\\.|[^.\\])+", path)]
+
 def get_nested_value(data, path):
     if isinstance(path, list):
         for p in path:
@@ -7,13 +17,16 @@ def get_nested_value(data, path):
                 return val
         return None
 
-    keys = path.split('.')
+    keys = split_path(path)
     for key in keys:
         if isinstance(data, dict):
             data = data.get(key, None)
         else:
             return None
 
+    return to_number(data)
+
+def to_number(data):
     if isinstance(data, (int, float)):
         return data
     elif isinstance(data, str):
@@ -0,0 +1,266 @@
+import hashlib
+import io
+import os
+import pickle
+import shutil
+import urllib.request
+import numpy as np
+import pandas as pd
+from transactions3 import normalize_header
+
+WORKBOOK_CACHE_DIR = "workbook_cache"
+# Bumped whenever the cached representation changes, so older entries are re-parsed instead of misread
+WORKBOOK_CACHE_VERSION = 4
+# String columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+# Source path -> size, mtime and content digest, so unchanged files skip hashing
+WORKBOOK_INDEX_FILE = "index.pkl"
+# openpyxl | calamine; unset picks calamine when python-calamine is installed
+EXCEL_ENGINE = os.environ.get("SMB_EXCEL_ENGINE")
+
+def default_excel_engine():
+    if EXCEL_ENGINE:
+        return EXCEL_ENGINE
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _load_pickle(path, default):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return default
+
+def _save_pickle(obj, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(tmp_path, path)
+
+def source_digest(path, cache_dir=WORKBOOK_CACHE_DIR):
+    # Fast path: same size and mtime as last time means same content; otherwise hash the bytes
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    index_path = os.path.join(cache_dir, WORKBOOK_INDEX_FILE)
+    index = _load_pickle(index_path, {})
+    entry = index.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["digest"]
+    digest = file_digest(path)
+    index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+    os.makedirs(cache_dir, exist_ok=True)
+    _save_pickle(index, index_path)
+    return digest
+
+def looks_headerless(columns):
+    # A "header" holding a date or time and mostly data (POS exports often have no header row) is really
+    # the first row; year headers like "Metric | 2023 | 2024" don't count
+    tokens = [normalize_header(c) for c in columns]
+    data_like = sum(t in ("<num>", "<date>", "<time>") for t in tokens)
+    return any(t in ("<date>", "<time>") for t in tokens) and data_like * 2 >= len(tokens)
+
+def _header_names(row):
+    # The column names pandas would give this row as a header: blanks become "Unnamed: i", repeats get ".1"
+    names, seen = [], set()
+    for i, value in enumerate(row):
+        if pd.isna(value):
+            name = f"Unnamed: {i}"
+        elif isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)):
+            # Numeric header cells become text ("2023"), as in read_excel; dates stay dates
+            name = str(int(value)) if float(value).is_integer() else str(value)
+        else:
+            name = value
+        base, n = name, 0
+        while name in seen:
+            n += 1
+            name = f"{base}.{n}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+def split_header(raw):
+    # raw: an Excel sheet read with header=None. Its first row becomes the header unless it looks like data
+    # (header-less POS exports), in which case the sheet keeps numbered columns, all from a single parse.
+    if raw.empty:
+        return raw
+    names = _header_names(raw.iloc[0].tolist())
+    if looks_headerless(names):
+        return raw.infer_objects()
+    df = raw.iloc[1:].reset_index(drop=True)
+    df.columns = names
+    return df.infer_objects()
+
+def _csv_source(path_or_url):
+    # URLs (Google Sheets exports) are downloaded once and re-read from memory
+    if str(path_or_url).startswith(("http://", "https://")):
+        with urllib.request.urlopen(path_or_url) as response:
+            content = response.read()
+        return lambda: io.BytesIO(content)
+    return lambda: path_or_url
+
+def read_csv_sheet(path_or_url):
+    # One full parse. A header-less export's "header" is its first transaction: that line alone is parsed
+    # again (nrows=1) and put back on top, with numbered columns.
+    source = _csv_source(path_or_url)
+    df = pd.read_csv(source())
+    if not looks_headerless(df.columns):
+        return df
+    first = pd.read_csv(source(), header=None, nrows=1)
+    df.columns = first.columns = range(df.shape[1])
+    return pd.concat([first, df], ignore_index=True)
+
+def parse_workbook(path, engine=None):
+    # Raw parse, NaN kept: {sheet name: DataFrame}. Header-less sheets get numbered columns, so their first
+    # row stays a row.
+    if path.endswith(".csv"):
+        return {"CSV File": read_csv_sheet(path)}
+    engine = engine or default_excel_engine()
+    sheets = pd.read_excel(path, sheet_name=None, header=None, engine=engine)
+    return {name: split_header(raw) for name, raw in sheets.items()}
+
+def _downcast_float(col):
+    # float32 only when every value survives the round trip; money columns usually don't
+    narrow = col.astype(np.float32)
+    same = (narrow.astype(np.float64) == col) | col.isna()
+    return narrow if same.all() else col
+
+def _is_iso_date_column(values):
+    # Full YYYY-MM-DD dates (optionally with a time); bare years or months stay as they are
+    return values.str.match(r"^\d{4}-\d{2}-\d{2}").all() and \
+        pd.to_datetime(values, format="ISO8601", errors="coerce").notna().all()
+
+def optimize_frame(df):
+    # Typed, compact copy of a raw sheet: integers/floats downcast losslessly, ISO date strings as datetime64,
+    # repeated strings as categoricals. Missing cells stay NA; '' is only filled in when rendering a prompt.
+    out = {}
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_bool_dtype(col) or isinstance(col.dtype, pd.CategoricalDtype):
+            out[name] = col
+        elif pd.api.types.is_integer_dtype(col):
+            out[name] = pd.to_numeric(col, downcast="integer")
+        elif pd.api.types.is_float_dtype(col):
+            out[name] = _downcast_float(col)
+        elif col.dtype == object:
+            values = col.dropna()
+            if values.empty or not values.map(type).eq(str).all():
+                out[name] = col
+                continue
+            if _is_iso_date_column(values):
+                out[name] = pd.to_datetime(col, format="ISO8601", errors="coerce")
+            elif values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+                out[name] = col.astype("category")
+            else:
+                out[name] = col
+        else:
+            out[name] = col
+    return pd.DataFrame(out, index=df.index)
+
+def render_frame(df):
+    # The prompt-time view: every cell as a Python object, missing ones as ''
+    return df.astype(object).where(df.notna(), '')
+
+def frame_memory(df):
+    return int(df.memory_usage(deep=True).sum())
+
+def print_memory_report(before, after):
+    for sheet in after:
+        saved = 1 - after[sheet] / before[sheet] if before[sheet] else 0
+        print(f"🧮 Sheet {sheet}: {before[sheet] / 1024:,.1f} KB -> {after[sheet] / 1024:,.1f} KB in memory "
+              f"({saved:.0%} smaller)")
+
+def _write_sheet(df, base_path):
+    # Uncompressed Feather so warm reads can memory-map it. Columns Arrow can't hold (mixed str/number cells,
+    # common in hand-made statements) go to a pickle beside it; without pyarrow the whole sheet does.
+    frame = df.reset_index(drop=True)
+    frame.columns = [str(i) for i in range(frame.shape[1])]
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError:
+        frame.to_pickle(f"{base_path}.pkl")
+        return "pickle"
+    arrow_cols, other_cols = [], []
+    for col in frame.columns:
+        try:
+            pa.array(frame[col], from_pandas=True)
+            arrow_cols.append(col)
+        except (pa.ArrowException, TypeError, ValueError):
+            other_cols.append(col)
+    feather.write_feather(frame[arrow_cols], f"{base_path}.feather", compression="uncompressed")
+    if other_cols:
+        frame[other_cols].to_pickle(f"{base_path}.pkl")
+    return "feather"
+
+def _read_sheet(base_path, fmt, columns):
+    if fmt == "pickle":
+        df = pd.read_pickle(f"{base_path}.pkl")
+    else:
+        import pyarrow.feather as feather
+        df = feather.read_table(f"{base_path}.feather", memory_map=True).to_pandas()
+        if df.shape[1] < len(columns):
+            df = pd.concat([df, pd.read_pickle(f"{base_path}.pkl")], axis=1)
+            df = df[[str(i) for i in range(len(columns))]]
+    df.columns = columns
+    return df
+
+def _entry_dir(digest, cache_dir, engine=None):
+    # The reader is part of the key: calamine and openpyxl don't type every cell alike
+    return os.path.join(cache_dir, f"{digest}-{engine or 'csv'}-v{WORKBOOK_CACHE_VERSION}")
+
+def save_workbook_cache(sheets, digest, cache_dir=WORKBOOK_CACHE_DIR, engine=None):
+    # Written to a temp dir and renamed, so a crash never leaves a half-written entry behind
+    entry_dir = _entry_dir(digest, cache_dir, engine)
+    tmp_dir = f"{entry_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    manifest = []
+    for i, (name, df) in enumerate(sheets.items()):
+        fmt = _write_sheet(df, os.path.join(tmp_dir, str(i)))
+        manifest.append({"sheet": name, "format": fmt, "columns": list(df.columns)})
+    _save_pickle(manifest, os.path.join(tmp_dir, "manifest.pkl"))
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp_dir, entry_dir)
+
+def load_workbook_cache(digest, cache_dir=WORKBOOK_CACHE_DIR, engine=None):
+    entry_dir = _entry_dir(digest, cache_dir, engine)
+    manifest = _load_pickle(os.path.join(entry_dir, "manifest.pkl"), None)
+    if manifest is None:
+        return None
+    try:
+        return {m["sheet"]: _read_sheet(os.path.join(entry_dir, str(i)), m["format"], m["columns"])
+                for i, m in enumerate(manifest)}
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable workbook cache entry {digest[:12]}: {e}")
+        return None
+
+def optimize_sheets(sheets, report=True):
+    before = {sheet: frame_memory(df) for sheet, df in sheets.items()}
+    sheets = {sheet: optimize_frame(df) for sheet, df in sheets.items()}
+    if report:
+        print_memory_report(before, {sheet: frame_memory(df) for sheet, df in sheets.items()})
+    return sheets
+
+def read_workbook(path, engine=None, cache_dir=WORKBOOK_CACHE_DIR, use_cache=True):
+    # Typed sheets of a local CSV/Excel file, from the cache when the content was parsed before
+    if not use_cache:
+        return optimize_sheets(parse_workbook(path, engine))
+    engine = None if path.endswith(".csv") else engine or default_excel_engine()
+    digest = source_digest(path, cache_dir)
+    sheets = load_workbook_cache(digest, cache_dir, engine)
+    if sheets is not None:
+        print(f"📦 Loaded {len(sheets)} parsed sheet(s) from the workbook cache")
+        return sheets
+    sheets = optimize_sheets(parse_workbook(path, engine))
+    save_workbook_cache(sheets, digest, cache_dir, engine)
+    return sheets
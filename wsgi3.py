@@ -0,0 +1,12 @@
+# Production entry point, e.g.
+#   gunicorn -w 4 -b 0.0.0.0:8050 wsgi3:server
+#   waitress-serve --listen=0.0.0.0:8050 wsgi3:server
+# Each worker loads the saved dashboard spec and cached figures once at import time.
+import os
+from dashboard3 import create_app
+
+app = create_app(
+    data_path=os.environ.get("SMB_DASH_DATA", "financial_output.json"),
+    hierarchy=os.environ.get("SMB_DASH_HIERARCHY") or None
+)
+server = app.server